@@ -1,8 +1,6 @@
-from openai import OpenAI
-from config import OPENAI_API_KEY
 import json
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+from llm_client import get_llm_client
 
 
 class Evaluator:
@@ -39,20 +37,17 @@ Return STRICT JSON:
 }
 """
 
-    def evaluate(self, user_query: str, answer: str) -> dict:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+    async def evaluate(self, user_query: str, answer: str) -> dict:
+        content = await get_llm_client().chat(
+            [
                 {"role": "system", "content": self.SYSTEM_PROMPT},
                 {
                     "role": "user",
                     "content": f"USER QUERY:\n{user_query}\n\nASSISTANT ANSWER:\n{answer}",
                 },
-            ],
+            ]
         )
 
-        content = response.choices[0].message.content
-
         try:
             data = json.loads(content)
         except Exception:
@@ -1,8 +1,10 @@
-from openai import OpenAI
-from config import OPENAI_API_KEY
 import json
+from typing import Optional
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+from agent.router import Router
+from agent.tools import registry
+from config import ROUTER_ENABLED
+from llm_client import get_llm_client
 
 
 class Planner:
@@ -20,17 +22,16 @@ class Planner:
       "query": "<query to use for the chosen path>",
       "reason": "<short explanation>"
     }
+
+    Obvious queries are decided locally by the Router (no LLM call); the
+    "planner" key of the result says which path decided.
     """
 
     SYSTEM_PROMPT = """
-You are a planning module for an AI assistant th
-Uses an LLM-based planner to decide:
-
-"direct" → just answer from the model
-
-"rag" → use RAG with your vectorat has:
+You are a planning module for an AI assistant that has:
 - A RAG pipeline over user documents.
-- Optional tools for working with code (repo_read_file, repo_run_tests, repo_apply_patch).
+- Optional tools for working with code (repo_read_file, repo_list_files, repo_search_code,
+  repo_apply_patch, repo_run_tests).
 - A normal LLM that can answer general questions.
 
 Decide the best action for each user query.
@@ -58,6 +59,7 @@ Rules:
        - "repo_search_code"
        - "repo_apply_patch"
        - "repo_run_tests"
+   - For repo_search_code, "query" is the text to find; write /pattern/ for a regular expression.
 
 4. Never invent new tool names. If no suitable tool exists, prefer "rag_query" or "answer_direct".
 
@@ -71,18 +73,25 @@ Return STRICTLY valid JSON in this format (no comments, no extra keys):
 }
 """
 
-    def plan(self, user_query: str) -> dict:
+    def __init__(self, router: Optional[Router] = None, use_router: bool = ROUTER_ENABLED) -> None:
+        self.router = router or (Router() if use_router else None)
+
+    def fast_plan(self, user_query: str) -> Optional[dict]:
+        """Local routing decision, or None when the LLM planner is needed."""
+        return self.router.route(user_query) if self.router is not None else None
+
+    async def plan(self, user_query: str) -> dict:
+        return self.fast_plan(user_query) or await self.plan_with_llm(user_query)
+
+    async def plan_with_llm(self, user_query: str) -> dict:
         """Call the LLM planner and return a sanitized plan dict."""
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        content = await get_llm_client().chat(
+            [
                 {"role": "system", "content": self.SYSTEM_PROMPT},
                 {"role": "user", "content": user_query},
-            ],
+            ]
         )
 
-        content = response.choices[0].message.content
-
         # Robust JSON parsing + fallback
         try:
             plan = json.loads(content)
@@ -93,6 +102,7 @@ Return STRICTLY valid JSON in this format (no comments, no extra keys):
                 "tool_name": None,
                 "query": user_query,
                 "reason": "Failed to parse planner output, defaulting to RAG.",
+                "planner": "llm",
             }
 
         # --- Sanitization ---
@@ -101,7 +111,7 @@ Return STRICTLY valid JSON in this format (no comments, no extra keys):
             action = "rag_query"
 
         tool_name = plan.get("tool_name")
-        allowed_tools = {"repo_read_file", "repo_run_tests", "repo_apply_patch"}
+        allowed_tools = set(registry.tools)
 
         if action == "use_tool":
             if tool_name not in allowed_tools:
@@ -119,4 +129,5 @@ Return STRICTLY valid JSON in this format (no comments, no extra keys):
             "tool_name": tool_name,
             "query": query,
             "reason": reason,
+            "planner": "llm",
         }
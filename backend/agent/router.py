@@ -0,0 +1,301 @@
+import re
+import threading
+import time
+import zlib
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import ROUTER_K, ROUTER_MIN_CONFIDENCE, ROUTER_MIN_SIMILARITY
+
+# Labelled example queries for the nearest-neighbour vote. Tool examples
+# are here so tool-like queries the rules miss are not pulled towards
+# answer_direct; the kNN never emits use_tool itself (it cannot extract
+# the tool argument), it defers to the LLM planner instead.
+EXAMPLES: List[Tuple[str, str]] = [
+    # answer_direct: generic or conceptual questions
+    ("what is a vector database", "answer_direct"),
+    ("explain retrieval augmented generation", "answer_direct"),
+    ("what is ACID in databases", "answer_direct"),
+    ("how does BM25 ranking work", "answer_direct"),
+    ("what's the difference between TCP and UDP", "answer_direct"),
+    ("explain how transformers use attention", "answer_direct"),
+    ("what is a hash map", "answer_direct"),
+    ("how do I reverse a list in python", "answer_direct"),
+    ("what does idempotent mean", "answer_direct"),
+    ("give me an example of a python decorator", "answer_direct"),
+    ("what is the capital of france", "answer_direct"),
+    ("hi, how are you", "answer_direct"),
+    ("thanks!", "answer_direct"),
+    ("write a haiku about the ocean", "answer_direct"),
+    ("what is cosine similarity", "answer_direct"),
+    ("explain eventual consistency", "answer_direct"),
+    ("how does garbage collection work in java", "answer_direct"),
+    ("what are embeddings in machine learning", "answer_direct"),
+    ("define technical debt", "answer_direct"),
+    ("what is the big o of quicksort", "answer_direct"),
+    ("translate good morning into spanish", "answer_direct"),
+    ("what is kubernetes used for", "answer_direct"),
+    # rag_query: questions about the user's own material
+    ("summarize the pdf i uploaded", "rag_query"),
+    ("what does my document say about pricing", "rag_query"),
+    ("according to the paper, what dataset did they use", "rag_query"),
+    ("what are the key findings in the report", "rag_query"),
+    ("find the section about authentication in the spec", "rag_query"),
+    ("what did the meeting notes say about the deadline", "rag_query"),
+    ("what does our policy say about remote work", "rag_query"),
+    ("list the requirements from the design doc", "rag_query"),
+    ("what are the api rate limits in our docs", "rag_query"),
+    ("summarize chapter 3 of the book i uploaded", "rag_query"),
+    ("which experiments are described in the research paper", "rag_query"),
+    ("what does the contract say about termination", "rag_query"),
+    ("what metrics does the whitepaper report", "rag_query"),
+    ("in the uploaded slides what is the roadmap", "rag_query"),
+    ("what endpoints are documented in the api reference", "rag_query"),
+    ("what are the conclusions of the article i added", "rag_query"),
+    ("how does our onboarding guide describe the setup steps", "rag_query"),
+    ("what did the author say about limitations", "rag_query"),
+    ("compare the two proposals in my documents", "rag_query"),
+    ("what does the readme of the ingested repo say about installation", "rag_query"),
+    # use_tool: operating on the code repository
+    ("run the tests", "use_tool"),
+    ("run pytest on the ingestion module", "use_tool"),
+    ("open the file api/server.py", "use_tool"),
+    ("show me backend/config.py", "use_tool"),
+    ("list all python files", "use_tool"),
+    ("search the code for get_reranker", "use_tool"),
+    ("where is build_context defined", "use_tool"),
+    ("apply this patch", "use_tool"),
+    ("grep for TODO in the repo", "use_tool"),
+    ("find usages of embed_texts", "use_tool"),
+]
+
+_POLITE = r"^\s*(?:please\s+|pls\s+|can you\s+|could you\s+|would you\s+|go ahead and\s+|now\s+)*"
+_FILE_EXT = r"(?:py|js|jsx|ts|tsx|md|json|toml|ya?ml|txt|cfg|ini|sh|go|rs|java|c|h|cpp|hpp|sql|html|css)"
+
+# Mutating and exec requests: never settled locally. The planner (LLM) decides
+# whether and how to call repo_apply_patch / repo_run_tests.
+_RUN_TESTS = re.compile(_POLITE + r"(?:run|rerun|re-run|execute)\b.{0,30}\b(?:tests?|test suite|pytest|specs?)\b", re.I)
+_PATCH = re.compile(r"^(?:diff --git |--- a/|\+\+\+ b/|@@ )", re.M)
+_READ_FILE = re.compile(
+    _POLITE + r"(?:open|show(?: me)?|read|display|print|cat|view)\s+"
+    r"(?:the\s+)?(?:contents? of\s+)?(?:the\s+)?(?:file\s+)?"
+    r"[`'\"]?(?P<path>[\w./\-]+\." + _FILE_EXT + r")\b",
+    re.I,
+)
+_LIST_FILES = re.compile(
+    _POLITE + r"(?:(?:list|ls)\b.{0,30}\bfiles\b|(?:show|find)(?: me)?\b.{0,20}\*\.\w+)", re.I
+)
+_GLOB = re.compile(r"[\w./\-]*\*[\w.*/\-]*")
+_SEARCH_CODE = re.compile(
+    _POLITE + r"(?:grep(?: for)?|search (?:the )?(?:code|repo|codebase|repository) for|"
+    r"find (?:usages|references|occurrences|uses) of)\s+(?P<term>.+?)"
+    r"(?:\s+in the (?:code|repo|codebase|repository))?\s*\??$",
+    re.I,
+)
+_WHERE_DEFINED = re.compile(
+    r"^\s*where (?:is|are)\s+(?P<term>[`'\"]?[\w.]+[`'\"]?)\s+(?:defined|declared|implemented|used)\b", re.I
+)
+# Only possessive/upload wording is certain enough for a rule; "the report"
+# may be anyone's report, so those queries go to the kNN vote (or the LLM).
+_DOC_PHRASE = re.compile(
+    r"\b(?:my|our|uploaded|attached|ingested)\s+(?:uploaded\s+|attached\s+)?"
+    r"(?:docs?|documents?|pdfs?|notes|papers?|slides|reports?|whitepaper|spec|knowledge base)\b"
+    r"|\baccording to (?:my|our)\b|\bin (?:the|my) (?:file|upload)s? i (?:uploaded|added|sent)\b",
+    re.I,
+)
+
+# Words too generic for a document's stem alone to mean "search my documents"
+_GENERIC_WORDS = frozenset(
+    "doc docs document documents file files report reports notes note paper papers guide manual "
+    "spec specs readme index main test tests data config settings query queries draft final copy "
+    "new old untitled scan upload summary overview intro introduction slides presentation".split()
+)
+
+_DIM = 1 << 12
+# Function words carry no routing signal and would otherwise dominate short queries
+_STOPWORDS = frozenset(
+    "a an the of to in on for and or is are was be do does did what how which who why can "
+    "i me my you your it its this that these those with about from at by as me please".split()
+)
+
+
+def _features(text: str) -> np.ndarray:
+    """Hashed bag of content-word unigrams and character 3-grams, L2-normalized."""
+    vector = np.zeros(_DIM, dtype=np.float32)
+    words = [w for w in re.findall(r"\w+", text.lower()) if w not in _STOPWORDS]
+    for word in words:
+        vector[zlib.crc32(b"w:" + word.encode()) % _DIM] += 1.0
+        padded = f" {word} ".encode()
+        for i in range(len(padded) - 2):
+            vector[zlib.crc32(padded[i:i + 3]) % _DIM] += 0.5
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class Router:
+    """
+    Local fast path for the planner.
+
+    Keyword rules catch read-only tool requests ("open api/server.py" for
+    a file that exists, "grep for X") and queries that name an ingested
+    document. Everything else gets a similarity-weighted vote among the
+    nearest labelled examples. route() returns a plan only when it is
+    confident; None means "ask the LLM planner". Requests that would change
+    the repo or execute something (a pasted diff, "run the tests") always
+    go to the planner.
+    """
+
+    SOURCES_TTL_S = 30.0
+
+    def __init__(
+        self,
+        examples: Sequence[Tuple[str, str]] = EXAMPLES,
+        k: int = ROUTER_K,
+        min_confidence: float = ROUTER_MIN_CONFIDENCE,
+        min_similarity: float = ROUTER_MIN_SIMILARITY,
+        sources: Optional[Callable[[], List[str]]] = None,
+        path_exists: Optional[Callable[[str], bool]] = None,
+    ):
+        self.k = k
+        self.min_confidence = min_confidence
+        self.min_similarity = min_similarity
+        self.labels = [label for _, label in examples]
+        self.matrix = np.stack([_features(text) for text, _ in examples])
+        self._sources = sources or _registry_sources
+        self._path_exists = path_exists or _repo_file_exists
+        self._sources_lock = threading.Lock()
+        self._source_re: Optional[re.Pattern] = None
+        self._source_names: frozenset = frozenset()
+        self._sources_at = float("-inf")
+
+    # --------------------------
+    # Rules
+    # --------------------------
+    def _source_pattern(self) -> Optional[re.Pattern]:
+        """
+        Regex matching an uploaded document (PDF, URL) by its file name, or
+        by its spaced-out stem when that is distinctive enough. Ingested
+        repo files are left out: their names ("config.py") are ordinary words.
+        """
+        now = time.monotonic()
+        if now - self._sources_at > self.SOURCES_TTL_S:
+            with self._sources_lock:
+                if now - self._sources_at > self.SOURCES_TTL_S:
+                    names = frozenset(
+                        re.escape(name)
+                        for source in self._sources()
+                        if not source.startswith("repo:")
+                        for name in _document_names(source)
+                    )
+                    if names != self._source_names:
+                        self._source_names = names
+                        self._source_re = (
+                            re.compile(r"\b(?:" + "|".join(sorted(names, key=len, reverse=True)) + r")\b")
+                            if names else None
+                        )
+                    self._sources_at = now
+        return self._source_re
+
+    @staticmethod
+    def needs_planner(query: str) -> bool:
+        """A diff or a request to run something: only the planner may pick those tools."""
+        return bool(_PATCH.search(query) or _RUN_TESTS.search(query))
+
+    def rules(self, query: str) -> Optional[dict]:
+        m = _READ_FILE.search(query)
+        if m and self._path_exists(m.group("path")):
+            return _tool_plan("repo_read_file", m.group("path"), "asked to open a file")
+
+        m = _LIST_FILES.search(query)
+        if m:
+            glob = _GLOB.search(query)
+            return _tool_plan("repo_list_files", glob.group(0) if glob else "", "asked to list files")
+
+        m = _SEARCH_CODE.search(query) or _WHERE_DEFINED.search(query)
+        if m:
+            term = m.group("term").strip().strip("`'\"")
+            if term and len(term.split()) <= 3:
+                return _tool_plan("repo_search_code", term, "asked to search the code")
+
+        pattern = self._source_pattern()
+        if pattern is not None and pattern.search(query.lower()):
+            return _plan("rag_query", query, "names an ingested document", 1.0)
+        if _DOC_PHRASE.search(query):
+            return _plan("rag_query", query, "refers to the user's documents", 1.0)
+        return None
+
+    # --------------------------
+    # Nearest neighbours
+    # --------------------------
+    def knn(self, query: str) -> Tuple[str, float, float]:
+        """(winning label, vote share, best similarity) among the k nearest examples."""
+        sims = self.matrix @ _features(query)
+        k = min(self.k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        votes: dict = {}
+        for i in top:
+            votes[self.labels[i]] = votes.get(self.labels[i], 0.0) + max(float(sims[i]), 0.0)
+        total = sum(votes.values())
+        if not total:
+            return "", 0.0, 0.0
+        label = max(votes, key=votes.get)
+        return label, votes[label] / total, float(sims[top].max())
+
+    def route(self, query: str) -> Optional[dict]:
+        if self.needs_planner(query):
+            return None
+        plan = self.rules(query)
+        if plan is not None:
+            return plan
+        label, confidence, similarity = self.knn(query)
+        if (
+            label in ("answer_direct", "rag_query")
+            and confidence >= self.min_confidence
+            and similarity >= self.min_similarity
+        ):
+            return _plan(label, query, f"nearest examples ({similarity:.2f} similar)", confidence)
+        return None
+
+
+def _plan(action: str, query: str, reason: str, confidence: float, tool_name: Optional[str] = None) -> dict:
+    return {
+        "action": action,
+        "tool_name": tool_name,
+        "query": query,
+        "reason": f"router: {reason}",
+        "planner": "router",
+        "confidence": round(confidence, 3),
+    }
+
+
+def _tool_plan(tool_name: str, tool_input: str, reason: str) -> dict:
+    return _plan("use_tool", tool_input, reason, 1.0, tool_name)
+
+
+def _document_names(source: str) -> List[str]:
+    """Lower-cased names a query may use for the document: the file name, and a distinctive stem."""
+    base = source.rstrip("/").rsplit("/", 1)[-1].lower()
+    names = [base] if len(base) >= 4 and "." in base else []
+    stem = re.sub(r"[_\-.]+", " ", base.rsplit(".", 1)[0]).strip()
+    words = stem.split()
+    informative = [w for w in words if w not in _STOPWORDS and w not in _GENERIC_WORDS and not w.isdigit()]
+    if informative and (len(words) >= 2 or any(c.isdigit() for c in stem) or len(stem) >= 8):
+        names.append(stem)
+    return names
+
+
+def _registry_sources() -> List[str]:
+    from ingestion.documents import get_document_registry
+
+    return get_document_registry().sources()
+
+
+def _repo_file_exists(rel_path: str) -> bool:
+    from mcp_tools.repo_tools import REPO_ROOT
+
+    try:
+        target = (REPO_ROOT / rel_path).resolve()
+    except (OSError, ValueError):
+        return False
+    return target.is_relative_to(REPO_ROOT) and target.is_file()
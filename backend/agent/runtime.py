@@ -1,103 +1,427 @@
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+
 from agent.planner import Planner
 from agent.evaluator import Evaluator
-from rag.retriever import Retriever
+from rag.service import RetrievalService, get_retrieval_service
 from rag.context_builder import build_context
+from rag.query_expansion import QueryExpander
 from agent.tools import registry
-from openai import OpenAI
-from config import OPENAI_API_KEY
+from llm_client import get_llm_client
+from tracing import count, span
+from config import (
+    AGENT_EXECUTION,
+    AGENT_RACE_ANSWERS,
+    AGENT_EVALUATION,
+    AGENT_EVAL_BUDGET_MS,
+    AGENT_REUSE_MIN_OVERLAP,
+)
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
 
+_WORD_RE = re.compile(r"\w+")
+
+
+def _overlap(a: str, b: str) -> float:
+    """Jaccard overlap of the word sets of two queries."""
+    wa, wb = set(_WORD_RE.findall(a.lower())), set(_WORD_RE.findall(b.lower()))
+    if not wa or not wb:
+        return float(wa == wb)
+    return len(wa & wb) / len(wa | wb)
+
+
+class StageTimings:
+    """Wall-clock duration of each agent stage, in milliseconds (also traced as "agent.<stage>")."""
 
-class AgentRuntime:
     def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def elapsed_ms(self) -> float:
+        return 1000 * (time.perf_counter() - self.start)
+
+    async def timed(self, name: str, awaitable: Awaitable):
+        begin = time.perf_counter()
+        try:
+            with span(f"agent.{name}"):
+                return await awaitable
+        finally:
+            self.stages[name] = round(1000 * (time.perf_counter() - begin), 2)
+
+
+@dataclass
+class AgentResult:
+    answer: str
+    plan: dict
+    timings_ms: Dict[str, float]
+    evaluation: Optional[dict] = None
+    retried_with_rag: bool = False
+    # What was started speculatively and whether it was used or cancelled
+    speculation: Dict[str, str] = field(default_factory=dict)
+
+
+class AgentRuntime:
+    def __init__(self, service: Optional[RetrievalService] = None) -> None:
         self.planner = Planner()
         self.evaluator = Evaluator()
-        self.retriever = Retriever()
+        self.expander = QueryExpander()
+        self._service = service
+
+    @property
+    def service(self) -> RetrievalService:
+        # Resolved lazily so the runtime can be created at import time
+        return self._service or get_retrieval_service()
+
+    @property
+    def retriever(self):
+        """Retriever bound to the current corpus snapshot."""
+        return self.service.current().retriever
 
     # ------------------------
     # Answer strategies
     # ------------------------
-    def answer_direct(self, query: str) -> str:
+    @staticmethod
+    def _direct_messages(query: str) -> List[dict]:
+        return [
+            {
+                "role": "system",
+                "content": "You are a helpful assistant. Answer using your own knowledge.",
+            },
+            {"role": "user", "content": query},
+        ]
+
+    @staticmethod
+    def _rag_messages(query: str, passages: List[dict]) -> List[dict]:
+        context = build_context(passages)
+        return [
+            {"role": "system", "content": context},
+            {"role": "user", "content": query},
+        ]
+
+    async def answer_direct(self, query: str) -> str:
         """LLM-only answering (no RAG, no tools)."""
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant. Answer using your own knowledge.",
-                },
-                {"role": "user", "content": query},
-            ],
-        )
-        return response.choices[0].message.content
-
-    def answer_with_rag(self, query: str) -> str:
-        """Use retriever + context builder + LLM for grounded answer."""
-        # Prefer hybrid if implemented; fall back to vector search otherwise
-        if hasattr(self.retriever, "hybrid_search"):
-            chunks = self.retriever.hybrid_search(query, k=5)
-        else:
-            # Simple vector-only
-            chunks = self.retriever.retrieve(query, k=5)
-
-        context = build_context(chunks)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": context},
-                {"role": "user", "content": query},
-            ],
-        )
-        return response.choices[0].message.content
-
-    def use_tool(self, tool_name: str, tool_input: str) -> str:
+        return await get_llm_client().chat(self._direct_messages(query))
+
+    async def retrieve(self, query: str) -> List[dict]:
+        # With RETRIEVAL_EXPANSION, sub-queries / a hypothetical answer are searched
+        # too, so multi-part questions are covered without an evaluator-driven retry
+        retriever = self.retriever
+        expansion = await self.expander.expand(query)
+        # Retrieval is blocking (SQLite, NumPy, embedding call); keep it off the event loop.
+        # Cancelling the caller does not stop the worker thread, only stops waiting for it.
+        if expansion.expanded:
+            return await asyncio.to_thread(
+                retriever.multi_search, expansion.queries, 5, hypothetical=expansion.hypothetical
+            )
+        return await asyncio.to_thread(retriever.hybrid_search, query, 5)
+
+    async def answer_with_rag(self, query: str, passages: Optional[Awaitable[List[dict]]] = None) -> str:
+        """
+        Use retriever + context builder + LLM for grounded answer.
+        `passages` may be an already running retrieval to reuse.
+        """
+        passages = await (passages if passages is not None else self.retrieve(query))
+        return await get_llm_client().chat(self._rag_messages(query, passages))
+
+    async def use_tool(self, tool_name: str, tool_input: str) -> str:
         """Dispatch to a registered tool."""
         # If somehow tool_name is None or invalid, gracefully fall back
         if not tool_name:
-            return self.answer_direct(
+            return await self.answer_direct(
                 f"Tool name was missing, falling back to direct answer. Original input: {tool_input}"
             )
 
         try:
-            return registry.call(tool_name, tool_input)
+            # Tools touch the filesystem or run subprocesses
+            return await asyncio.to_thread(registry.call, tool_name, tool_input)
         except KeyError:
             # Safety: don't crash if planner suggested something wrong
-            return self.answer_with_rag(
+            return await self.answer_with_rag(
                 f"Tool '{tool_name}' was not found. Please answer using RAG. Original input: {tool_input}"
             )
 
     # ------------------------
     # Main entrypoint
     # ------------------------
-    def run(self, user_query: str) -> str:
+    async def run(self, user_query: str) -> str:
+        return (await self.execute(user_query)).answer
+
+    async def execute(self, user_query: str, mode: Optional[str] = None) -> AgentResult:
+        mode = mode or AGENT_EXECUTION
+        if mode == "sequential":
+            return await self._run_sequential(user_query)
+        if mode == "speculative":
+            return await self._run_speculative(user_query)
+        raise ValueError(f"Unknown agent execution mode: {mode}")
+
+    async def _run_sequential(self, user_query: str) -> AgentResult:
         """
         Full agent loop:
         1. Planner: decide action + (optional) tool.
         2. Execute: direct / RAG / tool.
         3. Evaluator: decide if we need a RAG retry.
         """
+        timings = StageTimings()
 
         # 1. Plan
-        plan = self.planner.plan(user_query)
-        print("PLAN:", plan)
+        plan = await timings.timed("plan", self.planner.plan(user_query))
+        logger.debug("PLAN: %s", plan)
+        count("agent_plans_total", action=plan["action"], planner=plan.get("planner", "llm"))
         action = plan["action"]
         tool_name = plan.get("tool_name")
         query = plan["query"]
 
         # 2. Execute according to plan
         if action == "rag_query":
-            answer = self.answer_with_rag(query)
+            answer = await timings.timed("answer_rag", self.answer_with_rag(query))
         elif action == "use_tool":
-            answer = self.use_tool(tool_name, query)
+            answer = await timings.timed("tool", self.use_tool(tool_name, query))
         else:  # "answer_direct"
-            answer = self.answer_direct(query)
+            answer = await timings.timed("answer_direct", self.answer_direct(query))
 
         # 3. Evaluate answer quality / groundedness
-        evaluation = self.evaluator.evaluate(user_query, answer)
+        evaluation = await timings.timed("evaluate", self.evaluator.evaluate(user_query, answer))
 
+        result = AgentResult(answer, plan, timings.stages, evaluation)
         if evaluation["needs_rag"] and action != "rag_query":
             # Retry using RAG if evaluator thinks we need it
-            return self.answer_with_rag(user_query)
+            result.answer = await timings.timed("retry_rag", self.answer_with_rag(user_query))
+            result.retried_with_rag = True
+            count("agent_rag_retries_total")
+
+        timings.stages["total"] = round(timings.elapsed_ms(), 2)
+        return result
+
+    def _should_evaluate(self, action: str, timings: StageTimings) -> bool:
+        if AGENT_EVALUATION == "always":
+            return True
+        if AGENT_EVALUATION == "never":
+            return False
+        # A RAG answer cannot be retried with RAG, so evaluating it only adds latency
+        if action == "rag_query":
+            return False
+        return timings.elapsed_ms() < AGENT_EVAL_BUDGET_MS
+
+    async def _run_speculative(self, user_query: str) -> AgentResult:
+        """
+        Same decisions as the sequential loop, with less waiting:
+
+        - The local router (agent.router) may settle the plan immediately;
+          otherwise retrieval for the user's query starts while the LLM
+          planner runs.
+        - With AGENT_RACE_ANSWERS, the direct and RAG answers also start
+          right away; the one the plan does not pick is cancelled.
+        - Speculative work is reused when the planner's rewrite of the
+          query is close to the original (AGENT_REUSE_MIN_OVERLAP).
+        - Evaluation is skipped when it cannot change the outcome or the
+          request is over AGENT_EVAL_BUDGET_MS (AGENT_EVALUATION="auto").
+          A RAG retry reuses the speculative retrieval or answer.
+        """
+        timings = StageTimings()
+        speculation: Dict[str, str] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        def spawn(name: str, awaitable: Awaitable) -> asyncio.Task:
+            tasks[name] = asyncio.create_task(timings.timed(name, awaitable))
+            speculation[name] = "started"
+            return tasks[name]
+
+        def use(name: str) -> Optional[asyncio.Task]:
+            task = tasks.get(name)
+            if task is not None and not task.cancelled():
+                speculation[name] = "used"
+                if name == "answer_rag":
+                    speculation["retrieve"] = "used"  # consumed inside the RAG answer
+                return task
+            return None
+
+        def cancel(*names: str) -> None:
+            for name in names:
+                task = tasks.get(name)
+                if task is not None and not task.done():
+                    task.cancel()
+                    speculation[name] = "cancelled"
+
+        try:
+            # A local routing decision takes microseconds; only speculate while the LLM plans
+            begin = time.perf_counter()
+            fast = self.planner.fast_plan(user_query)
+            timings.stages["route"] = round(1000 * (time.perf_counter() - begin), 3)
+
+            retrieval = None
+            if fast is None or fast["action"] == "rag_query":
+                retrieval = spawn("retrieve", self.retrieve(user_query))
+            if AGENT_RACE_ANSWERS and fast is None:
+                spawn("answer_rag", self.answer_with_rag(user_query, asyncio.shield(retrieval)))
+                spawn("answer_direct", self.answer_direct(user_query))
+
+            plan = fast or await timings.timed("plan", self.planner.plan_with_llm(user_query))
+            logger.debug("PLAN: %s", plan)
+            count("agent_plans_total", action=plan["action"], planner=plan.get("planner", "llm"))
+            action = plan["action"]
+            query = plan["query"]
+            reuse = _overlap(user_query, query) >= AGENT_REUSE_MIN_OVERLAP
+            if not reuse:
+                cancel("answer_rag", "answer_direct")
+
+            if action == "rag_query":
+                cancel("answer_direct")
+                if reuse and use("answer_rag"):
+                    answer = await tasks["answer_rag"]
+                elif reuse and use("retrieve"):
+                    answer = await timings.timed("answer_rag", self.answer_with_rag(query, retrieval))
+                else:
+                    cancel("retrieve")
+                    answer = await timings.timed("answer_rag", self.answer_with_rag(query))
+            elif action == "use_tool":
+                cancel("answer_direct", "answer_rag")
+                answer = await timings.timed("tool", self.use_tool(plan.get("tool_name"), query))
+            else:  # "answer_direct"
+                if reuse and use("answer_direct"):
+                    answer = await tasks["answer_direct"]
+                else:
+                    cancel("answer_direct")
+                    answer = await timings.timed("answer_direct", self.answer_direct(query))
+
+            result = AgentResult(answer, plan, timings.stages, speculation=speculation)
+            if self._should_evaluate(action, timings):
+                result.evaluation = await timings.timed(
+                    "evaluate", self.evaluator.evaluate(user_query, answer)
+                )
+                if result.evaluation["needs_rag"] and action != "rag_query":
+                    # The retry is on the user's own query, so speculation always applies
+                    if use("answer_rag"):
+                        result.answer = await tasks["answer_rag"]
+                    else:
+                        retry = self.answer_with_rag(user_query, retrieval if use("retrieve") else None)
+                        result.answer = await timings.timed("retry_rag", retry)
+                    result.retried_with_rag = True
+                    count("agent_rag_retries_total")
+        finally:
+            cancel(*tasks)
+            for name, task in tasks.items():
+                if task.done() and not task.cancelled():
+                    task.exception()  # consumed, so unused failures are not logged as unretrieved
+                    if speculation[name] == "started":
+                        speculation[name] = "unused"
+
+        timings.stages["total"] = round(timings.elapsed_ms(), 2)
+        logger.debug("Agent timings: %s", timings.stages)
+        return result
+
+    # ------------------------
+    # Streaming
+    # ------------------------
+    async def stream(self, user_query: str) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Run the agent and yield (event, data) pairs as work completes:
+
+            plan        the chosen plan (as soon as it is known)
+            progress    {"stage", "status": "started" | "done", "ms"}
+            passages    retrieved passages, before the RAG answer starts
+            token       {"text"} answer deltas (a tool result arrives as one token)
+            reset       the answer so far is discarded: a RAG retry follows
+            done        final answer, plan, evaluation and timings_ms
+
+        Decisions match _run_speculative, but answers are never raced: a
+        streamed answer cannot be taken back once its tokens are sent.
+        Closing the generator (client disconnected) cancels pending work.
+        """
+        timings = StageTimings()
+        retrieval: Optional[asyncio.Task] = None
+        state = {"first_token": False}
+
+        def progress(stage: str, status: str) -> Tuple[str, dict]:
+            return "progress", {"stage": stage, "status": status, "ms": round(timings.elapsed_ms(), 2)}
+
+        def token(text: str) -> Tuple[str, dict]:
+            if not state["first_token"]:
+                state["first_token"] = True
+                timings.stages["first_token"] = round(timings.elapsed_ms(), 2)
+            return "token", {"text": text}
+
+        async def stream_answer(stage: str, messages: List[dict], parts: List[str]):
+            yield progress(stage, "started")
+            begin = time.perf_counter()
+            async for delta in get_llm_client().stream_chat(messages):
+                parts.append(delta)
+                yield token(delta)
+            timings.stages[stage] = round(1000 * (time.perf_counter() - begin), 2)
+            yield progress(stage, "done")
+
+        try:
+            begin = time.perf_counter()
+            fast = self.planner.fast_plan(user_query)
+            timings.stages["route"] = round(1000 * (time.perf_counter() - begin), 3)
+            if fast is None or fast["action"] == "rag_query":
+                retrieval = asyncio.create_task(timings.timed("retrieve", self.retrieve(user_query)))
+
+            if fast is None:
+                yield progress("plan", "started")
+                plan = await timings.timed("plan", self.planner.plan_with_llm(user_query))
+                yield progress("plan", "done")
+            else:
+                plan = fast
+            count("agent_plans_total", action=plan["action"], planner=plan.get("planner", "llm"))
+            yield "plan", plan
+            action = plan["action"]
+            query = plan["query"]
+
+            parts: List[str] = []
+            if action == "rag_query":
+                yield progress("retrieve", "started")
+                if retrieval is not None and _overlap(user_query, query) >= AGENT_REUSE_MIN_OVERLAP:
+                    passages = await retrieval
+                else:
+                    passages = await timings.timed("retrieve", self.retrieve(query))
+                yield progress("retrieve", "done")
+                yield "passages", {"used_passages": passages}
+                async for event in stream_answer("answer_rag", self._rag_messages(query, passages), parts):
+                    yield event
+            elif action == "use_tool":
+                yield progress("tool", "started")
+                parts.append(await timings.timed("tool", self.use_tool(plan.get("tool_name"), query)))
+                yield progress("tool", "done")
+                yield token(parts[-1])
+            else:  # "answer_direct"
+                async for event in stream_answer("answer_direct", self._direct_messages(query), parts):
+                    yield event
+
+            answer = "".join(parts)
+            evaluation = None
+            retried = False
+            if self._should_evaluate(action, timings):
+                yield progress("evaluate", "started")
+                evaluation = await timings.timed("evaluate", self.evaluator.evaluate(user_query, answer))
+                yield progress("evaluate", "done")
+                if evaluation["needs_rag"] and action != "rag_query":
+                    yield "reset", {"reason": "evaluator requested a grounded answer"}
+                    if retrieval is None:
+                        retrieval = asyncio.create_task(timings.timed("retrieve", self.retrieve(user_query)))
+                    passages = await retrieval
+                    yield "passages", {"used_passages": passages}
+                    parts = []
+                    async for event in stream_answer("retry_rag", self._rag_messages(user_query, passages), parts):
+                        yield event
+                    answer = "".join(parts)
+                    retried = True
+                    count("agent_rag_retries_total")
 
-        return answer
+            timings.stages["total"] = round(timings.elapsed_ms(), 2)
+            yield "done", {
+                "answer": answer,
+                "plan": plan,
+                "evaluation": evaluation,
+                "retried_with_rag": retried,
+                "timings_ms": timings.stages,
+            }
+        finally:
+            if retrieval is not None:
+                if not retrieval.done():
+                    retrieval.cancel()
+                elif not retrieval.cancelled():
+                    retrieval.exception()
@@ -23,31 +23,33 @@ registry = ToolsRegistry()
 
 
 # ---- Example stub tool implementations ----
-def repo_read_file(self, rel_path: str) -> Dict[str, Any]:
+def repo_read_file(rel_path: str) -> Dict[str, Any]:
     """
     Read file contents from repository.
     """
     content = repo_tools.read_file(rel_path)
     return {"path": rel_path, "content": content}
-def repo_list_files(self, glob_pattern: str) -> Dict[str, Any]:
+def repo_list_files(glob_pattern: str) -> Dict[str, Any]:
     """
     List files under the repo matching a glob pattern (e.g., '**/*.py').
     """
     files = repo_tools.list_files(glob_pattern or "**/*.py")
     return {"glob": glob_pattern, "files": files}
-def repo_search_code(self, query: str) -> Dict[str, Any]:
+def repo_search_code(query: str) -> Dict[str, Any]:
     """
     Search code for a string and return top matches.
+    A query written as /pattern/ is a regular expression.
     """
-    hits = repo_tools.search_code(query)
+    regex = len(query) > 2 and query.startswith("/") and query.endswith("/")
+    hits = repo_tools.search_code(query[1:-1] if regex else query, regex=regex)
     return {"query": query, "hits": hits}
-def repo_apply_patch(self, patch_text: str) -> Dict[str, Any]:
+def repo_apply_patch(patch_text: str) -> Dict[str, Any]:
     """
     Apply patch to repo using 'patch -p1'.
     """
     result = repo_tools.apply_patch(patch_text)
     return {"patch": patch_text, **result}
-def repo_run_tests(self, command: str) -> Dict[str, Any]:
+def repo_run_tests(command: str) -> Dict[str, Any]:
     """
     Run tests (default 'pytest -q' if command is empty).
     """
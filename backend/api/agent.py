@@ -1,5 +1,12 @@
-from fastapi import APIRouter
+import asyncio
+import time
+
+from fastapi import APIRouter, WebSocket
 from agent.runtime import AgentRuntime
+from rag.answer_cache import get_answer_cache
+from tracing import span, start_trace, trace
+from api.streaming import Events, sse_response, serve_websocket
+from config import TRACE_RESPONSES
 
 router = APIRouter()
 runtime = AgentRuntime()
@@ -12,9 +19,98 @@ async def agent_query(payload: dict):
 
     Example body:
     {
-      "query": "Summarize the PDF I uploaded about RAG pipelines."
+      "query": "Summarize the PDF I uploaded about RAG pipelines.",
+      "mode": "speculative"   # optional: "speculative" | "sequential"
     }
+
+    The response includes per-stage timings in milliseconds; "trace": true
+    adds the full breakdown (retrieval, LLM calls, tokens, cache hits).
+    Repeated (or near-identical) questions are answered from the answer
+    cache; pass "cache": false to bypass it.
     """
+    with trace() as t:
+        response = await _agent_query(payload)
+    if payload.get("trace", TRACE_RESPONSES):
+        response["trace"] = t.breakdown()
+    return response
+
+
+async def _cache_lookup(payload: dict, query: str):
+    cache = get_answer_cache()
+    if cache is None or not payload.get("cache", True):
+        return cache, None
+    generation = runtime.service.current().generation
+    with span("cache_lookup"):
+        return cache, await asyncio.to_thread(cache.lookup, "agent", query, generation)
+
+
+async def _agent_query(payload: dict) -> dict:
     query = payload["query"]
-    answer = runtime.run(query)
-    return {"answer": answer}
+    start = time.perf_counter()
+
+    cache, lookup = await _cache_lookup(payload, query)
+    if lookup is not None and lookup.hit:
+        elapsed = round(1000 * (time.perf_counter() - start), 2)
+        return {**lookup.value, "cache": lookup.tier, "timings_ms": {"cache": elapsed, "total": elapsed}}
+
+    result = await runtime.execute(query, mode=payload.get("mode"))
+    response = {
+        "answer": result.answer,
+        "plan": result.plan,
+        "timings_ms": result.timings_ms,
+        "retried_with_rag": result.retried_with_rag,
+        "speculation": result.speculation,
+    }
+    # Tool results (test runs, file contents) change independently of the corpus
+    if lookup is not None and result.plan["action"] != "use_tool":
+        await asyncio.to_thread(cache.put, lookup, response, 1000 * (time.perf_counter() - start))
+    return {**response, "cache": None}
+
+
+async def agent_events(payload: dict) -> Events:
+    """
+    The agent run as events: "plan", "progress", "passages", "token",
+    "reset" and "done" (see AgentRuntime.stream). Cache hits replay the
+    stored answer as a single token. With "trace": true, "done" carries
+    the trace breakdown.
+    """
+    query = payload["query"]
+    start = time.perf_counter()
+    t = start_trace()
+
+    def traced(data: dict) -> dict:
+        return {**data, "trace": t.breakdown()} if payload.get("trace", TRACE_RESPONSES) else data
+
+    cache, lookup = await _cache_lookup(payload, query)
+    if lookup is not None and lookup.hit:
+        elapsed = round(1000 * (time.perf_counter() - start), 2)
+        yield "plan", lookup.value["plan"]
+        yield "token", {"text": lookup.value["answer"]}
+        yield "done", traced({**lookup.value, "cache": lookup.tier, "timings_ms": {"cache": elapsed, "total": elapsed}})
+        return
+
+    async for event, data in runtime.stream(query):
+        if event == "done":
+            response = {
+                "answer": data["answer"],
+                "plan": data["plan"],
+                "timings_ms": data["timings_ms"],
+                "retried_with_rag": data["retried_with_rag"],
+                "speculation": {},
+            }
+            if lookup is not None and data["plan"]["action"] != "use_tool":
+                await asyncio.to_thread(cache.put, lookup, response, 1000 * (time.perf_counter() - start))
+            data = traced({**data, "cache": None})
+        yield event, data
+
+
+@router.post("/agent/stream")
+async def agent_query_stream(payload: dict):
+    """/agent as Server-Sent Events (see agent_events for the event sequence)."""
+    return sse_response(agent_events(payload))
+
+
+@router.websocket("/ws/agent")
+async def agent_query_ws(websocket: WebSocket):
+    """Send {"query": ...} messages; each is answered with the agent_events stream."""
+    await serve_websocket(websocket, agent_events)
@@ -1,39 +1,119 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, HTTPException
 from ingestion.pipeline import IngestionPipeline
+from ingestion.jobs import IngestJobManager
+import hashlib
 import os
-from vectorstore.chroma_store import ChromaStore
+import uuid
+from vectorstore.factory import get_vector_store
+from ingestion.embedding_cache import get_embedding_cache
+from rag.service import get_retrieval_service
+from rag.answer_cache import get_answer_cache
+from config import KEEP_UPLOADS, UPLOAD_DIR
 
+UPLOAD_READ_BYTES = 1024 * 1024
 
 router = APIRouter()
 pipeline = IngestionPipeline()
+jobs = IngestJobManager(pipeline)
 
-@router.post("/ingest/pdf")
-async def ingest_pdf(file: UploadFile = File(...)):
-    path = f"data/uploads/{file.filename}"
-    os.makedirs("data/uploads", exist_ok=True)
-    with open(path, "wb") as f:
-        f.write(await file.read())
+@router.post("/ingest/pdf", status_code=202)
+def ingest_pdf(file: UploadFile = File(...)):
+    """
+    Stream the upload to disk while hashing it, then queue an ingest job.
+    Poll GET /ingest/jobs/{job_id} for status and progress.
 
-    count = pipeline.ingest_pdf(path)
-    return {"status": "ok", "chunks_stored": count}
+    A plain (sync) handler: FastAPI runs it in the threadpool, so the file
+    I/O never blocks the event loop. The stored copy is deleted when its
+    job finishes unless KEEP_UPLOADS is set.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    tmp_path = os.path.join(UPLOAD_DIR, f".{upload_id}.part")
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as f:
+            while block := file.file.read(UPLOAD_READ_BYTES):
+                digest.update(block)
+                f.write(block)
+    except BaseException:
+        _remove(tmp_path)
+        raise
 
+    content_hash = digest.hexdigest()
+    filename = os.path.basename(file.filename or "upload.pdf")
+    # Unique per upload: a finished job deleting its file never races a new upload of the same PDF
+    path = os.path.join(UPLOAD_DIR, f"{content_hash[:16]}-{upload_id[:8]}-{filename}")
+    os.replace(tmp_path, path)
 
-@router.post("/ingest/url")
+    # The file name is the document's identity: re-uploading it replaces the old version
+    job, deduplicated = jobs.submit_pdf(path, content_hash, source=filename, delete_after=not KEEP_UPLOADS)
+    if deduplicated:
+        _remove(path)  # the running job reads its own copy
+    return {"status": job["status"], "job_id": job["id"], "deduplicated": deduplicated}
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def clean_uploads() -> int:
+    """
+    Startup sweep, returning how many files were removed: partial uploads
+    (*.part) and, unless KEEP_UPLOADS is set, PDFs whose job was lost with
+    the previous process (jobs live in memory, so nothing will read them).
+    """
+    removed = 0
+    if os.path.isdir(UPLOAD_DIR):
+        for name in os.listdir(UPLOAD_DIR):
+            if name.endswith(".part") or not KEEP_UPLOADS:
+                _remove(os.path.join(UPLOAD_DIR, name))
+                removed += 1
+    return removed
+
+
+@router.post("/ingest/url", status_code=202)
 async def ingest_url(payload: dict):
     url = payload["url"]
-    count = pipeline.ingest_url(url)
-    return {"status": "ok", "chunks_stored": count}
+    job, deduplicated = jobs.submit_url(url)
+    return {"status": job["status"], "job_id": job["id"], "deduplicated": deduplicated}
+
+
+@router.get("/ingest/jobs/{job_id}")
+def ingest_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+@router.get("/ingest/jobs")
+def ingest_jobs():
+    return {"jobs": jobs.list()}
 
 
 ## Debug endpoints
 @router.get("/debug/chunks")
 def debug_chunks():
-    store = ChromaStore()
-    results = store.collection.get(include=["documents"])
+    results = get_vector_store().get(include=["documents"])
     return {"documents": results["documents"], "ids": results["ids"]}
 
 @router.get("/debug/embeddings")
 def debug_embeddings():
-    store = ChromaStore()
-    results = store.collection.get(include=["embeddings"])
+    results = get_vector_store().get(include=["embeddings"])
     return {"embeddings_shape": len(results["embeddings"][0])}
+
+@router.get("/debug/embedding-cache")
+def debug_embedding_cache():
+    return get_embedding_cache().snapshot_stats()
+
+@router.get("/debug/retrieval")
+def debug_retrieval():
+    return get_retrieval_service().stats()
+
+@router.get("/debug/answer-cache")
+def debug_answer_cache():
+    cache = get_answer_cache()
+    return cache.snapshot_stats() if cache is not None else {"enabled": False}
@@ -0,0 +1,88 @@
+import time
+from typing import Dict
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+import tracing
+from ingestion.embedding_cache import get_embedding_cache
+from rag.answer_cache import get_answer_cache
+from rag.service import get_retrieval_service
+
+router = APIRouter()
+
+
+class MetricsMiddleware:
+    """
+    Counts requests and observes their duration per route template (not
+    per concrete path, which would explode the number of series). For
+    streamed responses the duration covers the whole stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._paths: Dict[object, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if endpoint not in self._paths:
+            for route in getattr(scope.get("app"), "routes", []):
+                if getattr(route, "endpoint", None) is endpoint:
+                    self._paths[endpoint] = route.path
+                    break
+            else:
+                self._paths[endpoint] = getattr(endpoint, "__name__", "other")
+        return self._paths[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        begin = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._route(scope)
+            tracing.count("http_requests_total", method=scope["method"], route=route, status=status["code"])
+            tracing.observe("http_request_duration_seconds", time.perf_counter() - begin, route=route)
+
+
+def _service_gauges():
+    stats = get_retrieval_service().stats()
+    return {
+        (("kind", "generation"),): stats["generation"],
+        (("kind", "bm25_docs"),): stats["bm25_docs"],
+        (("kind", "ingests_in_flight"),): stats["ingests_in_flight"],
+    }
+
+
+def _cache_gauges():
+    values = {}
+    answers = get_answer_cache()
+    if answers is not None:
+        stats = answers.snapshot_stats()
+        values[(("cache", "answer"), ("kind", "items"))] = stats["items"]
+        values[(("cache", "answer"), ("kind", "hit_rate"))] = stats["hit_rate"]
+    embeddings = get_embedding_cache().snapshot_stats()
+    values[(("cache", "embedding"), ("kind", "items"))] = embeddings["memory_items"]
+    values[(("cache", "embedding"), ("kind", "hit_rate"))] = embeddings["hit_rate"]
+    return values
+
+
+tracing.METRICS.gauge("retrieval_state", _service_gauges, "Current retrieval snapshot.")
+tracing.METRICS.gauge("cache_state", _cache_gauges, "Answer and embedding cache size and hit rate.")
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of every counter, histogram and gauge."""
+    return PlainTextResponse(tracing.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,11 +1,17 @@
-from fastapi import APIRouter
+import asyncio
+import time
+
+from fastapi import APIRouter, HTTPException, WebSocket
 from rag.retriever import Retriever
-from rag.hybrid_retrieval import HybridRetriever
-from rag.context_builder import build_context
-from openai import OpenAI
-from config import OPENAI_API_KEY
+from rag.query_expansion import MODES as EXPANSION_MODES
+from rag.service import get_retrieval_service
+from rag.answer_cache import get_answer_cache
+from rag.context_builder import assemble_context
+from llm_client import get_llm_client
+from tracing import span, start_trace, trace
+from api.streaming import Events, sse_response, serve_websocket
+from config import TRACE_RESPONSES
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 router = APIRouter()
 
 # # --------------------------
@@ -37,23 +43,161 @@ router = APIRouter()
 # Full RAG Query
 # --------------------------
 
+def _messages(context: str, query: str) -> list:
+    return [
+        {"role": "system", "content": context},
+        {"role": "user", "content": query}
+    ]
+
+
+def _validate(payload: dict) -> None:
+    expand = payload.get("expand")
+    if expand is not None and expand not in EXPANSION_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown expand: {expand!r} (expected one of {EXPANSION_MODES})")
+
+
+def _wants_trace(payload: dict) -> bool:
+    return bool(payload.get("trace", TRACE_RESPONSES))
+
+
+async def _cache_lookup(payload: dict, query: str, generation: int):
+    cache = get_answer_cache()
+    if cache is None or not payload.get("cache", True):
+        return cache, None
+    params = {"where": payload.get("where"), "expand": payload.get("expand")}
+    lookup = await asyncio.to_thread(cache.lookup, "query", query, generation, params)
+    return cache, lookup
+
+
 @router.post("/query")
-def rag_query(payload: dict):
+async def rag_query(payload: dict):
+    """
+    Retrieve, build the context and answer. Optional: "where" (metadata
+    filter), "expand" ("multi_query" | "hyde" | "both" | "none", default
+    RETRIEVAL_EXPANSION) and "trace": true for a per-stage breakdown
+    (spans, token and cache counters) in the response.
+    """
+    _validate(payload)
+    with trace() as t:
+        response = await _rag_query(payload)
+    if _wants_trace(payload):
+        response["trace"] = t.breakdown()
+    return response
+
+
+async def _rag_query(payload: dict) -> dict:
     query = payload["query"]
+    # Optional metadata filter, e.g. {"source_type": "pdf"}
+    where = payload.get("where")
+    start = time.perf_counter()
+
+    snapshot = get_retrieval_service().current()
+    with span("cache_lookup"):
+        cache, lookup = await _cache_lookup(payload, query, snapshot.generation)
+    if lookup is not None and lookup.hit:
+        return {**lookup.value, "cache": lookup.tier, "latency_ms": round(1000 * (time.perf_counter() - start), 2)}
+
+    # Hybrid retrieval + reranking against the current corpus snapshot
+    with span("retrieve") as s:
+        passages = await snapshot.hybrid.aget(query, k=5, where=where, expand=payload.get("expand"))
+        s.set(passages=len(passages))
+
+    # Overlapping chunks merged, packed into the token budget, numbered for citation
+    with span("context") as s:
+        context = assemble_context(passages)
+        s.set(tokens=context.tokens, citations=len(context.citations))
+
+    with span("generate"):
+        answer = await get_llm_client().chat(_messages(context.prompt, query))
+    result = {
+        "answer": answer,
+        "used_passages": passages,
+        "citations": context.citations,
+        "context_tokens": context.tokens,
+        "generation": snapshot.generation,
+    }
+    latency_ms = round(1000 * (time.perf_counter() - start), 2)
+    if lookup is not None:
+        await asyncio.to_thread(cache.put, lookup, result, latency_ms)
+    return {**result, "cache": None, "latency_ms": latency_ms}
+
+
+# --------------------------
+# Streaming RAG Query
+# --------------------------
+
+async def query_events(payload: dict) -> Events:
+    """
+    Same work as /query, emitted as it happens: "passages" once retrieval
+    is done, "token" per answer delta, then "done" with the full answer
+    and latencies (first_token_ms is what the user waits for), plus the
+    trace breakdown when asked for.
+    """
+    _validate(payload)
+    query = payload["query"]
+    where = payload.get("where")
+    start = time.perf_counter()
+    t = start_trace()
+
+    def elapsed() -> float:
+        return round(1000 * (time.perf_counter() - start), 2)
+
+    def traced(data: dict) -> dict:
+        return {**data, "trace": t.breakdown()} if _wants_trace(payload) else data
+
+    snapshot = get_retrieval_service().current()
+    with span("cache_lookup"):
+        cache, lookup = await _cache_lookup(payload, query, snapshot.generation)
+    if lookup is not None and lookup.hit:
+        yield "passages", {key: lookup.value[key] for key in ("used_passages", "citations", "generation")}
+        yield "token", {"text": lookup.value["answer"]}
+        yield "done", traced({"answer": lookup.value["answer"], "cache": lookup.tier,
+                              "first_token_ms": elapsed(), "latency_ms": elapsed()})
+        return
+
+    with span("retrieve") as s:
+        passages = await snapshot.hybrid.aget(query, k=5, where=where, expand=payload.get("expand"))
+        s.set(passages=len(passages))
+    with span("context") as s:
+        context = assemble_context(passages)
+        s.set(tokens=context.tokens, citations=len(context.citations))
+    yield "passages", {
+        "used_passages": passages,
+        "citations": context.citations,
+        "generation": snapshot.generation,
+        "retrieval_ms": elapsed(),
+    }
+
+    parts = []
+    first_token_ms = None
+    async for delta in get_llm_client().stream_chat(_messages(context.prompt, query)):
+        if first_token_ms is None:
+            first_token_ms = elapsed()
+        parts.append(delta)
+        yield "token", {"text": delta}
+
+    answer = "".join(parts)
+    latency_ms = elapsed()
+    if lookup is not None:
+        result = {
+            "answer": answer,
+            "used_passages": passages,
+            "citations": context.citations,
+            "context_tokens": context.tokens,
+            "generation": snapshot.generation,
+        }
+        await asyncio.to_thread(cache.put, lookup, result, latency_ms)
+    yield "done", traced({"answer": answer, "cache": None, "first_token_ms": first_token_ms, "latency_ms": latency_ms})
 
-    # Hybrid retrieval + reranking
-    hybrid = HybridRetriever()
-    passages = hybrid.get(query, k=5)
 
-    context = build_context(passages)
+@router.post("/query/stream")
+async def rag_query_stream(payload: dict):
+    """/query as Server-Sent Events (see query_events for the event sequence)."""
+    _validate(payload)  # before the 200 status line goes out
+    return sse_response(query_events(payload))
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": context},
-            {"role": "user", "content": query}
-        ]
-    )
 
-    answer = response.choices[0].message.content
-    return {"answer": answer, "used_passages": passages}
+@router.websocket("/ws/query")
+async def rag_query_ws(websocket: WebSocket):
+    """Send {"query": ...} messages; each is answered with the query_events stream."""
+    await serve_websocket(websocket, query_events)
@@ -0,0 +1,76 @@
+import re
+
+from fastapi import APIRouter, HTTPException
+
+from api.ingest import jobs
+from ingestion.github_extractor import check_location
+from mcp_tools import repo_tools
+
+router = APIRouter()
+
+
+@router.post("/ingest/repo", status_code=202)
+async def ingest_repo(payload: dict):
+    """
+    Queue indexing of a git repository for RAG.
+
+    Example body:
+    {
+      "location": "/path/to/clone",   # under REPO_ROOTS; or a git URL if REPO_ALLOW_REMOTE
+      "ref": "HEAD",                  # optional
+      "name": "my-service"            # optional, defaults to the directory/repo name
+    }
+
+    Re-running it only re-indexes files whose git blob changed.
+    """
+    location = payload["location"]
+    try:
+        check_location(location)
+    except ValueError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    job, deduplicated = jobs.submit_repo(location, ref=payload.get("ref", "HEAD"), name=payload.get("name"))
+    return {"status": job["status"], "job_id": job["id"], "deduplicated": deduplicated}
+
+
+# --------------------------
+# Code tools over this server's own repository (same as the agent's repo_* tools)
+# --------------------------
+
+@router.get("/repo/files")
+def repo_files(glob: str = "**/*.py"):
+    return {"glob": glob, "files": repo_tools.list_files(glob)}
+
+
+@router.get("/repo/search")
+def repo_search(
+    q: str,
+    glob: str = "**/*.py",
+    regex: bool = False,
+    whole_word: bool = False,
+    case_sensitive: bool = True,
+    context: int = 2,
+    limit: int = 20,
+):
+    try:
+        hits = repo_tools.search_code(
+            q,
+            glob_pattern=glob,
+            max_hits=limit,
+            regex=regex,
+            whole_word=whole_word,
+            case_sensitive=case_sensitive,
+            context_lines=context,
+        )
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"query": q, "hits": hits}
+
+
+@router.get("/repo/file")
+def repo_file(path: str):
+    try:
+        return {"path": path, "content": repo_tools.read_file(path)}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,7 +1,30 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from api import ingest, query, agent
+from api import ingest, query, agent, repo_tools, metrics
+from ingestion.pdf_extractor import shutdown_pdf_pool
+from llm_client import close_llm_client
+from rag.service import get_retrieval_service, shutdown_retrieval_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One retrieval service for the whole process; finished ingests refresh it
+    service = get_retrieval_service()
+    ingest.pipeline.subscribe(service.on_ingest)
+    ingest.clean_uploads()
+    yield
+    ingest.jobs.shutdown()
+    shutdown_pdf_pool()
+    ingest.pipeline.unsubscribe(service.on_ingest)
+    shutdown_retrieval_service()
+    await close_llm_client()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
 app.include_router(ingest.router)
 app.include_router(query.router)
 app.include_router(agent.router)
+app.include_router(repo_tools.router)
+app.include_router(metrics.router)
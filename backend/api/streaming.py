@@ -0,0 +1,51 @@
+import json
+import logging
+from typing import AsyncIterator, Callable, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# (event name, JSON-serializable data)
+Events = AsyncIterator[Tuple[str, dict]]
+
+
+async def _guarded(events: Events) -> Events:
+    """Turn a failure mid-stream into an "error" event; the status line is already sent."""
+    try:
+        async for event in events:
+            yield event
+    except Exception as e:
+        logger.exception("Streaming request failed")
+        yield "error", {"detail": str(e)}
+
+
+def sse_response(events: Events) -> StreamingResponse:
+    """Server-Sent Events: one `event:`/`data:` frame per event, flushed as produced."""
+
+    async def frames() -> AsyncIterator[str]:
+        async for event, data in _guarded(events):
+            yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        # Keep proxies (nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def serve_websocket(websocket: WebSocket, handler: Callable[[dict], Events]) -> None:
+    """
+    Answer each JSON request received on the socket with a stream of
+    {"event": ..., "data": ...} messages, until the client disconnects.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            payload = await websocket.receive_json()
+            async for event, data in _guarded(handler(payload)):
+                await websocket.send_text(json.dumps({"event": event, "data": data}, default=str))
+    except WebSocketDisconnect:
+        pass
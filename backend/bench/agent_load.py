@@ -0,0 +1,90 @@
+"""
+Request throughput of /agent or /query on a single worker, with every LLM
+and embedding call answered by the local fake API.
+
+    python -m bench.agent_load --requests 200 --concurrency 1 8 32 --latency-ms 200
+
+By default the app runs in-process (one event loop, like one uvicorn
+worker) on a throwaway data dir. To load a separately started server
+instead, pass its address:
+
+    python -m bench.agent_load --url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from bench.fake_openai import serve_in_background
+
+
+async def run_level(client: httpx.AsyncClient, path: str, requests: int, concurrency: int, extra: dict) -> dict:
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with gate:
+            start = time.perf_counter()
+            response = await client.post(path, json={"query": f"what does document {i % 50} say?", **extra})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+        "errors": errors,
+    }
+
+
+async def main_async(args) -> None:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+    else:
+        # Config is read at import time, so the fake API must be up first
+        server = serve_in_background(port=0, latency_ms=args.latency_ms, dim=256)
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "fake")
+        os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="agent-load-"))
+        os.environ.setdefault("VECTOR_BACKEND", "local")
+        from api.server import app
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app", timeout=120)
+
+    path = f"/{args.endpoint}"
+    extra = {"mode": args.mode} if args.mode else {}
+    async with client:
+        await client.post(path, json={"query": "warm up"})
+        for concurrency in args.concurrency:
+            result = await run_level(client, path, args.requests, concurrency, extra)
+            print(
+                f"concurrency={concurrency:<4} {result['rps']:7.1f} req/s  "
+                f"p50={result['p50_ms']:7.1f}ms  p95={result['p95_ms']:7.1f}ms  errors={result['errors']}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", choices=["agent", "query"], default="agent")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency-ms", type=int, default=200, help="fake LLM latency per call")
+    parser.add_argument("--mode", choices=["speculative", "sequential"], help="agent execution mode")
+    parser.add_argument("--url", help="load an already running server instead of the in-process app")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Embedding throughput vs. concurrency against the local fake API.
+
+    python -m bench.embed_throughput --texts 5000 --latency-ms 100 --fail-rate 0.05
+"""
+import argparse
+import time
+
+from openai import OpenAI
+
+from bench.fake_openai import serve_in_background
+from ingestion.embedder import EmbeddingEngine
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--batch-items", type=int, default=256)
+    parser.add_argument("--latency-ms", type=int, default=100)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    server = serve_in_background(port=0, latency_ms=args.latency_ms, fail_rate=args.fail_rate, dim=256)
+    api = OpenAI(api_key="fake", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+    texts = [" ".join(f"w{(i * 7 + j) % 997}" for j in range(args.words)) + f" #{i}" for i in range(args.texts)]
+
+    for concurrency in args.concurrency:
+        engine = EmbeddingEngine(
+            max_batch_items=args.batch_items, concurrency=concurrency, api_client=api
+        )
+        start = time.perf_counter()
+        vectors = engine.embed(texts)
+        elapsed = time.perf_counter() - start
+        assert len(vectors) == len(texts)
+        print(f"concurrency={concurrency:<3} {len(texts) / elapsed:8.1f} texts/s  ({elapsed:.2f}s)")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
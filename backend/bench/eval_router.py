@@ -0,0 +1,141 @@
+"""
+Offline evaluation of the local planner fast path (agent/router.py).
+
+For each query the router either decides locally or defers. Decisions are
+compared against a reference: the "action" labels in the query file, or
+the LLM planner's own choice (--reference llm, which calls the configured
+API once per query).
+
+    python -m bench.eval_router                        # built-in labelled sample
+    python -m bench.eval_router --queries q.jsonl --reference llm --json out.json
+
+Query files are JSONL: {"query": "...", "action": "rag_query", "tool_name": null}
+("action"/"tool_name" are only needed with --reference labels).
+
+Reported: coverage (share of queries decided locally, i.e. LLM round trips
+saved), agreement with the reference on those queries, routing latency
+and every disagreement.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+from typing import List
+
+from agent.router import Router
+
+SAMPLE = [
+    {"query": "run the tests", "action": "use_tool", "tool_name": "repo_run_tests"},
+    {"query": "please run `pytest tests/test_api.py -q`", "action": "use_tool", "tool_name": "repo_run_tests"},
+    {"query": "can you rerun the unit tests", "action": "use_tool", "tool_name": "repo_run_tests"},
+    {"query": "open backend/api/server.py", "action": "use_tool", "tool_name": "repo_read_file"},
+    {"query": "show me rag/fusion.py and explain it", "action": "use_tool", "tool_name": "repo_read_file"},
+    {"query": "list all files matching **/*.md", "action": "use_tool", "tool_name": "repo_list_files"},
+    {"query": "grep for OPENAI_API_KEY", "action": "use_tool", "tool_name": "repo_search_code"},
+    {"query": "where is get_retrieval_service defined?", "action": "use_tool", "tool_name": "repo_search_code"},
+    {"query": "find usages of chunk_stream", "action": "use_tool", "tool_name": "repo_search_code"},
+    {"query": "diff --git a/x.py b/x.py\n--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n-a\n+b\n",
+     "action": "use_tool", "tool_name": "repo_apply_patch"},
+    {"query": "what does the paper say about the evaluation datasets?", "action": "rag_query"},
+    {"query": "summarize my uploaded notes on the Q3 planning meeting", "action": "rag_query"},
+    {"query": "according to our docs, how are API keys rotated?", "action": "rag_query"},
+    {"query": "what are the main findings of the report", "action": "rag_query"},
+    {"query": "in the pdf I uploaded, what is the refund policy", "action": "rag_query"},
+    {"query": "what does the design doc say about caching", "action": "rag_query"},
+    {"query": "which limitations did the authors list", "action": "rag_query"},
+    {"query": "summarize the article i added yesterday", "action": "rag_query"},
+    {"query": "what is a B-tree", "action": "answer_direct"},
+    {"query": "explain the CAP theorem", "action": "answer_direct"},
+    {"query": "how does HTTPS work", "action": "answer_direct"},
+    {"query": "what is the difference between a process and a thread", "action": "answer_direct"},
+    {"query": "give me an example of a python context manager", "action": "answer_direct"},
+    {"query": "what is gradient descent", "action": "answer_direct"},
+    {"query": "hello!", "action": "answer_direct"},
+    {"query": "write a limerick about databases", "action": "answer_direct"},
+    {"query": "what does O(n log n) mean", "action": "answer_direct"},
+    {"query": "explain what an inverted index is", "action": "answer_direct"},
+    {"query": "how should I structure the retry logic for our ingestion workers?", "action": "rag_query"},
+    {"query": "what changed between version 2 and 3 of the spec", "action": "rag_query"},
+]
+
+
+def load_queries(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def llm_reference(queries: List[dict]) -> None:
+    from agent.planner import Planner
+
+    planner = Planner(use_router=False)
+    for q in queries:
+        plan = await planner.plan_with_llm(q["query"])
+        q["action"], q["tool_name"] = plan["action"], plan.get("tool_name")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="JSONL file of queries (default: built-in labelled sample)")
+    parser.add_argument("--reference", choices=["labels", "llm"], default="labels")
+    parser.add_argument("--sources", nargs="*", default=[], help="document names the router should know about")
+    parser.add_argument("--min-confidence", type=float)
+    parser.add_argument("--json", help="write the full report here")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else [dict(q) for q in SAMPLE]
+    if args.reference == "llm":
+        asyncio.run(llm_reference(queries))
+
+    kwargs = {"sources": lambda: args.sources}
+    if args.min_confidence is not None:
+        kwargs["min_confidence"] = args.min_confidence
+    router = Router(**kwargs)
+
+    latencies_us, rows = [], []
+    for q in queries:
+        start = time.perf_counter()
+        plan = router.route(q["query"])
+        latencies_us.append(1e6 * (time.perf_counter() - start))
+        row = {"query": q["query"], "expected": q.get("action"), "expected_tool": q.get("tool_name")}
+        if plan is not None:
+            row.update(routed=plan["action"], routed_tool=plan.get("tool_name"), reason=plan["reason"])
+            row["agree"] = row["routed"] == row["expected"] and (
+                row["routed"] != "use_tool" or row["routed_tool"] == row["expected_tool"]
+            )
+        rows.append(row)
+
+    routed = [r for r in rows if "routed" in r]
+    agreed = [r for r in routed if r["agree"]]
+    confusion = Counter((r["expected"], r["routed"]) for r in routed)
+    latencies_us.sort()
+    report = {
+        "queries": len(rows),
+        "coverage": len(routed) / len(rows) if rows else 0.0,
+        "agreement": len(agreed) / len(routed) if routed else 0.0,
+        "llm_calls_saved": len(agreed),
+        "route_us_p50": statistics.median(latencies_us) if latencies_us else 0.0,
+        "route_us_p99": latencies_us[int(0.99 * (len(latencies_us) - 1))] if latencies_us else 0.0,
+        "confusion": {f"{e} -> {r}": n for (e, r), n in sorted(confusion.items())},
+        "disagreements": [r for r in routed if not r["agree"]],
+        "deferred": [r["query"] for r in rows if "routed" not in r],
+    }
+
+    print(f"queries      {report['queries']}")
+    print(f"coverage     {report['coverage']:.1%}  (decided locally, no LLM planner call)")
+    print(f"agreement    {report['agreement']:.1%}  (with {args.reference} on routed queries)")
+    print(f"route time   p50={report['route_us_p50']:.0f}us  p99={report['route_us_p99']:.0f}us")
+    for key, n in report["confusion"].items():
+        print(f"  {key:<32} {n}")
+    for r in report["disagreements"]:
+        print(f"  MISMATCH {r['query'][:60]!r}: expected {r['expected']}/{r['expected_tool']}, "
+              f"routed {r['routed']}/{r['routed_tool']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
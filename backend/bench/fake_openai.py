@@ -0,0 +1,251 @@
+"""
+Deterministic local stand-in for the OpenAI HTTP API.
+
+    python -m bench.fake_openai --port 8765 --latency-ms 50 --fail-rate 0.1
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake uvicorn api.server:app
+
+Endpoints:
+    POST /v1/embeddings         hash-seeded unit vectors (same text -> same vector);
+                                with --embedding lexical, the normalized sum of
+                                per-word vectors, so texts sharing words are close
+    POST /v1/chat/completions   canned replies in the shape each caller parses
+                                (planner/evaluator/expansion JSON, reranker order,
+                                answers);
+                                "stream": true sends them as SSE chunks
+
+Latency and a fraction of 429 responses can be injected to exercise
+batching, concurrency and retry behaviour without network access;
+server.fail_next(429, 500, ...) makes the next requests fail with exactly
+those statuses, for deterministic retry tests.
+--token-ms adds per-token generation time to chat replies, so streamed
+and non-streamed responses differ the way they do against the real API.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_embedding(text: str, dim: int = 1536) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=200_000)
+def word_vector(word: str, dim: int) -> np.ndarray:
+    return fake_embedding("word:" + word, dim)
+
+
+def lexical_embedding(text: str, dim: int = 1536) -> np.ndarray:
+    """Bag-of-words embedding: similarity tracks word overlap, deterministically."""
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return fake_embedding(text, dim)
+    vector = np.sum([word_vector(w, dim) for w in words], axis=0)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+EMBEDDINGS = {"hash": fake_embedding, "lexical": lexical_embedding}
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict = None) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client cancelled the request
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        config = self.server.config
+
+        with self.server.lock:
+            self.server.stats["requests"] += 1
+
+        if config["latency_ms"]:
+            time.sleep(config["latency_ms"] / 1000)
+
+        with self.server.lock:
+            status = self.server.failures.popleft() if self.server.failures else None
+            if status is not None:
+                self.server.stats["rate_limited" if status == 429 else "failed"] += 1
+        if status is not None:
+            self._send(
+                status,
+                {"error": {"message": f"Injected failure {status} (fake)", "type": "fake_error"}},
+                {"retry-after": "0"} if status == 429 else None,
+            )
+            return
+
+        if random.random() < config["fail_rate"]:
+            with self.server.lock:
+                self.server.stats["rate_limited"] += 1
+            self._send(
+                429,
+                {"error": {"message": "Rate limit (fake)", "type": "rate_limit_error"}},
+                {"retry-after": "0"},
+            )
+            return
+
+        path = self.path.rstrip("/")
+        if path.endswith("/embeddings"):
+            self._embeddings(body)
+        elif path.endswith("/chat/completions"):
+            self._chat(body)
+        else:
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _embeddings(self, body: dict) -> None:
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dim = body.get("dimensions") or self.server.config["dim"]
+        embed = EMBEDDINGS[self.server.config["embedding"]]
+        with self.server.lock:
+            self.server.stats["embedded_inputs"] += len(inputs)
+        self._send(200, {
+            "object": "list",
+            "model": body.get("model", "fake"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": embed(text, dim).tolist()}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": sum(len(t.split()) for t in inputs), "total_tokens": 0},
+        })
+
+
+    def _chat(self, body: dict) -> None:
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        with self.server.lock:
+            self.server.stats["chat_completions"] += 1
+        reply = fake_reply(system, user)
+        tokens = re.findall(r"\S+\s*", reply) or [reply]
+        token_s = self.server.config["token_ms"] / 1000
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            try:
+                for i, token in enumerate(tokens):
+                    time.sleep(token_s)
+                    delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+                    chunk = {**base, "object": "chat.completion.chunk",
+                             "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                done = {**base, "object": "chat.completion.chunk",
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client stopped reading
+            return
+
+        time.sleep(token_s * len(tokens))
+        self._send(200, {
+            **base,
+            "object": "chat.completion",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+        })
+
+
+def fake_reply(system: str, user: str) -> str:
+    """Deterministic reply that parses the way the calling module expects."""
+    if "planning module" in system:
+        return json.dumps({"action": "rag_query", "tool_name": None, "query": user, "reason": "fake"})
+    if "evaluation module" in system:
+        return json.dumps({"needs_rag": False, "feedback": "fake"})
+    if "query expansion module" in system:
+        words = user.split()
+        half = max(1, len(words) // 2)
+        return json.dumps({
+            "queries": [" ".join(words[:half]), " ".join(words[half:]) or user],
+            "hypothetical_answer": f"{user} is described in the documentation as follows.",
+        })
+    if "ranking model" in user:
+        count = user.count("\nPassage ")
+        return json.dumps(list(range(1, count + 1)))
+    return f"Fake answer to: {user[:200]}"
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 stalls concurrent clients on SYN retries
+    request_queue_size = 1024
+
+    def fail_next(self, *statuses: int) -> None:
+        """Answer the next len(statuses) requests with these HTTP statuses, in order."""
+        with self.lock:
+            self.failures.extend(statuses)
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, latency_ms: int = 0,
+                fail_rate: float = 0.0, dim: int = 1536, token_ms: int = 0,
+                embedding: str = "hash") -> ThreadingHTTPServer:
+    server = FakeOpenAIServer((host, port), FakeOpenAIHandler)
+    server.config = {
+        "latency_ms": latency_ms, "fail_rate": fail_rate, "dim": dim, "token_ms": token_ms, "embedding": embedding,
+    }
+    server.stats = {"requests": 0, "rate_limited": 0, "failed": 0, "embedded_inputs": 0, "chat_completions": 0}
+    server.failures = deque()
+    server.lock = threading.Lock()
+    return server
+
+
+def serve_in_background(**kwargs) -> ThreadingHTTPServer:
+    """Start a server on a daemon thread (port=0 picks a free port)."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--token-ms", type=int, default=0)
+    parser.add_argument("--embedding", choices=sorted(EMBEDDINGS), default="hash")
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host, args.port, args.latency_ms, args.fail_rate, args.dim, args.token_ms, args.embedding
+    )
+    print(f"Fake OpenAI API on http://{args.host}:{server.server_port}/v1")
+    server.serve_forever()
@@ -0,0 +1,152 @@
+"""
+Recall versus memory of the vector codecs in vectorstore/quantization.py.
+
+Every codec scans all vectors (no IVF) so recall loss is due to the codes
+alone. Reported per configuration:
+
+    bytes/vec   size of one code row (float32 baseline: 4 * dim)
+    ratio       compression against float32
+    recall      recall@k of the approximate scores alone
+    rescored    recall@k after exact re-scoring of the top k * rescore
+    scan_ms     first-pass scoring time per query over all codes
+
+    python -m bench.quantization                         # synthetic corpus
+    python -m bench.quantization --vectors emb.npy --queries-file q.npy --json out.json
+
+The synthetic corpus is clustered, with variance decaying across
+dimensions the way Matryoshka-trained embeddings concentrate information
+in their leading dimensions. Use real embeddings (--vectors) to judge
+truncation; on synthetic data its numbers are only indicative.
+"""
+import argparse
+import json
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from vectorstore.quantization import make_codec
+
+# name, quantization, truncate_dim, pq sub-vectors (0: one per 8 dims)
+CONFIGS: List[Tuple[str, str, int, int]] = [
+    ("float16", "float16", 0, 0),
+    ("int8", "int8", 0, 0),
+    ("pq/4", "pq", 0, -4),        # 4 dims per sub-vector
+    ("pq/8", "pq", 0, 0),
+    ("pq/16", "pq", 0, -16),
+    ("trunc/2+float16", "float16", -2, 0),
+    ("trunc/2+int8", "int8", -2, 0),
+    ("trunc/3+int8", "int8", -3, 0),
+    ("trunc/2+pq/4", "pq", -2, -4),
+]
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+def synthetic(n: int, dim: int, n_queries: int, clusters: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    decay = (1.0 / np.sqrt(1 + np.arange(dim) / 32)).astype(np.float32)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32) * decay
+    labels = rng.integers(0, clusters, size=n)
+    data = centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32) * decay
+    picks = rng.integers(0, n, size=n_queries)
+    queries = data[picks] + 0.4 * rng.standard_normal((n_queries, dim)).astype(np.float32) * decay
+    return _normalize(data).astype(np.float32), _normalize(queries).astype(np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def evaluate(data, queries, truth, k, rescore, kind, truncate_dim, pq_m, sample) -> dict:
+    dim = data.shape[1]
+    codec = make_codec(kind, dim, truncate_dim, pq_m)
+    start = time.perf_counter()
+    rng = np.random.default_rng(0)
+    codec.fit(data[rng.choice(len(data), size=min(sample, len(data)), replace=False)])
+    codes = np.concatenate([codec.encode(data[i:i + 65536]) for i in range(0, len(data), 65536)])
+    fit_s = time.perf_counter() - start
+
+    hits = hits_rescored = 0
+    scan_s = 0.0
+    for q, expected in zip(queries, truth):
+        begin = time.perf_counter()
+        approx = codec.scores(q, codes)
+        scan_s += time.perf_counter() - begin
+        expected = set(expected.tolist())
+        hits += len(expected.intersection(top_k(approx, k).tolist()))
+        shortlist = top_k(approx, min(k * rescore, len(approx)))
+        exact = data[shortlist] @ q
+        hits_rescored += len(expected.intersection(shortlist[top_k(exact, k)].tolist()))
+
+    total = k * len(queries)
+    return {
+        "codec": codec.signature,
+        "bytes_per_vector": codec.bytes_per_vector,
+        "ratio": round(4 * dim / codec.bytes_per_vector, 2),
+        "memory_mb": round(len(data) * codec.bytes_per_vector / 2 ** 20, 2),
+        "recall": round(hits / total, 4),
+        "recall_rescored": round(hits_rescored / total, 4),
+        "scan_ms": round(1000 * scan_s / len(queries), 3),
+        "fit_s": round(fit_s, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=50_000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=1536, help="synthetic dimension (text-embedding-3-small: 1536)")
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--vectors", help=".npy matrix of real embeddings (n, dim) instead of synthetic data")
+    parser.add_argument("--queries-file", help=".npy query embeddings (default: perturbed corpus rows)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, default=4, help="shortlist size as a multiple of k")
+    parser.add_argument("--sample", type=int, default=16_384, help="rows used to fit codecs")
+    parser.add_argument("--only", nargs="*", help="run only these configuration names")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results here")
+    args = parser.parse_args(argv)
+
+    if args.vectors:
+        data = _normalize(np.load(args.vectors).astype(np.float32))
+        if args.queries_file:
+            queries = _normalize(np.load(args.queries_file).astype(np.float32))
+        else:
+            rng = np.random.default_rng(args.seed)
+            picks = data[rng.integers(0, len(data), size=args.queries)]
+            queries = _normalize(picks + 0.05 * rng.standard_normal(picks.shape).astype(np.float32))
+    else:
+        data, queries = synthetic(args.n, args.dim, args.queries, args.clusters, args.seed)
+    dim = data.shape[1]
+    truth = np.stack([top_k(data @ q, args.k) for q in queries])
+
+    print(f"{len(data)} vectors x {dim} dims, {len(queries)} queries, recall@{args.k}, "
+          f"re-score top {args.k * args.rescore}; float32 = {4 * dim} B/vec, "
+          f"{len(data) * 4 * dim / 2 ** 20:.1f} MB")
+    print(f"{'config':<18} {'B/vec':>6} {'ratio':>6} {'MB':>8} {'recall':>7} {'rescored':>9} {'scan_ms':>8}")
+    results = []
+    for name, kind, truncate, pq in CONFIGS:
+        if args.only and name not in args.only:
+            continue
+        # Negative values are fractions of the dimension: -2 -> dim / 2
+        truncate_dim = dim // -truncate if truncate < 0 else truncate
+        pq_dim = truncate_dim or dim
+        pq_m = pq_dim // -pq if pq < 0 else pq
+        row = {"config": name, **evaluate(
+            data, queries, truth, args.k, args.rescore, kind, truncate_dim, pq_m, args.sample
+        )}
+        results.append(row)
+        print(f"{name:<18} {row['bytes_per_vector']:>6} {row['ratio']:>5.1f}x {row['memory_mb']:>8.1f} "
+              f"{row['recall']:>7.3f} {row['recall_rescored']:>9.3f} {row['scan_ms']:>8.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"n": len(data), "dim": dim, "k": args.k, "rescore": args.rescore, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
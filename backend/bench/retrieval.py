@@ -0,0 +1,398 @@
+"""
+Retrieval quality and latency per retrieval mode, on corpora of several
+sizes, with embeddings and LLM calls answered by the local fake API.
+
+    python -m bench.retrieval                                  # 10k synthetic chunks
+    python -m bench.retrieval --sizes 10000 100000 1000000 --json results.json
+    python -m bench.retrieval --json new.json --compare old.json
+    python -m bench.retrieval --corpus chunks.jsonl --qrels queries.jsonl
+
+Reported per corpus size and mode:
+
+    p50/p95/p99   query latency in ms (query embeddings are pre-warmed, so
+                  this is search + fusion + reranking, not the embedding API;
+                  expansion modes include the fake LLM call and embedding
+                  the expanded texts)
+    qps           throughput with --concurrency threads
+    recall@k      fraction of queries whose best-graded chunk is in the top k
+    mrr           mean reciprocal rank of the first best-graded chunk
+    ndcg@k        graded (2: the target chunk, 1: same document)
+
+plus index build time, on-disk size and process RSS per corpus.
+
+The synthetic corpus draws words from per-topic and common vocabularies
+(Zipf-distributed) and gives each chunk a few rare key words; a query
+mixes some of its target chunk's key, topic and common words. The fake
+API runs with lexical embeddings, so vector search behaves like a (weak)
+semantic model: texts sharing words are close. Fixture corpora are JSONL
+with {"id", "text", "doc"?} per line; qrels are JSONL with
+{"query", "relevant": {chunk_id: grade}}.
+
+--json writes everything (plus the git commit and settings) for diffing
+across commits; --compare prints the deltas against such a file.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bench.fake_openai import lexical_embedding, serve_in_background
+
+_CONSONANTS = "bdfgklmnprtvz"
+_VOWELS = "aiou"  # vowel endings keep the BM25 stemmer from merging words
+_SYLLABLES = [c + v for c in _CONSONANTS for v in _VOWELS]
+
+MODES = ["vector", "bm25", "hybrid_rrf", "hybrid_weighted", "hybrid_rerank"]
+
+
+def word(i: int, syllables: int = 4) -> str:
+    parts = []
+    for _ in range(syllables):
+        i, r = divmod(i, len(_SYLLABLES))
+        parts.append(_SYLLABLES[r])
+    return "".join(parts)
+
+
+def _zipf(rng: np.random.Generator, n: int, size) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1)
+    return rng.choice(n, size=size, p=weights / weights.sum())
+
+
+class Corpus:
+    """Chunk texts, their document ids, and graded relevance per query."""
+
+    def __init__(self, ids: List[str], texts: List[str], docs: List[str],
+                 queries: List[str], qrels: List[Dict[str, int]]):
+        self.ids, self.texts, self.docs = ids, texts, docs
+        self.queries, self.qrels = queries, qrels
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def synthetic(n: int, n_queries: int, seed: int, words_per_chunk: int = 64, chunks_per_doc: int = 8,
+              topic_words: int = 200, common_words: int = 2000) -> Corpus:
+    rng = np.random.default_rng(seed)
+    topics = max(20, n // 500)
+    # Disjoint ranges of the word space: common | topics | keys
+    topic_base = common_words
+    key_base = topic_base + topics * topic_words
+    keys_per_chunk = 3
+    n_topic = words_per_chunk // 3
+    n_common = words_per_chunk - n_topic - keys_per_chunk
+
+    doc_of = np.arange(n) // chunks_per_doc
+    topic_of_doc = rng.integers(0, topics, size=doc_of[-1] + 1)
+    topic_of = topic_of_doc[doc_of]
+    topic_ids = topic_base + topic_of[:, None] * topic_words + _zipf(rng, topic_words, (n, n_topic))
+    common_ids = _zipf(rng, common_words, (n, n_common))
+    key_ids = key_base + rng.integers(0, max(1, n // 4), size=(n, keys_per_chunk))
+    words = np.concatenate([topic_ids, common_ids, key_ids], axis=1)
+    words = np.take_along_axis(words, rng.permuted(np.tile(np.arange(words.shape[1]), (n, 1)), axis=1), axis=1)
+
+    vocab: Dict[int, str] = {}
+
+    def w(i: int) -> str:
+        if i not in vocab:
+            vocab[i] = word(int(i))
+        return vocab[i]
+
+    texts = [" ".join(w(i) for i in row) for row in words]
+    ids = [f"c{i}" for i in range(n)]
+    docs = [f"d{d}" for d in doc_of]
+
+    queries, qrels = [], []
+    for target in rng.choice(n, size=min(n_queries, n), replace=False):
+        parts = [key_ids[target, rng.integers(keys_per_chunk)]]
+        parts += list(rng.choice(topic_ids[target], size=2, replace=False))
+        parts.append(common_ids[target, rng.integers(n_common)])
+        queries.append(" ".join(w(i) for i in rng.permutation(parts)))
+        grades = {ids[j]: 1 for j in range(doc_of[target] * chunks_per_doc,
+                                           min(n, (doc_of[target] + 1) * chunks_per_doc))}
+        grades[ids[target]] = 2
+        qrels.append(grades)
+    return Corpus(ids, texts, docs, queries, qrels)
+
+
+def fixture(corpus_path: str, qrels_path: str) -> Corpus:
+    ids, texts, docs = [], [], []
+    with open(corpus_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                ids.append(str(row["id"]))
+                texts.append(row["text"])
+                docs.append(str(row.get("doc", row["id"])))
+    queries, qrels = [], []
+    with open(qrels_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                relevant = row["relevant"]
+                if isinstance(relevant, list):
+                    relevant = {str(cid): 1 for cid in relevant}
+                queries.append(row["query"])
+                qrels.append({str(cid): int(g) for cid, g in relevant.items()})
+    return Corpus(ids, texts, docs, queries, qrels)
+
+
+# --------------------------
+# Metrics
+# --------------------------
+def score_ranking(ranked: List[str], grades: Dict[str, int], k: int) -> Tuple[float, float, float]:
+    """(hit@k, reciprocal rank, nDCG@k) for one query."""
+    best = max(grades.values())
+    top = [cid for cid, g in grades.items() if g == best]
+    rr = next((1.0 / (i + 1) for i, cid in enumerate(ranked) if cid in top), 0.0)
+    hit = float(any(cid in top for cid in ranked[:k]))
+    dcg = sum((2 ** grades.get(cid, 0) - 1) / np.log2(i + 2) for i, cid in enumerate(ranked[:k]))
+    ideal = sorted(grades.values(), reverse=True)[:k]
+    idcg = sum((2 ** g - 1) / np.log2(i + 2) for i, g in enumerate(ideal))
+    return hit, rr, dcg / idcg if idcg else 0.0
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def _rss_mb() -> Dict[str, float]:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    current = peak
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        pass
+    return {"rss_mb": round(current, 1), "peak_rss_mb": round(peak, 1)}
+
+
+def _disk_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return round(total / 2 ** 20, 1)
+
+
+# --------------------------
+# Runs
+# --------------------------
+def build(corpus: Corpus, workdir: str, dim: int, quantization: str, batch: int = 5000):
+    from rag.bm25_index import BM25Index
+    from vectorstore.local_store import LocalVectorStore
+
+    store = LocalVectorStore(path=os.path.join(workdir, "vectors"), quantization=quantization)
+    bm25 = BM25Index(path=os.path.join(workdir, "bm25.sqlite3"))
+    timings = {"embed_s": 0.0, "vector_s": 0.0, "bm25_s": 0.0}
+    for i in range(0, len(corpus), batch):
+        ids, texts = corpus.ids[i:i + batch], corpus.texts[i:i + batch]
+        start = time.perf_counter()
+        vectors = np.stack([lexical_embedding(t, dim) for t in texts])
+        timings["embed_s"] += time.perf_counter() - start
+        start = time.perf_counter()
+        metadatas = [{"source": corpus.docs[i + j], "source_type": "bench"} for j in range(len(ids))]
+        store.upsert(ids, texts, vectors, metadatas)
+        timings["vector_s"] += time.perf_counter() - start
+        start = time.perf_counter()
+        bm25.add(texts, ids)
+        timings["bm25_s"] += time.perf_counter() - start
+    # IVF/codec training runs in the background; measure queries against the trained index
+    start = time.perf_counter()
+    store.wait_for_training()
+    timings["vector_s"] += time.perf_counter() - start
+    return store, bm25, {key: round(value, 2) for key, value in timings.items()}
+
+
+def searchers(retriever, rerankers: Dict[str, object], k: int,
+              expansions: List[str] = ()) -> Dict[str, Callable[[str], List[str]]]:
+    from rag.hybrid_retrieval import HybridRetriever
+
+    modes = {
+        "vector": lambda q: [cid for cid, _ in retriever.vector_search(q, k)],
+        "bm25": lambda q: [cid for cid, _ in retriever.bm25_search(q, k)],
+        "hybrid_rrf": lambda q: [r["id"] for r in retriever.hybrid_search(q, k, method="rrf")],
+        "hybrid_weighted": lambda q: [r["id"] for r in retriever.hybrid_search(q, k, method="weighted")],
+    }
+    for name, reranker in rerankers.items():
+        hybrid = HybridRetriever(retriever, reranker)
+        modes[name] = lambda q, h=hybrid: [r["id"] for r in h.get(q, k, rerank=True)]
+    hybrid = HybridRetriever(retriever, rerankers["hybrid_rerank"])
+    for mode in expansions:
+        modes[f"expand_{mode}"] = lambda q, m=mode: [r["id"] for r in hybrid.get(q, k, rerank=True, expand=m)]
+    return modes
+
+
+def run_mode(search: Callable[[str], List[str]], corpus: Corpus, k: int, concurrency: int) -> dict:
+    def one(i: int) -> Tuple[float, List[str]]:
+        start = time.perf_counter()
+        ranked = search(corpus.queries[i])
+        return time.perf_counter() - start, ranked
+
+    search(corpus.queries[0])  # warm caches and lazily built structures
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(one, range(len(corpus.queries))))
+    else:
+        results = [one(i) for i in range(len(corpus.queries))]
+    elapsed = time.perf_counter() - start
+
+    latencies = [1000 * seconds for seconds, _ in results]
+    scores = np.array([score_ranking(ranked, grades, k) for (_, ranked), grades in zip(results, corpus.qrels)])
+    return {
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p95_ms": round(_percentile(latencies, 95), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "qps": round(len(results) / elapsed, 1),
+        f"recall@{k}": round(float(scores[:, 0].mean()), 4),
+        "mrr": round(float(scores[:, 1].mean()), 4),
+        f"ndcg@{k}": round(float(scores[:, 2].mean()), 4),
+    }
+
+
+def run_corpus(corpus: Corpus, args, label: str) -> dict:
+    from ingestion.embedder import embed_texts
+    from rag.reranker import get_reranker
+    from rag.retriever import Retriever
+
+    workdir = tempfile.mkdtemp(prefix="bench-retrieval-", dir=args.workdir)
+    try:
+        start = time.perf_counter()
+        store, bm25, build_timings = build(corpus, workdir, args.dim, args.quantization)
+        build_s = time.perf_counter() - start
+        embed_texts(corpus.queries)  # pre-warm: latencies below exclude the embedding API
+
+        rerankers = {"hybrid_rerank": get_reranker("local")}
+        if args.llm_rerank:
+            rerankers["hybrid_rerank_llm"] = get_reranker("llm")
+        modes = searchers(Retriever(store=store, bm25=bm25), rerankers, args.k, args.expansion or [])
+
+        result = {
+            "corpus": label,
+            "chunks": len(corpus),
+            "queries": len(corpus.queries),
+            "build_s": round(build_s, 2),
+            **build_timings,
+            "disk_mb": _disk_mb(workdir),
+            **_rss_mb(),
+            "vector_store": store.memory_stats(),
+            "modes": {},
+        }
+        print(f"\n{label}: {len(corpus)} chunks, {len(corpus.queries)} queries, built in {build_s:.1f}s, "
+              f"{result['disk_mb']} MB on disk, RSS {result['rss_mb']} MB")
+        print(f"{'mode':<18} {'p50':>8} {'p95':>8} {'p99':>8} {'qps':>8} "
+              f"{'recall@' + str(args.k):>9} {'mrr':>6} {'ndcg@' + str(args.k):>8}")
+        for name, search in modes.items():
+            if args.modes and name not in args.modes:
+                continue
+            row = run_mode(search, corpus, args.k, args.concurrency)
+            result["modes"][name] = row
+            print(f"{name:<18} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+                  f"{row['qps']:>8.1f} {row[f'recall@{args.k}']:>9.3f} {row['mrr']:>6.3f} "
+                  f"{row[f'ndcg@{args.k}']:>8.3f}")
+        store._conn.close()
+        bm25.close()
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current: dict, baseline_path: str) -> None:
+    """Print metric deltas (current - baseline) for corpora and modes present in both."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    old = {run["corpus"]: run for run in baseline.get("runs", [])}
+    print(f"\nvs {baseline_path} (commit {baseline.get('commit')})")
+    for run in current["runs"]:
+        before = old.get(run["corpus"])
+        if before is None:
+            continue
+        print(f"{run['corpus']}: build_s {run['build_s'] - before['build_s']:+.2f}  "
+              f"rss_mb {run['rss_mb'] - before['rss_mb']:+.1f}")
+        for name, row in run["modes"].items():
+            prev = before["modes"].get(name)
+            if prev is None:
+                continue
+            deltas = "  ".join(
+                f"{key} {row[key] - prev[key]:+.3f}" for key in row if key in prev
+            )
+            print(f"  {name:<18} {deltas}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000], help="synthetic corpus sizes (chunks)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--corpus", help="fixture corpus JSONL instead of synthetic data")
+    parser.add_argument("--qrels", help="fixture queries JSONL (required with --corpus)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", nargs="*", help=f"run only these modes (default: {' '.join(MODES)})")
+    parser.add_argument("--llm-rerank", action="store_true", help="also run hybrid + LLM reranking")
+    parser.add_argument("--expansion", nargs="*", choices=["multi_query", "hyde", "both"],
+                        help="also run hybrid + local rerank with these query expansions (fake LLM)")
+    parser.add_argument("--concurrency", type=int, default=1, help="query threads for the throughput run")
+    parser.add_argument("--dim", type=int, default=256, help="fake embedding dimension")
+    parser.add_argument("--quantization", default="none", help="vector store codec (see VECTOR_QUANTIZATION)")
+    parser.add_argument("--latency-ms", type=int, default=0, help="fake API latency (LLM reranking)")
+    parser.add_argument("--workdir", help="where to build the indexes (default: system temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--compare", help="results JSON of an earlier run to diff against")
+    args = parser.parse_args(argv)
+    if args.corpus and not args.qrels:
+        parser.error("--corpus needs --qrels")
+
+    # Config is read at import time, so the fake API must be up first
+    server = serve_in_background(port=0, latency_ms=args.latency_ms, dim=args.dim, embedding="lexical")
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bench-retrieval-data-", dir=args.workdir)
+    os.environ["VECTOR_BACKEND"] = "local"
+
+    try:
+        runs = []
+        if args.corpus:
+            runs.append(run_corpus(fixture(args.corpus, args.qrels), args, os.path.basename(args.corpus)))
+        else:
+            for size in args.sizes:
+                start = time.perf_counter()
+                corpus = synthetic(size, args.queries, args.seed)
+                print(f"generated {size} chunks in {time.perf_counter() - start:.1f}s")
+                runs.append(run_corpus(corpus, args, f"synthetic-{size}"))
+    finally:
+        server.shutdown()
+        shutil.rmtree(os.environ["DATA_DIR"], ignore_errors=True)
+
+    results = {
+        "commit": _git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "k": args.k, "dim": args.dim, "quantization": args.quantization,
+            "concurrency": args.concurrency, "seed": args.seed, "queries": args.queries,
+        },
+        "runs": runs,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
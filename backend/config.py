@@ -3,3 +3,152 @@ import os
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Local state (uploads, lexical index, caches) lives under this directory
+DATA_DIR = os.getenv("DATA_DIR", "data")
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", os.path.join(DATA_DIR, "bm25.sqlite3"))
+
+# BM25 tokenization (changing these triggers a one-time reindex)
+BM25_LOWERCASE = os.getenv("BM25_LOWERCASE", "true").lower() == "true"
+BM25_STRIP_PUNCTUATION = os.getenv("BM25_STRIP_PUNCTUATION", "true").lower() == "true"
+BM25_STEMMING = os.getenv("BM25_STEMMING", "false").lower() == "true"
+# Query terms found in more than this fraction of documents (stopword-like) are
+# skipped once the corpus has BM25_MAX_DF_MIN_DOCS documents: they add almost
+# nothing to the score but have the longest postings to read
+BM25_MAX_DF_RATIO = float(os.getenv("BM25_MAX_DF_RATIO", "0.5"))
+BM25_MAX_DF_MIN_DOCS = int(os.getenv("BM25_MAX_DF_MIN_DOCS", "1000"))
+
+# Hybrid retrieval: "rrf" (reciprocal-rank) or "weighted" (normalized scores)
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")
+HYBRID_K_VEC = int(os.getenv("HYBRID_K_VEC", "20"))
+HYBRID_K_BM25 = int(os.getenv("HYBRID_K_BM25", "20"))
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_BM25_WEIGHT = float(os.getenv("HYBRID_BM25_WEIGHT", "1.0"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Query expansion (rag/query_expansion.py): "none", "multi_query" (LLM
+# sub-queries), "hyde" (LLM-written hypothetical answer, vector search only)
+# or "both". Expanded texts are embedded in one call and searched in parallel.
+RETRIEVAL_EXPANSION = os.getenv("RETRIEVAL_EXPANSION", "none")
+EXPANSION_QUERIES = int(os.getenv("EXPANSION_QUERIES", "3"))
+# Fusion weight of expanded rankings relative to the user's own query
+EXPANSION_WEIGHT = float(os.getenv("EXPANSION_WEIGHT", "0.7"))
+EXPANSION_SEARCH_WORKERS = int(os.getenv("EXPANSION_SEARCH_WORKERS", "8"))
+
+# Reranking runs over the fused top-N only; disable to rely on fusion order
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "10"))
+# "local" (feature-based, CPU), "cross_encoder", "llm" or "none"
+RERANKER_MODE = os.getenv("RERANKER_MODE", "local")
+RERANK_TIMEOUT_MS = int(os.getenv("RERANK_TIMEOUT_MS", "50"))
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# Embeddings
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10000"))
+# Point at a local fake server for tests/benchmarks, e.g. http://127.0.0.1:8765/v1
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+EMBED_BATCH_ITEMS = int(os.getenv("EMBED_BATCH_ITEMS", "512"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+# Chat completions: one pooled async client per process (see llm_client.py)
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+LLM_CONNECT_TIMEOUT_S = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+# PDF extraction: page ranges are spread over a process pool for big files
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+# Chunks embedded and stored per batch while streaming a document
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", "256"))
+# Staged ingestion: bounded queue depth between stages and embed parallelism
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+# Background ingest jobs. An uploaded PDF is deleted once its job has finished
+# (the index keeps the extracted text) unless KEEP_UPLOADS is set. Startup
+# removes partial uploads (*.part) and, without KEEP_UPLOADS, any leftovers
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(DATA_DIR, "uploads"))
+KEEP_UPLOADS = os.getenv("KEEP_UPLOADS", "false").lower() == "true"
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "500"))
+
+# Prompt context budget in LLM_MODEL tokens (rag/context_builder.py). Chunks
+# of one source closer than CONTEXT_MERGE_GAP_CHARS are merged into one passage
+# (stored chunks are rstripped, so neighbours are a few whitespace chars apart)
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+CONTEXT_MERGE_GAP_CHARS = int(os.getenv("CONTEXT_MERGE_GAP_CHARS", "4"))
+# Chunk sizes are measured in embedding-model tokens
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+
+# Repository ingestion: code is chunked along symbols, up to this many tokens
+CODE_CHUNK_MAX_TOKENS = int(os.getenv("CODE_CHUNK_MAX_TOKENS", "512"))
+REPO_DIR = os.getenv("REPO_DIR", os.path.join(DATA_DIR, "repos"))  # clones of remote URLs
+# Local repositories POST /ingest/repo may index: each entry (os.pathsep-separated)
+# is a repository root or a directory holding them. Empty: none.
+REPO_ROOTS = [os.path.realpath(p) for p in os.getenv("REPO_ROOTS", "").split(os.pathsep) if p]
+# Cloning git URLs into REPO_DIR reaches out to the network; off unless enabled
+REPO_ALLOW_REMOTE = os.getenv("REPO_ALLOW_REMOTE", "false").lower() == "true"
+REPO_MAX_FILE_BYTES = int(os.getenv("REPO_MAX_FILE_BYTES", str(512 * 1024)))
+
+# Vector store: "chroma" (persistent Chroma collection) or "local" (in-process IVF)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+CHROMA_PATH = os.getenv("CHROMA_PATH", os.path.join(DATA_DIR, "chroma"))
+CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "documents")
+LOCAL_VECTOR_PATH = os.getenv("LOCAL_VECTOR_PATH", os.path.join(DATA_DIR, "vectors"))
+IVF_MIN_TRAIN = int(os.getenv("IVF_MIN_TRAIN", "20000"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+# Local backend only: compressed in-memory codes for the first scoring pass
+# ("none", "float16", "int8" or "pq"), optionally on vectors truncated to their
+# first VECTOR_TRUNCATE_DIM dims; the top k * VECTOR_RESCORE_FACTOR candidates
+# are re-scored against the full-precision vectors on disk. Codes are built
+# when the IVF index is trained (IVF_MIN_TRAIN chunks).
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+VECTOR_TRUNCATE_DIM = int(os.getenv("VECTOR_TRUNCATE_DIM", "0"))
+VECTOR_PQ_SUBVECTORS = int(os.getenv("VECTOR_PQ_SUBVECTORS", "0"))  # 0: one per 8 dims
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+DOCUMENT_REGISTRY_PATH = os.getenv("DOCUMENT_REGISTRY_PATH", os.path.join(DATA_DIR, "documents.sqlite3"))
+
+# Trigram index behind the repo_search_code / repo_list_files tools (mcp_tools/code_index.py)
+CODE_INDEX_PATH = os.getenv("CODE_INDEX_PATH", os.path.join(DATA_DIR, "code_index.sqlite3"))
+# Searches re-check file mtimes in the background once the index is this old
+CODE_INDEX_REFRESH_S = float(os.getenv("CODE_INDEX_REFRESH_S", "10"))
+CODE_INDEX_MAX_FILE_BYTES = int(os.getenv("CODE_INDEX_MAX_FILE_BYTES", str(1 << 20)))
+
+# Agent execution: "speculative" overlaps retrieval (and optionally answering)
+# with planning; "sequential" is plan -> act -> evaluate, one step at a time
+AGENT_EXECUTION = os.getenv("AGENT_EXECUTION", "speculative")
+# Also start both answers while planning and cancel the loser (one extra LLM call)
+AGENT_RACE_ANSWERS = os.getenv("AGENT_RACE_ANSWERS", "false").lower() == "true"
+# "auto" skips evaluation when it cannot change the outcome or the request is over budget
+AGENT_EVALUATION = os.getenv("AGENT_EVALUATION", "auto")
+AGENT_EVAL_BUDGET_MS = int(os.getenv("AGENT_EVAL_BUDGET_MS", "3000"))
+# Speculative work on the user's query is reused if the planner's rewrite overlaps this much
+AGENT_REUSE_MIN_OVERLAP = float(os.getenv("AGENT_REUSE_MIN_OVERLAP", "0.5"))
+
+# Local planner fast path (agent/router.py); the LLM planner is only asked when unsure
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.7"))
+ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.3"))
+ROUTER_K = int(os.getenv("ROUTER_K", "5"))
+
+# Answer cache for /query and /agent (rag/answer_cache.py)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ITEMS = int(os.getenv("ANSWER_CACHE_MAX_ITEMS", "2048"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+# Second tier: reuse the answer of a cached question whose embedding is this similar
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+# Tracing and metrics (tracing.py): span timings feed GET /metrics; requests
+# with "trace": true (or every request, with TRACE_RESPONSES) get a breakdown
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_RESPONSES = os.getenv("TRACE_RESPONSES", "false").lower() == "true"
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "256"))
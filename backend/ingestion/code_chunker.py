@@ -0,0 +1,191 @@
+import ast
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from config import EMBEDDING_MODEL, CODE_CHUNK_MAX_TOKENS
+from ingestion.text_chunker import Chunk
+from ingestion.tokens import count_tokens_many
+
+# An unindented line that starts a definition in most C-like and scripting
+# languages; group 1 is the defined name
+_TOP_LEVEL_DEF = re.compile(
+    r"^(?:export\s+)?(?:default\s+)?(?:pub(?:\(\w+\))?\s+)?(?:public\s+|private\s+|protected\s+|internal\s+)?"
+    r"(?:static\s+|abstract\s+|final\s+|async\s+|unsafe\s+)*"
+    r"(?:function\*?|class|interface|struct|enum|trait|impl|fn|func|def|module|type|object|"
+    r"(?:const|let|var)(?=\s+\w+\s*=\s*(?:async\s*)?(?:function|\(|\w+\s*=>)))\s+"
+    r"(?:<[^>]*>\s*)?(?:\([^)]*\)\s*)?([A-Za-z_$][\w$]*)"
+)
+_BLANK = re.compile(r"^\s*$")
+# Doc comments, attributes and decorators that belong to the definition below them
+_LEADING = re.compile(r"^\s*(?://|#|/\*|\*|@|\[\w)")
+
+
+@dataclass
+class _Segment:
+    start: int  # 0-based line indices, end exclusive
+    end: int
+    symbol: str
+    kind: str   # "function" | "class" | "method" | "module" | "block"
+
+
+class _Lines:
+    """A file's lines with character offsets and per-line token counts."""
+
+    def __init__(self, text: str, model: str):
+        self.text = text
+        # Split on "\n" only, like ast line numbers (str.splitlines also breaks on \x0c etc.)
+        self.lines = re.findall(r"[^\n]*\n|[^\n]+\Z", text)
+        self.offsets = np.zeros(len(self.lines) + 1, dtype=np.int64)
+        np.cumsum([len(line) for line in self.lines], out=self.offsets[1:])
+        self.tokens = np.zeros(len(self.lines) + 1, dtype=np.int64)
+        if self.lines:
+            np.cumsum(count_tokens_many(self.lines, model), out=self.tokens[1:])
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def cost(self, start: int, end: int) -> int:
+        return int(self.tokens[end] - self.tokens[start])
+
+    def blank(self, i: int) -> bool:
+        return bool(_BLANK.match(self.lines[i]))
+
+
+def _python_segments(text: str, lines: _Lines, max_tokens: int) -> Optional[List[_Segment]]:
+    """Top-level functions and classes (oversized classes by method); None if unparsable."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+
+    def span(node) -> tuple:
+        first = min([d.lineno for d in getattr(node, "decorator_list", [])] + [node.lineno])
+        return first - 1, node.end_lineno
+
+    def group(body, owner: Optional[str]) -> List[_Segment]:
+        segments: List[_Segment] = []
+        for node in body:
+            start, end = span(node)
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                name = f"{owner}.{node.name}" if owner else node.name
+                segments.append(_Segment(start, end, name, "method" if owner else "function"))
+            elif isinstance(node, ast.ClassDef) and owner is None:
+                if lines.cost(start, end) <= max_tokens:
+                    segments.append(_Segment(start, end, node.name, "class"))
+                else:
+                    inner = group(node.body, node.name)
+                    # The class line (and decorators) belong to its first segment
+                    inner[0].start = start
+                    segments.extend(inner)
+            else:
+                # Imports, constants, class attributes: consecutive statements share a segment
+                kind = "class" if owner else "module"
+                if segments and segments[-1].kind == kind and lines.cost(segments[-1].start, end) <= max_tokens:
+                    segments[-1].end = end
+                else:
+                    segments.append(_Segment(start, end, owner or "", kind))
+        return segments
+
+    return group(tree.body, None)
+
+
+def _generic_segments(lines: _Lines) -> List[_Segment]:
+    """Split at unindented definition lines; a file without any is one block."""
+    segments: List[_Segment] = []
+    for i, line in enumerate(lines.lines):
+        m = _TOP_LEVEL_DEF.match(line)
+        if m:
+            floor = segments[-1].start + 1 if segments else 0
+            while i > floor and _LEADING.match(lines.lines[i - 1]):
+                i -= 1
+            if not segments and i > 0:
+                segments.append(_Segment(0, i, "", "module"))
+            elif segments:
+                segments[-1].end = i
+            segments.append(_Segment(i, len(lines), m.group(1), "block"))
+    return segments or [_Segment(0, len(lines), "", "module")]
+
+
+def _split(seg: _Segment, lines: _Lines, max_tokens: int) -> List[_Segment]:
+    """Cut an oversized segment into line windows, preferring blank lines as cut points."""
+    parts: List[_Segment] = []
+    start = seg.start
+    while start < seg.end:
+        end = start + 1
+        while end < seg.end and lines.cost(start, end + 1) <= max_tokens:
+            end += 1
+        if end < seg.end:
+            for cut in range(end - 1, (start + end) // 2, -1):
+                if lines.blank(cut):
+                    end = cut + 1
+                    break
+        parts.append(_Segment(start, end, seg.symbol, seg.kind))
+        start = end
+    return parts
+
+
+def chunk_code(
+    text: str,
+    path: str,
+    max_tokens: int = CODE_CHUNK_MAX_TOKENS,
+    metadata: Optional[dict] = None,
+    language: Optional[str] = None,
+    model: str = EMBEDDING_MODEL,
+) -> List[Chunk]:
+    """
+    Split a source file along symbol boundaries: Python through `ast`
+    (functions, classes, and methods of classes too big for one chunk),
+    other languages at unindented definition lines. Comments directly above
+    a definition stay with it; anything still over `max_tokens` is cut into
+    line windows. Chunks carry path, symbol, kind and 1-based line range
+    in their metadata.
+    """
+    lines = _Lines(text, model)
+    if not len(lines):
+        return []
+
+    segments = None
+    if language == "python" or (language is None and path.endswith(".py")):
+        segments = _python_segments(text, lines, max_tokens)
+    if not segments:
+        segments = _generic_segments(lines)
+
+    # Cover the whole file: gaps (comments, blank lines) join the following segment
+    segments.sort(key=lambda s: s.start)
+    for prev, seg in zip([None] + segments[:-1], segments):
+        seg.start = prev.end if prev is not None else 0
+    segments[-1].end = len(lines)
+
+    chunks = []
+    for seg in segments:
+        while seg.start < seg.end and lines.blank(seg.start):
+            seg.start += 1
+        if seg.start >= seg.end:
+            continue
+        parts = [seg] if lines.cost(seg.start, seg.end) <= max_tokens else _split(seg, lines, max_tokens)
+        for i, part in enumerate(parts):
+            start, end = int(lines.offsets[part.start]), int(lines.offsets[part.end])
+            piece = text[start:end].rstrip()
+            if not piece.strip():
+                continue
+            meta = {
+                **(metadata or {}),
+                "path": path,
+                "symbol": part.symbol,
+                "kind": part.kind,
+                "start_line": part.start + 1,
+                "end_line": part.start + piece.count("\n") + 1,
+            }
+            if len(parts) > 1:
+                meta["part"] = i + 1
+            chunks.append(Chunk(
+                text=piece,
+                start=start,
+                end=start + len(piece),
+                n_tokens=lines.cost(part.start, part.end),
+                metadata=meta,
+            ))
+    return chunks
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import DOCUMENT_REGISTRY_PATH
+from ingestion.embedding_cache import normalize_text
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, start: int, text: str) -> str:
+    """Deterministic chunk id from (source, character offset, content hash)."""
+    key = f"{source}\0{start}\0{content_hash(text)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+class DocumentRegistry:
+    """
+    Tracks which version of each source document is indexed and which
+    chunk ids belong to it, so re-ingests can skip unchanged documents and
+    only touch the chunks that changed.
+    """
+
+    SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    source TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS document_chunks (
+    source TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    PRIMARY KEY (source, chunk_id)
+) WITHOUT ROWID;
+"""
+
+    def __init__(self, path: str = DOCUMENT_REGISTRY_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def get(self, source: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, version, updated_at FROM documents WHERE source = ?", (source,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"source": source, "content_hash": row[0], "version": row[1], "updated_at": row[2]}
+
+    def chunk_ids(self, source: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT chunk_id FROM document_chunks WHERE source = ?", (source,)
+            )]
+
+    def sources(self, prefix: str = "") -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT source FROM documents WHERE substr(source, 1, ?) = ? ORDER BY source",
+                (len(prefix), prefix),
+            )]
+
+    def hashes(self, prefix: str = "") -> Dict[str, str]:
+        """{source: content hash} for every document whose source starts with `prefix`."""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT source, content_hash FROM documents WHERE substr(source, 1, ?) = ?",
+                (len(prefix), prefix),
+            ))
+
+    def remove(self, source: str) -> List[str]:
+        """Forget a document; returns the chunk ids it had, for deletion from the indexes."""
+        with self._lock, self._conn:
+            ids = [r[0] for r in self._conn.execute(
+                "SELECT chunk_id FROM document_chunks WHERE source = ?", (source,)
+            )]
+            self._conn.execute("DELETE FROM document_chunks WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM documents WHERE source = ?", (source,))
+        return ids
+
+    def put(self, source: str, doc_hash: str, chunk_ids: List[str]) -> int:
+        """Record a new version of a document; returns its version number."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT version FROM documents WHERE source = ?", (source,)).fetchone()
+            version = (row[0] + 1) if row else 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (source, content_hash, version, updated_at) VALUES (?, ?, ?, ?)",
+                (source, doc_hash, version, time.time()),
+            )
+            self._conn.execute("DELETE FROM document_chunks WHERE source = ?", (source,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO document_chunks (source, chunk_id) VALUES (?, ?)",
+                [(source, cid) for cid in chunk_ids],
+            )
+        return version
+
+
+_registry: Optional[DocumentRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_document_registry() -> DocumentRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = DocumentRegistry()
+    return _registry
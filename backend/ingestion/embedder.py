@@ -1,17 +1,165 @@
+import contextvars
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import openai
 from openai import OpenAI
-from config import OPENAI_API_KEY
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    EMBEDDING_MODEL,
+    EMBED_BATCH_TOKENS,
+    EMBED_BATCH_ITEMS,
+    EMBED_CONCURRENCY,
+    EMBED_MAX_RETRIES,
+)
+from ingestion.embedding_cache import get_embedding_cache, text_key
+from ingestion.tokens import count_tokens_many
+from tracing import count, span
+
+logger = logging.getLogger(__name__)
+
+# Retries are handled by EmbeddingEngine so backoff spans the whole batch pool
+client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+class EmbeddingEngine:
+    """
+    Splits inputs into batches by token budget, embeds the batches
+    concurrently on a bounded thread pool, and retries 429/5xx responses
+    with exponential backoff. Output i is always the embedding of input i.
+    """
+
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        max_batch_tokens: int = EMBED_BATCH_TOKENS,
+        max_batch_items: int = EMBED_BATCH_ITEMS,
+        concurrency: int = EMBED_CONCURRENCY,
+        max_retries: int = EMBED_MAX_RETRIES,
+        api_client: Optional[OpenAI] = None,
+    ):
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.client = api_client or client
+
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Group input indices so each batch stays under both limits."""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        token_counts = count_tokens_many(texts, self.model)
+        count("embedding_tokens_total", sum(token_counts), model=self.model)
+        for i, n_tokens in enumerate(token_counts):
+            if current and (
+                current_tokens + n_tokens > self.max_batch_tokens
+                or len(current) >= self.max_batch_items
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += n_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                count("embedding_requests_total", model=self.model)
+                with span("embed.batch", inputs=len(batch), attempt=attempt):
+                    response = self.client.embeddings.create(model=self.model, input=batch)
+                # The API may return items out of order; `index` is authoritative
+                data = sorted(response.data, key=lambda d: d.index)
+                return [d.embedding for d in data]
+            except Exception as e:
+                if not _is_retryable(e) or attempt == self.max_retries:
+                    raise
+                count("embedding_retries_total", model=self.model, error=type(e).__name__)
+                delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+                retry_after = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                logger.warning("Embedding batch failed (%s); retrying in %.1fs", e, delay)
+                time.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = self.make_batches(texts)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        def run(indices: List[int]) -> None:
+            vectors = self._embed_batch([texts[i] for i in indices])
+            if len(vectors) != len(indices):
+                raise RuntimeError(
+                    f"Embedding API returned {len(vectors)} vectors for {len(indices)} inputs."
+                )
+            for i, vector in zip(indices, vectors):
+                results[i] = vector
+
+        if len(batches) == 1 or self.concurrency <= 1:
+            for indices in batches:
+                run(indices)
+        else:
+            # Each batch runs in a copy of the caller's context, so its spans join the caller's trace
+            contexts = [contextvars.copy_context() for _ in batches]
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+                # list() re-raises the first batch failure
+                list(pool.map(lambda ctx, indices: ctx.run(run, indices), contexts, batches))
+
+        return results
+
+
+_engine = EmbeddingEngine()
+
+
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    """
+    Embed non-empty strings; output i is the embedding of texts[i].
+
+    Vectors are served from the content-addressed cache when possible; only
+    texts never embedded with this model before reach the API.
+    """
+    empty = [i for i, t in enumerate(texts) if not t or not t.strip()]
+    if empty:
+        raise ValueError(f"Cannot embed empty text at positions {empty[:10]}.")
+
+    cleaned = [t.strip() for t in texts]
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+    with span("embed", texts=len(texts)) as s:
+        cache = get_embedding_cache()
+        vectors = cache.get_many(EMBEDDING_MODEL, cleaned)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        count("embedding_cache_lookups_total", len(texts) - len(missing), result="hit")
+        count("embedding_cache_lookups_total", len(missing), result="miss")
+        s.set(cache_hits=len(texts) - len(missing))
 
-def embed_texts(texts: list[str]):
-    """Embed only valid, non-empty strings."""
-    cleaned = [t.strip() for t in texts if t and t.strip()]
+        if missing:
+            # Identical texts within one call (overlapping windows, repeated
+            # boilerplate) are only sent once
+            unique = list({text_key(cleaned[i]): cleaned[i] for i in missing}.values())
+            fresh = _engine.embed(unique)
+            cache.put_many(EMBEDDING_MODEL, unique, fresh)
 
-    if not cleaned:
-        raise ValueError("No valid text to embed (all chunks empty).")
+            by_key = {text_key(t): v for t, v in zip(unique, fresh)}
+            for i in missing:
+                vectors[i] = by_key[text_key(cleaned[i])]
 
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=cleaned
-    )
-    return response.data
\ No newline at end of file
+    return [v.tolist() if hasattr(v, "tolist") else list(v) for v in vectors]
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ITEMS
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form used for cache keys."""
+    return " ".join(text.split())
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model, sha256 of normalized text).
+
+    Two tiers: a bounded in-memory LRU in front of a SQLite table holding
+    float32 vectors. Both tiers are shared by ingestion and query embedding.
+    """
+
+    # Stay under SQLite's bound-parameter limit on older builds
+    SQL_BATCH = 500
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, memory_items: int = EMBEDDING_CACHE_MEMORY_ITEMS):
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, key)) WITHOUT ROWID"
+        )
+
+    def _remember(self, mkey: tuple, vector: np.ndarray) -> None:
+        self._memory[mkey] = vector
+        self._memory.move_to_end(mkey)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up each text; returns None where neither tier has it."""
+        keys = [text_key(t) for t in texts]
+        found: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        with self._lock:
+            disk_lookup = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get((model, key))
+                if vector is not None:
+                    self._memory.move_to_end((model, key))
+                    found[i] = vector
+                    self.stats["memory_hits"] += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            pending = list(disk_lookup)
+            for start in range(0, len(pending), self.SQL_BATCH):
+                batch = pending[start:start + self.SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember((model, key), vector)
+                    for i in disk_lookup[key]:
+                        found[i] = vector
+                        self.stats["disk_hits"] += 1
+
+            self.stats["misses"] += sum(1 for v in found if v is None)
+        return found
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                arr = np.asarray(vector, dtype=np.float32)
+                self._remember((model, key), arr)
+                rows.append((model, key, arr.tobytes()))
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)", rows
+                )
+
+    def snapshot_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = sum(stats.values())
+            stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            stats["memory_items"] = len(self._memory)
+        return stats
+
+
+# --------------------------
+# Process-wide shared instance
+# --------------------------
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
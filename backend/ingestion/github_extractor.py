@@ -0,0 +1,134 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from config import REPO_ALLOW_REMOTE, REPO_DIR, REPO_MAX_FILE_BYTES, REPO_ROOTS
+
+# Extension -> language; files with other extensions are not ingested
+LANGUAGES = {
+    ".py": "python", ".pyi": "python",
+    ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript", ".cjs": "javascript",
+    ".ts": "typescript", ".tsx": "typescript",
+    ".go": "go", ".rs": "rust", ".java": "java", ".kt": "kotlin", ".scala": "scala",
+    ".rb": "ruby", ".php": "php", ".swift": "swift", ".cs": "csharp",
+    ".c": "c", ".h": "c", ".cc": "cpp", ".cpp": "cpp", ".hpp": "cpp",
+    ".sh": "shell", ".sql": "sql", ".proto": "protobuf",
+    ".md": "markdown", ".rst": "restructuredtext", ".txt": "text",
+    ".toml": "toml", ".yaml": "yaml", ".yml": "yaml", ".cfg": "ini", ".ini": "ini",
+}
+# Prose is chunked like any other document rather than by symbols
+PROSE_LANGUAGES = frozenset({"markdown", "restructuredtext", "text"})
+
+_SKIP_PARTS = frozenset({
+    "node_modules", "vendor", "third_party", "dist", "build", "__pycache__", ".venv", "venv",
+})
+_LOCKFILE = re.compile(r"(?:^|/)(?:package-lock\.json|yarn\.lock|pnpm-lock\.yaml|poetry\.lock|Cargo\.lock)$")
+
+
+@dataclass
+class RepoFile:
+    path: str       # repo-relative, forward slashes
+    blob_sha: str   # git blob hash: identical content <=> identical hash
+    size: int
+    language: str
+    _blob: object = None
+
+    def read(self) -> str:
+        return self._blob.data_stream.read().decode("utf-8", errors="ignore")
+
+
+def _is_url(location: str) -> bool:
+    return "://" in location or location.startswith("git@")
+
+
+def repo_name(location: str) -> str:
+    """Short name for a clone path or remote URL (e.g. "owner/project")."""
+    location = location.rstrip("/")
+    if location.endswith(".git"):
+        location = location[:-4]
+    if _is_url(location):
+        parts = re.split(r"[/:]", location)
+        return "/".join(parts[-2:])
+    return os.path.basename(os.path.abspath(location))
+
+
+def check_location(location: str) -> None:
+    """
+    Raise ValueError unless `location` may be ingested: a remote URL only
+    with REPO_ALLOW_REMOTE, otherwise a local path at or under one of the
+    REPO_ROOTS.
+    """
+    if _is_url(location):
+        if not REPO_ALLOW_REMOTE:
+            raise ValueError("Cloning remote repositories is disabled (set REPO_ALLOW_REMOTE=true)")
+        return
+    path = os.path.realpath(location)
+    if not any(path == root or path.startswith(root + os.sep) for root in REPO_ROOTS):
+        raise ValueError(f"Not under an allowed repository root (REPO_ROOTS): {location}")
+
+
+def open_repo(location: str):
+    """
+    A git.Repo for a local clone (its root directory, not a path inside
+    it), or, if enabled, for a remote URL cloned (once) under REPO_DIR and
+    fetched on later calls. See check_location for what is allowed.
+    """
+    import git
+
+    check_location(location)
+    if not _is_url(location):
+        return git.Repo(os.path.realpath(location))
+
+    dest = os.path.join(REPO_DIR, repo_name(location).replace("/", "__"))
+    if os.path.isdir(os.path.join(dest, ".git")):
+        repo = git.Repo(dest)
+        repo.remotes.origin.fetch(tags=True)
+        repo.remotes.origin.pull(ff_only=True)
+        return repo
+    os.makedirs(REPO_DIR, exist_ok=True)
+    # Full clone: any branch, tag or commit can be asked for as `ref`
+    return git.Repo.clone_from(location, dest)
+
+
+def _commit(repo, ref: str):
+    """`ref` as a commit; branches of a clone's remote resolve without a local branch."""
+    import git
+
+    try:
+        return repo.commit(ref)
+    except (git.BadName, ValueError):
+        if ref == "HEAD" or not repo.remotes:
+            raise
+        return repo.commit(f"{repo.remotes[0].name}/{ref}")
+
+
+def iter_repo_files(repo, ref: str = "HEAD", max_file_bytes: int = REPO_MAX_FILE_BYTES) -> Iterator[RepoFile]:
+    """
+    Source and documentation files in the tree of `ref`, with their blob
+    hashes. Nothing is read until RepoFile.read() is called, so unchanged
+    files can be skipped on the hash alone.
+    """
+    tree = _commit(repo, ref).tree
+    for item in tree.traverse():
+        if item.type != "blob":
+            continue
+        path = item.path
+        language = LANGUAGES.get(os.path.splitext(path)[1].lower())
+        if (
+            language is None
+            or item.size > max_file_bytes
+            or _LOCKFILE.search(path)
+            or any(part in _SKIP_PARTS or part.startswith(".") for part in path.split("/")[:-1])
+        ):
+            continue
+        yield RepoFile(path=path, blob_sha=item.hexsha, size=item.size, language=language, _blob=item)
+
+
+def head_commit(repo, ref: str = "HEAD") -> Optional[str]:
+    import git
+
+    try:
+        return _commit(repo, ref).hexsha
+    except (git.BadName, ValueError):
+        return None
@@ -0,0 +1,141 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from config import INGEST_JOB_WORKERS, INGEST_JOB_HISTORY
+
+logger = logging.getLogger(__name__)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning("Could not remove %s", path, exc_info=True)
+
+
+class IngestJobManager:
+    """
+    Runs ingestion jobs on a small worker pool, off the request path.
+
+    Each job is a plain dict:
+    {
+      "id", "kind", "source", "status": "queued" | "running" | "succeeded" | "failed",
+      "progress", "result", "error", "created_at", "started_at", "finished_at"
+    }
+
+    Submissions are collapsed onto an existing job for the same key (file
+    name and content hash, URL, or repo and ref) only while that job is
+    still queued or running. A finished job is never reused: the indexed
+    version may have been replaced since, and the pipeline itself skips
+    documents whose registered hash is unchanged, so a resubmit is cheap.
+    """
+
+    def __init__(self, pipeline, workers: int = INGEST_JOB_WORKERS, history: int = INGEST_JOB_HISTORY):
+        self.pipeline = pipeline
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._by_key: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _submit(self, kind: str, source: str, dedupe_key: str, run: Callable) -> tuple:
+        with self._lock:
+            existing_id = self._by_key.get(dedupe_key)
+            existing = self._jobs.get(existing_id) if existing_id else None
+            if existing and existing["status"] in ("queued", "running"):
+                return dict(existing), True
+
+            job = {
+                "id": uuid.uuid4().hex,
+                "kind": kind,
+                "source": source,
+                "status": "queued",
+                "progress": {},
+                "result": None,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+            }
+            self._jobs[job["id"]] = job
+            self._by_key[dedupe_key] = job["id"]
+            self._evict()
+
+        self._executor.submit(self._execute, job, run)
+        return dict(job), False
+
+    def _evict(self) -> None:
+        """Forget the oldest finished jobs beyond the history limit."""
+        finished = [jid for jid, j in self._jobs.items() if j["status"] in ("succeeded", "failed")]
+        for jid in finished[: max(0, len(self._jobs) - self.history)]:
+            self._jobs.pop(jid)
+            self._by_key = {k: v for k, v in self._by_key.items() if v != jid}
+
+    def _execute(self, job: dict, run: Callable[[dict], dict]) -> None:
+        job["status"] = "running"
+        job["started_at"] = time.time()
+
+        def on_progress(stages: dict) -> None:
+            job["progress"] = stages
+
+        try:
+            job["result"] = run(on_progress)
+            job["status"] = "succeeded"
+        except Exception as e:
+            logger.exception("Ingest job %s failed", job["id"])
+            job["error"] = f"{type(e).__name__}: {e}"
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = time.time()
+
+    # --------------------------
+    # Public API
+    # --------------------------
+    def submit_pdf(
+        self, path: str, content_hash: str, source: Optional[str] = None, delete_after: bool = False
+    ) -> tuple:
+        """
+        Returns (job, deduplicated). With `delete_after` the file at `path`
+        is removed once the job has finished, whether it succeeded or not;
+        when deduplicated no job will read it, so the caller owns it.
+        """
+        def run(on_progress) -> dict:
+            try:
+                return self.pipeline.ingest_pdf(path, on_progress=on_progress, source=source)
+            finally:
+                if delete_after:
+                    _remove(path)
+
+        return self._submit("pdf", source or path, f"pdf:{source or path}:sha256:{content_hash}", run)
+
+    def submit_url(self, url: str) -> tuple:
+        return self._submit(
+            "url", url, f"url:{url}",
+            lambda on_progress: self.pipeline.ingest_url(url, on_progress=on_progress),
+        )
+
+    def submit_repo(self, location: str, ref: str = "HEAD", name: Optional[str] = None) -> tuple:
+        return self._submit(
+            "repo", location, f"repo:{location}@{ref}",
+            lambda on_progress: self.pipeline.ingest_repo(location, on_progress=on_progress, ref=ref, name=name),
+        )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self) -> list:
+        with self._lock:
+            return [dict(j) for j in reversed(self._jobs.values())]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
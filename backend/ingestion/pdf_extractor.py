@@ -1,15 +1,128 @@
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
+
 import PyPDF2
+from config import PDF_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_PAGES_PER_TASK
 
-def extract_pdf(path: str) -> str:
-    """Extract text from a PDF file."""
-    text = ""
+logger = logging.getLogger(__name__)
+
+
+class PageText(NamedTuple):
+    page: int  # 1-based
+    text: str
+    error: Optional[str] = None
+
+
+def _extract_pages(reader: PyPDF2.PdfReader, start: int, stop: int) -> Iterator[PageText]:
+    for i in range(start, stop):
+        try:
+            yield PageText(i + 1, reader.pages[i].extract_text() or "")
+        except Exception as e:
+            yield PageText(i + 1, "", f"{type(e).__name__}: {e}")
+
+
+# Worker-process state: the reader of the document this worker saw last,
+# so a document is parsed once per worker rather than once per page range
+_worker_reader: Optional[Tuple[tuple, BinaryIO, PyPDF2.PdfReader]] = None
+
+
+def _extract_range(path: str, start: int, stop: int) -> List[PageText]:
+    """Extract pages [start, stop) (0-based); runs in worker processes."""
+    global _worker_reader
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if _worker_reader is None or _worker_reader[0] != key:
+        if _worker_reader is not None:
+            _worker_reader[1].close()
+        _worker_reader = None
+        file = open(path, "rb")
+        _worker_reader = (key, file, PyPDF2.PdfReader(file))
+    return list(_extract_pages(_worker_reader[2], start, stop))
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """
+    The process pool shared by all extractions. Workers are spawned, not
+    forked: ingest jobs call this from threads, and forking a threaded
+    process can copy locks in a held state.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pdf_pool(pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """Shut the shared pool down (only if it is still `pool`, when given); the next use starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and (pool is None or _pool is pool):
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def iter_pdf_pages(path: str, workers: int = PDF_WORKERS) -> Iterator[PageText]:
+    """
+    Yield pages in order as they are extracted.
+
+    Large documents are split into page ranges and spread over the shared
+    process pool, with at most two ranges per worker in flight so memory
+    stays bounded however long the document is. Pages that fail to extract
+    are yielded with `error` set (and logged) rather than silently skipped.
+    """
     with open(path, "rb") as file:
         reader = PyPDF2.PdfReader(file)
-        for page in reader.pages:
-            try:
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + "\n"
-            except:
-                continue
-    return text
+        num_pages = len(reader.pages)
+
+        if workers <= 1 or num_pages < PDF_PARALLEL_MIN_PAGES:
+            yield from _report(_extract_pages(reader, 0, num_pages), path)
+            return
+
+    ranges = iter(
+        (start, min(start + PDF_PAGES_PER_TASK, num_pages))
+        for start in range(0, num_pages, PDF_PAGES_PER_TASK)
+    )
+    pool = get_pdf_pool()
+    in_flight = deque()
+    try:
+        while True:
+            while len(in_flight) < 2 * workers:
+                page_range = next(ranges, None)
+                if page_range is None:
+                    break
+                in_flight.append(pool.submit(_extract_range, path, *page_range))
+            if not in_flight:
+                return
+            yield from _report(in_flight.popleft().result(), path)
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory on a hostile file); later documents get a fresh pool
+        shutdown_pdf_pool(pool)
+        raise
+    finally:
+        # Consumer stopped early (or failed): drop the ranges not started yet
+        for future in in_flight:
+            future.cancel()
+
+
+def _report(pages, path: str) -> Iterator[PageText]:
+    for page in pages:
+        if page.error:
+            logger.warning("Failed to extract page %d of %s: %s", page.page, path, page.error)
+        yield page
+
+
+def extract_pdf(path: str) -> str:
+    """Extract text from a PDF file."""
+    return "".join(p.text + "\n" for p in iter_pdf_pages(path) if p.text)
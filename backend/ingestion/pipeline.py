@@ -1,34 +1,295 @@
-from ingestion.pdf_extractor import extract_pdf
+import logging
+import threading
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ingestion.pdf_extractor import iter_pdf_pages
 from ingestion.url_extractor import extract_url
-from ingestion.text_chunker import chunk_text
+from ingestion.text_chunker import Chunk, chunk_document, chunk_stream
+from ingestion.code_chunker import chunk_code
+from ingestion.github_extractor import PROSE_LANGUAGES, head_commit, iter_repo_files, open_repo, repo_name
 from ingestion.embedder import embed_texts
-from vectorstore.chroma_store import ChromaStore
+from ingestion.stages import Stage, StagedPipeline, batched
+from ingestion.documents import chunk_id, content_hash, file_hash, get_document_registry
+from vectorstore.factory import get_vector_store
+from rag.bm25_index import get_bm25_index
+from config import (
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    INGEST_BATCH_CHUNKS,
+    INGEST_QUEUE_SIZE,
+    INGEST_EMBED_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+# listener(event, run_id) with event "started" or "finished"
+IngestListener = Callable[[str, str], None]
+# chunker(pieces, metadata) -> chunks carrying that metadata (incl. "source")
+Chunker = Callable[[Iterable, dict], Iterable[Chunk]]
+
+
+def _chunk_text(pieces: Iterable, metadata: dict) -> Iterable[Chunk]:
+    return chunk_stream(pieces, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, metadata)
+
+
+def _chunk_repo_file(pieces: Iterable, metadata: dict) -> Iterable[Chunk]:
+    text = "".join(pieces)
+    if metadata["language"] in PROSE_LANGUAGES:
+        return chunk_document(text, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, metadata)
+    return chunk_code(text, metadata["path"], metadata=metadata, language=metadata["language"])
+
 
 class IngestionPipeline:
+    """
+    extract -> chunk -> embed -> store, run as overlapping stages with
+    bounded queues in between (see ingestion.stages.StagedPipeline).
+
+    Listeners are told when a document starts and finishes writing to the
+    indexes, so readers can decide when new chunks become visible.
+    """
+
     def __init__(self):
-        self.store = ChromaStore()
+        self.store = get_vector_store()
+        self.bm25 = get_bm25_index()
+        self.bm25.backfill_from(self.store)
+        self.registry = get_document_registry()
+        self._listeners: List[IngestListener] = []
+
+    def subscribe(self, listener: IngestListener) -> None:
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: IngestListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event: str, run_id: str) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(event, run_id)
+            except Exception:
+                logger.exception("Ingest listener failed on %s", event)
+
+    def _run(
+        self,
+        documents: Iterable[Tuple[dict, Iterable]],
+        on_progress: Optional[Callable] = None,
+        chunker: Optional[Chunker] = None,
+    ) -> dict:
+        """
+        Chunk, embed and store document versions, given as (metadata with
+        "source", pieces) pairs; all of them share one set of stages, so
+        many small documents still fill embedding batches. Chunks whose
+        stable id is already indexed for their source are skipped before
+        embedding. Nothing is deleted here: chunks of the previous version
+        that no longer exist are listed under "stale" for `_commit` to
+        remove once the caller accepts the new version. If the run fails,
+        the chunks it already stored are deleted again.
+
+        Returns {"documents": {source: {"chunks_total", "chunks_stored",
+        "ids", "stored", "stale"}}, "metrics": ...}.
+        """
+        chunker = chunker or _chunk_text
+        per_source: Dict[str, dict] = {}
+        previous: Dict[str, set] = {}
+        lock = threading.Lock()
+
+        def chunk(stream):
+            def all_chunks():
+                for metadata, pieces in stream:
+                    source = metadata["source"]
+                    previous[source] = set(self.registry.chunk_ids(source))
+                    per_source[source] = {"chunks_total": 0, "chunks_stored": 0, "ids": [], "stored": []}
+                    yield from chunker(pieces, metadata)
+
+            for batch in batched(all_chunks(), INGEST_BATCH_CHUNKS):
+                fresh = []
+                for c in batch:
+                    source = c.metadata["source"]
+                    c.id = chunk_id(source, c.start, c.text)
+                    per_source[source]["ids"].append(c.id)
+                    if c.id not in previous[source]:
+                        fresh.append(c)
+                if fresh:
+                    yield fresh
+
+        def embed(chunks):
+            return chunks, embed_texts([c.text for c in chunks])
+
+        def store(batch):
+            chunks, embeddings = batch
+            texts = [c.text for c in chunks]
+            ids = [c.id for c in chunks]
+            metadatas = [{**c.metadata, "start": c.start, "end": c.end} for c in chunks]
+            self.store.upsert(ids, texts, embeddings, metadatas)
+            self.bm25.add(texts, ids)
+            with lock:
+                for c in chunks:
+                    result = per_source[c.metadata["source"]]
+                    result["chunks_stored"] += 1
+                    result["stored"].append(c.id)
 
-    def ingest_pdf(self, filepath: str):
-        text = extract_pdf(filepath)
-        chunks = chunk_text(text)
-        embeddings = embed_texts(chunks)
-        self.store.add(chunks, embeddings)
-        return len(chunks)
+        pipeline = StagedPipeline(
+            documents,
+            [
+                Stage("chunk", chunk, stream=True),
+                Stage("embed", embed, workers=INGEST_EMBED_WORKERS),
+                Stage("store", store),
+            ],
+            queue_size=INGEST_QUEUE_SIZE,
+            on_progress=on_progress,
+        )
+        try:
+            metrics = pipeline.run()
+        except BaseException:
+            self._discard(per_source.values())
+            raise
 
-    def ingest_url(self, url: str):
+        for source, result in per_source.items():
+            result["chunks_total"] = len(result["ids"])
+            result["stale"] = list(previous[source].difference(result["ids"]))
+
+        return {"documents": per_source, "metrics": metrics}
+
+    def _delete(self, ids: List[str]) -> None:
+        if ids:
+            self.store.delete(ids)
+            self.bm25.remove(ids)
+
+    def _discard(self, results: Iterable[dict]) -> None:
+        """Delete the chunks a run stored for versions that will not be registered."""
+        self._delete([cid for result in results for cid in result["stored"]])
+
+    def _commit(self, source: str, doc_hash: str, result: dict) -> int:
+        """Register a version produced by `_run`, then drop its predecessor's stale chunks."""
+        version = self.registry.put(source, doc_hash, result["ids"])
+        self._delete(result["stale"])
+        return version
+
+    @staticmethod
+    def _summary(result: dict) -> dict:
+        return {
+            "chunks_total": result["chunks_total"],
+            "chunks_stored": result["chunks_stored"],
+            "chunks_removed": len(result["stale"]),
+        }
+
+    def _ingest(self, source: str, doc_hash: str, pieces: Iterable, metadata: dict, on_progress) -> dict:
+        known = self.registry.get(source)
+        if known and known["content_hash"] == doc_hash:
+            return {
+                "source": source, "version": known["version"], "unchanged": True,
+                "chunks_total": len(self.registry.chunk_ids(source)), "chunks_stored": 0, "chunks_removed": 0,
+            }
+
+        run_id = uuid.uuid4().hex
+        self._notify("started", run_id)
+        try:
+            run = self._run([({**metadata, "source": source}, pieces)], on_progress)
+            result = run["documents"][source]
+            if not result["chunks_total"]:
+                # Keep the indexed version: an unreadable upload must not wipe it
+                self._discard([result])
+                raise ValueError(f"No extractable text in {source}")
+            version = self._commit(source, doc_hash, result)
+        finally:
+            self._notify("finished", run_id)
+        return {
+            "source": source, "version": version, "unchanged": False,
+            **self._summary(result), "metrics": run["metrics"],
+        }
+
+    def ingest_pdf(self, filepath: str, on_progress: Optional[Callable] = None, source: Optional[str] = None):
+        """
+        Pages are chunked, embedded and stored while later pages are still
+        being extracted. Pages that failed to extract are reported back
+        instead of being dropped silently.
+
+        `source` is the document's stable identity (e.g. the uploaded file
+        name); re-ingesting the same source replaces the previous version.
+        """
+        failed_pages = []
+
+        def pages():
+            for page in iter_pdf_pages(filepath):
+                if page.error:
+                    failed_pages.append({"page": page.page, "error": page.error})
+                elif page.text:
+                    yield page.text, {"page": page.page}
+
+        result = self._ingest(
+            source or filepath, file_hash(filepath), pages(), {"source_type": "pdf", "path": filepath}, on_progress
+        )
+        return {**result, "failed_pages": failed_pages}
+
+    def ingest_url(self, url: str, on_progress: Optional[Callable] = None):
         text = extract_url(url)
     
         if not text or not text.strip():
             raise ValueError(f"Could not extract readable text from URL: {url}")
     
-        chunks = chunk_text(text)
-        chunks = [c for c in chunks if c.strip()]   # remove empty chunks
-    
-        if not chunks:
-            raise ValueError("No valid chunks extracted from URL.")
-    
-        embeddings = embed_texts(chunks)
-        self.store.add(chunks, embeddings)
-    
-        return len(chunks)
+        return self._ingest(url, content_hash(text), [text], {"source_type": "url"}, on_progress)
+
+    def ingest_repo(
+        self,
+        location: str,
+        on_progress: Optional[Callable] = None,
+        ref: str = "HEAD",
+        name: Optional[str] = None,
+    ) -> dict:
+        """
+        Index the source files of a git repository (a local clone, or a URL
+        cloned under REPO_DIR) at `ref`. Each file is its own document,
+        "repo:<name>/<path>", versioned by its git blob hash: files whose
+        blob is already indexed are skipped without being read, files gone
+        from the tree are removed, and the changed ones go through a single
+        chunk/embed/store run. Code is chunked by symbol (code_chunker).
+        """
+        repo = open_repo(location)
+        name = name or repo_name(location)
+        prefix = f"repo:{name}/"
+        indexed = self.registry.hashes(prefix)
+
+        changed, seen = [], set()
+        for f in iter_repo_files(repo, ref):
+            source = prefix + f.path
+            seen.add(source)
+            if indexed.get(source) != f.blob_sha:
+                changed.append((source, f))
+
+        def documents():
+            for source, f in changed:
+                yield {
+                    "source": source,
+                    "source_type": "code",
+                    "repo": name,
+                    "path": f.path,
+                    "language": f.language,
+                    "blob": f.blob_sha,
+                }, [f.read()]
+
+        removed_files = [s for s in indexed if s not in seen]
+        run_id = uuid.uuid4().hex
+        self._notify("started", run_id)
+        try:
+            run = self._run(documents(), on_progress, chunker=_chunk_repo_file)
+            for source, f in changed:
+                self._commit(source, f.blob_sha, run["documents"][source])
+            stale = []
+            for source in removed_files:
+                stale.extend(self.registry.remove(source))
+            self._delete(stale)
+        finally:
+            self._notify("finished", run_id)
 
+        results = [self._summary(r) for r in run["documents"].values()]
+        return {
+            "source": prefix,
+            "commit": head_commit(repo, ref),
+            "files_total": len(seen),
+            "files_changed": len(changed),
+            "files_removed": len(removed_files),
+            "chunks_stored": sum(r["chunks_stored"] for r in results),
+            "chunks_removed": sum(r["chunks_removed"] for r in results) + len(stale),
+            "metrics": run["metrics"],
+        }
@@ -0,0 +1,259 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from tracing import count, observe
+
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a StagedPipeline.
+
+    - map stages (default): `fn(item) -> result` runs on `workers` threads;
+      returning None drops the item.
+    - stream stages (`stream=True`): `fn(iterator) -> iterator` runs on a
+      single thread, for stateful steps such as windowed chunking.
+    """
+
+    def __init__(self, name: str, fn: Callable, workers: int = 1, stream: bool = False):
+        if stream and workers != 1:
+            raise ValueError("Stream stages run on exactly one worker.")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.stream = stream
+
+
+class StageMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.items_out = 0
+        self.busy_seconds = 0.0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, busy: float, items: int = 1) -> None:
+        with self._lock:
+            self.busy_seconds += busy
+            self.items_out += items
+
+    def as_dict(self) -> Dict[str, float]:
+        wall = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        return {
+            "items": self.items_out,
+            "busy_s": round(self.busy_seconds, 4),
+            "wall_s": round(wall, 4),
+            "items_per_s": round(self.items_out / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+        }
+
+
+class PipelineCancelled(Exception):
+    pass
+
+
+class StagedPipeline:
+    """
+    Runs a source iterator through stages connected by bounded queues.
+
+    Every stage runs on its own thread(s), so extraction, chunking,
+    embedding and storage overlap; a full queue blocks the upstream stage
+    (backpressure), so at most `queue_size` items wait between any two
+    stages regardless of document size. The first exception in any stage
+    cancels the others and is re-raised from `run()`.
+    """
+
+    def __init__(
+        self,
+        source: Iterable,
+        stages: List[Stage],
+        queue_size: int = 4,
+        source_name: str = "extract",
+        on_progress: Optional[Callable[[Dict[str, Dict[str, float]]], None]] = None,
+    ):
+        self.source = source
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_progress = on_progress
+        self.metrics: Dict[str, StageMetrics] = {source_name: StageMetrics(source_name)}
+        self.metrics.update({s.name: StageMetrics(s.name) for s in stages})
+        self._source_name = source_name
+        self._cancel = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._error_lock = threading.Lock()
+
+    # --------------------------
+    # Queue helpers (cancellation-aware)
+    # --------------------------
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        while True:
+            if self._cancel.is_set():
+                raise PipelineCancelled()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: queue.Queue) -> Any:
+        while True:
+            if self._cancel.is_set():
+                raise PipelineCancelled()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _fail(self, exc: BaseException) -> None:
+        with self._error_lock:
+            if self._error is None:
+                self._error = exc
+        self._cancel.set()
+
+    def _progress(self) -> None:
+        if self.on_progress:
+            self.on_progress(self.snapshot())
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {name: m.as_dict() for name, m in self.metrics.items()}
+
+    # --------------------------
+    # Workers
+    # --------------------------
+    def _run_source(self, out_q: queue.Queue) -> None:
+        metrics = self.metrics[self._source_name]
+        metrics.started = time.perf_counter()
+        try:
+            iterator = iter(self.source)
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                metrics.record(time.perf_counter() - t0)
+                self._put(out_q, item)
+            self._put(out_q, _DONE)
+        except PipelineCancelled:
+            pass
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            metrics.finished = time.perf_counter()
+
+    def _run_stream(self, stage: Stage, in_q: queue.Queue, out_q: queue.Queue) -> None:
+        metrics = self.metrics[stage.name]
+        metrics.started = time.perf_counter()
+        waited = [0.0]
+
+        def inputs() -> Iterator:
+            while True:
+                t0 = time.perf_counter()
+                item = self._get(in_q)
+                waited[0] += time.perf_counter() - t0
+                if item is _DONE:
+                    return
+                yield item
+
+        try:
+            iterator = iter(stage.fn(inputs()))
+            while True:
+                t0 = time.perf_counter()
+                waited[0] = 0.0
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                # Only count time spent in the stage itself, not waiting upstream
+                metrics.record(time.perf_counter() - t0 - waited[0])
+                self._put(out_q, item)
+                self._progress()
+            self._put(out_q, _DONE)
+        except PipelineCancelled:
+            pass
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            metrics.finished = time.perf_counter()
+
+    def _run_map(self, stage: Stage, in_q: queue.Queue, out_q: Optional[queue.Queue], remaining: List[int], lock: threading.Lock) -> None:
+        metrics = self.metrics[stage.name]
+        if metrics.started is None:
+            metrics.started = time.perf_counter()
+        try:
+            while True:
+                item = self._get(in_q)
+                if item is _DONE:
+                    # Let sibling workers see the end of input too
+                    self._put(in_q, _DONE)
+                    break
+                t0 = time.perf_counter()
+                result = stage.fn(item)
+                metrics.record(time.perf_counter() - t0)
+                if result is not None and out_q is not None:
+                    self._put(out_q, result)
+                self._progress()
+
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                metrics.finished = time.perf_counter()
+                if out_q is not None:
+                    self._put(out_q, _DONE)
+        except PipelineCancelled:
+            pass
+        except BaseException as e:
+            self._fail(e)
+
+    # --------------------------
+    # Entry point
+    # --------------------------
+    def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = [threading.Thread(target=self._run_source, args=(queues[0],), daemon=True)]
+
+        for i, stage in enumerate(self.stages):
+            in_q = queues[i]
+            out_q = queues[i + 1] if i + 1 < len(queues) else None
+            if stage.stream:
+                if out_q is None:
+                    raise ValueError("The last stage must be a map stage.")
+                threads.append(threading.Thread(target=self._run_stream, args=(stage, in_q, out_q), daemon=True))
+            else:
+                remaining, lock = [stage.workers], threading.Lock()
+                threads.extend(
+                    threading.Thread(target=self._run_map, args=(stage, in_q, out_q, remaining, lock), daemon=True)
+                    for _ in range(stage.workers)
+                )
+
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        wall = time.perf_counter() - start
+        for name, m in self.metrics.items():
+            count("ingest_stage_items_total", m.items_out, stage=name)
+            count("ingest_stage_busy_seconds_total", m.busy_seconds, stage=name)
+        observe("ingest_run_seconds", wall, status="failed" if self._error is not None else "ok")
+
+        if self._error is not None:
+            raise self._error
+
+        return {"wall_s": round(wall, 4), "stages": self.snapshot()}
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
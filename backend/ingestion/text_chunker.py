@@ -1,14 +1,149 @@
-def chunk_text(text, max_tokens=300, overlap=50):
-    words = text.split()
-    chunks = []
-    start = 0
-    end = max_tokens
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from config import EMBEDDING_MODEL
+from ingestion.tokens import token_starts
+
+# Boundary kinds, strongest first. A chunk prefers to end on the strongest
+# boundary that still leaves it at least half full.
+_BOUNDARY_PATTERNS = [
+    re.compile(r"\n(?=#{1,6} )|\n(?=[A-Z][^\n]{0,80}\n\s*\n)"),  # before a heading
+    re.compile(r"\n[ \t]*\n"),                                     # paragraph break
+    re.compile(r"(?<=[.!?])[\"')\]]?\s+"),                         # sentence end
+    re.compile(r"\n"),                                             # line break
+]
+
+
+@dataclass
+class Chunk:
+    text: str
+    start: int  # character offsets into the source document
+    end: int
+    n_tokens: int
+    metadata: dict = field(default_factory=dict)
+    id: str = ""  # assigned by the ingestion pipeline
+
+
+def _boundary_tokens(text: str, starts: np.ndarray) -> List[np.ndarray]:
+    """Token indices at which a chunk may end, one sorted array per boundary kind."""
+    return [
+        np.unique(np.searchsorted(starts, [m.end() for m in pattern.finditer(text)]))
+        for pattern in _BOUNDARY_PATTERNS
+    ]
+
+
+def _best_end(boundaries: List[np.ndarray], lo: int, hi: int) -> int:
+    """Latest boundary in (lo, hi] of the strongest kind that has one; else hi."""
+    for arr in boundaries:
+        i = np.searchsorted(arr, hi, side="right") - 1
+        if i >= 0 and arr[i] > lo:
+            return int(arr[i])
+    return hi
 
-    while start < len(words):
-        chunk = words[start:end]
-        chunks.append(" ".join(chunk))
 
-        start = end - overlap
-        end = start + max_tokens
+def _windows(starts: np.ndarray, boundaries: List[np.ndarray], max_tokens: int, overlap: int) -> Iterator[Tuple[int, int]]:
+    """Yield (first_token, end_token) windows over the token offset array."""
+    n = len(starts)
+    begin = 0
+    while begin < n:
+        limit = begin + max_tokens
+        if limit >= n:
+            yield begin, n
+            return
+        end = _best_end(boundaries, begin + max_tokens // 2, limit)
+        yield begin, end
+        # Overlap backwards from the end, but start on a paragraph or
+        # sentence if one falls inside the overlap region
+        nxt = max(end - overlap, begin + 1)
+        for arr in boundaries[1:3]:
+            i = np.searchsorted(arr, nxt)
+            if i < len(arr) and arr[i] < end:
+                nxt = int(arr[i])
+                break
+        begin = nxt
 
+
+def chunk_document(
+    text: str,
+    max_tokens: int = 300,
+    overlap: int = 50,
+    metadata: Optional[dict] = None,
+    offset: int = 0,
+    model: str = EMBEDDING_MODEL,
+) -> List[Chunk]:
+    """
+    Split text into chunks of at most `max_tokens` tokenizer tokens,
+    preferring heading, paragraph and sentence boundaries. Windows are
+    computed over the token offset array; the only string copies made are
+    the final chunk slices.
+    """
+    starts = token_starts(text, model)
+    if not len(starts):
+        return []
+    boundaries = _boundary_tokens(text, starts)
+
+    chunks = []
+    for first, last in _windows(starts, boundaries, max_tokens, overlap):
+        char_start = int(starts[first])
+        char_end = int(starts[last]) if last < len(starts) else len(text)
+        piece = text[char_start:char_end].rstrip()
+        if piece:
+            chunks.append(Chunk(
+                text=piece,
+                start=offset + char_start,
+                end=offset + char_start + len(piece),
+                n_tokens=last - first,
+                metadata=dict(metadata or {}),
+            ))
     return chunks
+
+
+def chunk_text(text, max_tokens=300, overlap=50):
+    return [c.text for c in chunk_document(text, max_tokens, overlap)]
+
+
+def chunk_stream(
+    pieces: Iterable[Union[str, Tuple[str, dict]]],
+    max_tokens: int = 300,
+    overlap: int = 50,
+    metadata: Optional[dict] = None,
+) -> Iterator[Chunk]:
+    """
+    Streaming counterpart of chunk_document over text pieces (e.g. PDF
+    pages, optionally as (text, metadata) pairs). Only the text after the
+    last emitted chunk's continuation point is carried between pieces.
+    Each chunk inherits the metadata of the piece it starts in.
+    """
+    buffer = ""
+    buffer_offset = 0
+    piece_starts: List[Tuple[int, dict]] = []  # (document offset, piece metadata)
+    flush_chars = max_tokens * 4 * 8  # roughly 8 chunks' worth of text
+
+    def emit(final: bool) -> Iterator[Chunk]:
+        nonlocal buffer, buffer_offset
+        chunks = chunk_document(buffer, max_tokens, overlap, metadata, buffer_offset)
+        # The last chunk may still grow with the next piece; hold it back
+        ready = chunks if final else chunks[:-1]
+        for chunk in ready:
+            piece_meta = next((m for off, m in reversed(piece_starts) if off <= chunk.start), {})
+            chunk.metadata.update(piece_meta)
+            yield chunk
+        if not final and ready:
+            cut = chunks[-1].start - buffer_offset
+            buffer = buffer[cut:]
+            buffer_offset += cut
+            while len(piece_starts) > 1 and piece_starts[1][0] <= buffer_offset:
+                piece_starts.pop(0)
+
+    for piece in pieces:
+        text, piece_meta = (piece, {}) if isinstance(piece, str) else piece
+        piece_starts.append((buffer_offset + len(buffer), piece_meta))
+        buffer += text + "\n"
+        if len(buffer) >= flush_chars:
+            yield from emit(final=False)
+
+    if buffer.strip():
+        yield from emit(final=True)
@@ -0,0 +1,57 @@
+import re
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+
+# text-embedding-3-* and gpt-4o-mini era models; cl100k_base is close enough
+# for budgeting when the model-specific encoding isn't available
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = ""):
+    """Return a tiktoken encoding for the model, or None if tiktoken is unusable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception:
+        # Encoding files couldn't be loaded (e.g. offline); fall back to estimates
+        return None
+
+
+# Without tiktoken, a token is a word or a single punctuation mark. Counts
+# and token_starts both use it, so chunk sizes and budgets agree.
+_FALLBACK_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def _fallback_count(text: str) -> int:
+    return sum(1 for _ in _FALLBACK_TOKEN_RE.finditer(text))
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    enc = get_encoding(model)
+    if enc is None:
+        return _fallback_count(text)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def count_tokens_many(texts: List[str], model: str = "") -> List[int]:
+    enc = get_encoding(model)
+    if enc is None:
+        return [_fallback_count(t) for t in texts]
+    return [len(ids) for ids in enc.encode_batch(texts, disallowed_special=())]
+
+
+def token_starts(text: str, model: str = "") -> np.ndarray:
+    """Character offset at which each token of `text` begins (int64 array)."""
+    enc = get_encoding(model)
+    if enc is None:
+        return np.fromiter((m.start() for m in _FALLBACK_TOKEN_RE.finditer(text)), dtype=np.int64)
+    _, offsets = enc.decode_with_offsets(enc.encode(text, disallowed_special=()))
+    return np.asarray(offsets, dtype=np.int64)
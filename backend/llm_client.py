@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+import weakref
+from typing import AsyncIterator, Awaitable, List, Optional, TypeVar
+
+import httpx
+from openai import AsyncOpenAI
+
+from tracing import count, span
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    LLM_MODEL,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONNECTIONS,
+    LLM_TIMEOUT_S,
+    LLM_CONNECT_TIMEOUT_S,
+    LLM_MAX_RETRIES,
+)
+
+
+T = TypeVar("T")
+
+
+class LLMClient:
+    """
+    Shared async chat-completions client.
+
+    One pooled HTTP client keeps connections alive across requests, a
+    semaphore caps the number of calls in flight (the rest wait instead of
+    piling onto the API), and the SDK retries 429/5xx/timeouts with backoff
+    that honours Retry-After.
+
+    Every HTTP response is counted by status (retries show up as 429/5xx),
+    and token usage by model; calls are traced as "llm.chat"/"llm.stream".
+    """
+
+    def __init__(
+        self,
+        model: str = LLM_MODEL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        timeout_s: float = LLM_TIMEOUT_S,
+        connect_timeout_s: float = LLM_CONNECT_TIMEOUT_S,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.model = model
+        timeout = httpx.Timeout(timeout_s, connect=connect_timeout_s)
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            event_hooks={"response": [self._on_response]},
+        )
+        self.client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            http_client=self._http,
+            timeout=timeout,
+            max_retries=max_retries,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @staticmethod
+    async def _on_response(response: httpx.Response) -> None:
+        count("llm_http_responses_total", status=response.status_code)
+
+    async def chat(self, messages: List[dict], model: Optional[str] = None, **kwargs) -> str:
+        """Run one chat completion and return the message text."""
+        model = model or self.model
+        with span("llm.chat", model=model) as s:
+            async with self._semaphore:
+                s.set(queued_ms=round(1000 * (time.perf_counter() - s.begin), 3))
+                response = await self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+            usage = response.usage
+            if usage is not None:
+                count("llm_tokens_total", usage.prompt_tokens, model=model, kind="prompt")
+                count("llm_tokens_total", usage.completion_tokens, model=model, kind="completion")
+                s.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        return response.choices[0].message.content or ""
+
+    async def stream_chat(self, messages: List[dict], model: Optional[str] = None, **kwargs) -> AsyncIterator[str]:
+        """Yield the completion's text deltas as they arrive."""
+        model = model or self.model
+        with span("llm.stream", model=model) as s:
+            async with self._semaphore:
+                stream = await self.client.chat.completions.create(
+                    model=model, messages=messages, stream=True, **kwargs
+                )
+                chunks = 0
+                try:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if not chunks:
+                                s.set(first_token_ms=round(1000 * (time.perf_counter() - s.begin), 3))
+                            chunks += 1
+                            yield chunk.choices[0].delta.content
+                finally:
+                    # Closing early (client went away) releases the connection
+                    await stream.close()
+                    # Streamed responses carry no usage; one delta is about one token
+                    count("llm_tokens_total", chunks, model=model, kind="completion_streamed")
+                    s.set(chunks=chunks)
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+# Connections belong to the event loop that opened them, so each loop gets
+# its own client (normally there is exactly one: the server's).
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMClient]" = weakref.WeakKeyDictionary()
+
+
+def get_llm_client() -> LLMClient:
+    """The shared client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = LLMClient()
+    return client
+
+
+async def close_llm_client() -> None:
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+# Sync callers (worker threads) share one background loop, and so one pooled client
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """
+    Run a coroutine that uses get_llm_client() from synchronous code and
+    wait for its result. The caller's context variables (e.g. the current
+    trace) carry over. Not for use from inside an event loop.
+    """
+    global _sync_loop
+    if _sync_loop is None:
+        with _sync_loop_lock:
+            if _sync_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-sync", daemon=True).start()
+                _sync_loop = loop
+    return asyncio.run_coroutine_threadsafe(coro, _sync_loop).result()
@@ -0,0 +1,385 @@
+import bisect
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse
+
+from config import CODE_INDEX_PATH, CODE_INDEX_REFRESH_S, CODE_INDEX_MAX_FILE_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Directories never worth indexing, at any depth (VCS metadata, dependencies, caches)
+SKIP_DIRS = frozenset({
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".tox", ".nox",
+    ".mypy_cache", ".pytest_cache", ".ruff_cache",
+})
+# Build output and data, skipped only at the repository root: deeper down these
+# names are as likely to be real packages (e.g. `myapp/data/`, `tools/build/`)
+ROOT_SKIP_DIRS = frozenset({"dist", "build", "target", "data"})
+
+# Changed files read and applied per locked write, so searches wait at most one batch
+_BATCH_FILES = 64
+
+_DEFINITION = r"^\s*(?:async\s+def|def|class|function|func|fn|const|let|var|type|interface|struct|enum)\s+{0}\b|^\s*{0}\s*="
+
+
+def glob_to_regex(pattern: str) -> re.Pattern:
+    """Compile a path glob: `**/` spans any number of directories, `*` and `?` stay within one."""
+    out, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile("".join(out) + r"\Z")
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def required_literals(pattern: str, flags: int = 0) -> List[str]:
+    """
+    Literal strings every match of `pattern` must contain, for trigram
+    filtering. Alternations, classes and optional parts end a run; an
+    empty list means the pattern cannot be narrowed down (scan everything).
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return []
+
+    literals: List[str] = []
+
+    def walk(items) -> None:
+        run: List[str] = []
+        for op, arg in items:
+            if op is sre_parse.LITERAL:
+                run.append(chr(arg))
+                continue
+            literals.append("".join(run))
+            run = []
+            if op is sre_parse.SUBPATTERN:
+                walk(arg[-1])
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and arg[0] >= 1:
+                walk(arg[2])  # the repeated body occurs at least once
+        literals.append("".join(run))
+
+    walk(parsed)
+    return [lit for lit in literals if len(lit) >= 3]
+
+
+class CodeIndex:
+    """
+    Persistent trigram index over the text files of a repository.
+
+    Each file's content and the set of (lowercased) trigrams it contains
+    are kept in SQLite. A search looks up the files containing every
+    trigram of the literals the query requires, then runs the real regex
+    over just those files, so its cost depends on the number of candidate
+    files rather than the size of the repository.
+
+    refresh() re-stats the tree and re-reads only files whose size or
+    mtime changed (and re-indexes only those whose content hash changed).
+    Files are read and split into trigrams outside the lock and written in
+    small batches, so searches are not held up by a large refresh.
+    Searches trigger it in the background once the index is older than
+    `refresh_s`, or synchronously after mark_stale().
+    """
+
+    SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT,
+    content TEXT          -- NULL for binary or oversized files (listed, not searched)
+);
+CREATE TABLE IF NOT EXISTS trigrams (
+    tri TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (tri, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS trigrams_file ON trigrams (file_id);
+"""
+
+    def __init__(
+        self,
+        root: Path,
+        path: str = CODE_INDEX_PATH,
+        refresh_s: float = CODE_INDEX_REFRESH_S,
+        max_file_bytes: int = CODE_INDEX_MAX_FILE_BYTES,
+    ):
+        self.root = Path(root).resolve()
+        self.refresh_s = refresh_s
+        self.max_file_bytes = max_file_bytes
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at = float("-inf")
+        self._stale = True
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    # --------------------------
+    # Indexing
+    # --------------------------
+    def _walk(self) -> Iterable[Tuple[str, os.stat_result]]:
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            at_root = dirpath == str(self.root)
+            dirnames[:] = [
+                d for d in dirnames
+                if d not in SKIP_DIRS
+                and not (at_root and d in ROOT_SKIP_DIRS)
+                and not d.endswith(".egg-info")
+            ]
+            for name in filenames:
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                yield os.path.relpath(full, self.root).replace(os.sep, "/"), st
+
+    def _read(self, rel: str, size: int) -> Tuple[Optional[str], Optional[str]]:
+        """(content hash, decoded text or None if binary/oversized)."""
+        try:
+            data = (self.root / rel).read_bytes()
+        except OSError:
+            return None, None
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if size > self.max_file_bytes or b"\0" in data[:8192]:
+            return digest, None
+        return digest, data.decode("utf-8", errors="ignore")
+
+    def refresh(self) -> Dict[str, int]:
+        """Bring the index in line with the working tree; returns change counts."""
+        with self._refresh_lock:
+            started = time.monotonic()
+            with self._lock:
+                known = {
+                    path: (file_id, mtime_ns, size, digest)
+                    for file_id, path, mtime_ns, size, digest in self._conn.execute(
+                        "SELECT file_id, path, mtime_ns, size, hash FROM files"
+                    )
+                }
+
+            changed: List[Tuple[str, os.stat_result]] = []
+            seen = set()
+            for rel, st in self._walk():
+                seen.add(rel)
+                row = known.get(rel)
+                if row is None or row[1] != st.st_mtime_ns or row[2] != st.st_size:
+                    changed.append((rel, st))
+
+            counts = {"added": 0, "updated": 0, "touched": 0, "removed": 0}
+            for i in range(0, len(changed), _BATCH_FILES):
+                # Read, hash and split into trigrams without the lock; searches keep running
+                batch = []
+                for rel, st in changed[i:i + _BATCH_FILES]:
+                    digest, content = self._read(rel, st.st_size)
+                    row = known.get(rel)
+                    unchanged = row is not None and row[3] == digest
+                    grams = _trigrams(content.lower()) if content and not unchanged else ()
+                    batch.append((rel, st, row, digest, content, unchanged, grams))
+                with self._lock, self._conn:
+                    self._apply(batch, counts)
+
+            removed = [known[rel][0] for rel in known.keys() - seen]
+            for i in range(0, len(removed), _BATCH_FILES):
+                with self._lock, self._conn:
+                    for file_id in removed[i:i + _BATCH_FILES]:
+                        self._conn.execute("DELETE FROM trigrams WHERE file_id = ?", (file_id,))
+                        self._conn.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+                        counts["removed"] += 1
+
+            self._refreshed_at = time.monotonic()
+            self._stale = False
+            if any(counts.values()):
+                logger.info("Code index refreshed in %.0fms: %s", 1000 * (time.monotonic() - started), counts)
+            return counts
+
+    def _apply(self, batch: List[tuple], counts: Dict[str, int]) -> None:
+        """Write one batch of files read by refresh(); caller holds the lock and transaction."""
+        for rel, st, row, digest, content, unchanged, grams in batch:
+            if unchanged:
+                # Same bytes, new mtime (checkout, touch): nothing to re-index
+                self._conn.execute(
+                    "UPDATE files SET mtime_ns = ?, size = ? WHERE file_id = ?",
+                    (st.st_mtime_ns, st.st_size, row[0]),
+                )
+                counts["touched"] += 1
+                continue
+            if row is not None:
+                self._conn.execute("DELETE FROM trigrams WHERE file_id = ?", (row[0],))
+                self._conn.execute(
+                    "UPDATE files SET mtime_ns = ?, size = ?, hash = ?, content = ? WHERE file_id = ?",
+                    (st.st_mtime_ns, st.st_size, digest, content, row[0]),
+                )
+                file_id = row[0]
+                counts["updated"] += 1
+            else:
+                file_id = self._conn.execute(
+                    "INSERT INTO files (path, mtime_ns, size, hash, content) VALUES (?, ?, ?, ?, ?)",
+                    (rel, st.st_mtime_ns, st.st_size, digest, content),
+                ).lastrowid
+                counts["added"] += 1
+            if grams:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO trigrams (tri, file_id) VALUES (?, ?)",
+                    ((tri, file_id) for tri in grams),
+                )
+
+    def mark_stale(self) -> None:
+        """Force a synchronous refresh before the next query (e.g. after a patch)."""
+        self._stale = True
+
+    def _ensure_fresh(self) -> None:
+        if self._stale:
+            self.refresh()
+        elif time.monotonic() - self._refreshed_at > self.refresh_s and not self._refresh_lock.locked():
+            # Serve from the current index while the tree is re-checked
+            threading.Thread(target=self._refresh_quietly, daemon=True).start()
+
+    def _refresh_quietly(self) -> None:
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Code index refresh failed")
+
+    # --------------------------
+    # Queries
+    # --------------------------
+    def list_files(self, glob_pattern: str = "**/*.py") -> List[str]:
+        self._ensure_fresh()
+        matcher = glob_to_regex(glob_pattern)
+        with self._lock:
+            paths = [row[0] for row in self._conn.execute("SELECT path FROM files ORDER BY path")]
+        return [p for p in paths if matcher.match(p)]
+
+    def _candidates(self, literals: List[str]) -> List[Tuple[str, str]]:
+        """(path, content) of searchable files containing every trigram of `literals`."""
+        grams = sorted(set().union(*(_trigrams(lit.lower()) for lit in literals))) if literals else []
+        with self._lock:
+            if not grams:
+                return self._conn.execute(
+                    "SELECT path, content FROM files WHERE content IS NOT NULL"
+                ).fetchall()
+            marks = ",".join("?" * len(grams))
+            return self._conn.execute(
+                f"SELECT path, content FROM files WHERE file_id IN ("
+                f"SELECT file_id FROM trigrams WHERE tri IN ({marks}) "
+                f"GROUP BY file_id HAVING COUNT(*) = ?)",
+                (*grams, len(grams)),
+            ).fetchall()
+
+    def search(
+        self,
+        query: str,
+        glob_pattern: str = "**/*.py",
+        max_hits: int = 20,
+        regex: bool = False,
+        whole_word: bool = False,
+        case_sensitive: bool = True,
+        context_lines: int = 2,
+    ) -> List[Dict]:
+        """
+        Matching lines as {path, line_no, line, before, after, score}, best
+        first. Definitions of the searched name rank above other matches,
+        then files whose path mentions it, then files with more matches.
+        """
+        if not query:
+            return []
+        self._ensure_fresh()
+
+        flags = 0 if case_sensitive else re.IGNORECASE
+        pattern = query if regex else re.escape(query)
+        if whole_word:
+            pattern = rf"\b(?:{pattern})\b"
+        compiled = re.compile(pattern, flags | re.MULTILINE)
+        literals = required_literals(pattern, flags) if regex else [query]
+        definition = (
+            re.compile(_DEFINITION.format(re.escape(query)), flags | re.MULTILINE)
+            if not regex and re.fullmatch(r"[\w.]+", query) else None
+        )
+        in_path = query.lower().rsplit(".", 1)[-1] if not regex else None
+        matcher = glob_to_regex(glob_pattern)
+
+        hits: List[Dict] = []
+        for path, content in self._candidates(literals):
+            if not matcher.match(path):
+                continue
+            matches = list(compiled.finditer(content))
+            if not matches:
+                continue
+            line_starts = [0] + [m.end() for m in re.finditer("\n", content)]
+            lines = content.split("\n")
+            file_score = min(len(matches), 10) / 10 + (1.0 if in_path and in_path in path.lower() else 0.0)
+            seen_lines = set()
+            for m in matches:
+                line_no = bisect.bisect_right(line_starts, m.start())
+                if line_no in seen_lines:
+                    continue
+                seen_lines.add(line_no)
+                line = lines[line_no - 1]
+                score = file_score + (2.0 if definition is not None and definition.search(line) else 0.0)
+                hits.append({
+                    "path": path,
+                    "line_no": line_no,
+                    "line": line,
+                    "before": lines[max(0, line_no - 1 - context_lines):line_no - 1],
+                    "after": lines[line_no:line_no + context_lines],
+                    "score": round(score, 3),
+                })
+
+        hits.sort(key=lambda h: (-h["score"], h["path"], h["line_no"]))
+        return hits[:max_hits]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            files, searchable = self._conn.execute(
+                "SELECT COUNT(*), COUNT(content) FROM files"
+            ).fetchone()
+            trigrams = self._conn.execute("SELECT COUNT(*) FROM trigrams").fetchone()[0]
+        return {"files": files, "searchable_files": searchable, "trigram_postings": trigrams}
+
+
+# --------------------------
+# Process-wide shared instance
+# --------------------------
+_indexes: Dict[Path, CodeIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_code_index(root: Path) -> CodeIndex:
+    root = Path(root).resolve()
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = CodeIndex(root)
+        return _indexes[root]
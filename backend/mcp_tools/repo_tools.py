@@ -2,6 +2,8 @@ import subprocess
 from pathlib import Path
 from typing import List, Dict
 
+from mcp_tools.code_index import get_code_index
+
 # Adjust if your repo layout changes
 REPO_ROOT = Path(__file__).resolve().parents[2]
 
@@ -29,37 +31,33 @@ def read_file(rel_path: str) -> str:
 def list_files(glob_pattern: str = "**/*.py") -> List[str]:
     """
     List files matching a glob pattern, relative to repository root.
-    Default: all Python files.
+    Default: all Python files. Served from the code index, not a tree walk.
     """
-    paths = REPO_ROOT.glob(glob_pattern)
-    return [p.relative_to(REPO_ROOT).as_posix() for p in paths if p.is_file()]
+    return get_code_index(REPO_ROOT).list_files(glob_pattern)
 
 
-def search_code(query: str, glob_pattern: str = "**/*.py", max_hits: int = 20) -> List[Dict]:
+def search_code(
+    query: str,
+    glob_pattern: str = "**/*.py",
+    max_hits: int = 20,
+    regex: bool = False,
+    whole_word: bool = False,
+    case_sensitive: bool = True,
+    context_lines: int = 2,
+) -> List[Dict]:
     """
-    Very simple code search: grep for query in matching files.
-    Returns a list of {path, line_no, line}.
+    Search the repository through the trigram code index.
+    Returns a ranked list of {path, line_no, line, before, after, score}.
     """
-    hits: List[Dict] = []
-    for rel in list_files(glob_pattern):
-        path = _safe_join(rel)
-        try:
-            with path.open("r", encoding="utf-8", errors="ignore") as f:
-                for i, line in enumerate(f, start=1):
-                    if query in line:
-                        hits.append(
-                            {
-                                "path": rel,
-                                "line_no": i,
-                                "line": line.rstrip("\n"),
-                            }
-                        )
-                        if len(hits) >= max_hits:
-                            return hits
-        except Exception:
-            # Ignore unreadable files
-            continue
-    return hits
+    return get_code_index(REPO_ROOT).search(
+        query,
+        glob_pattern=glob_pattern,
+        max_hits=max_hits,
+        regex=regex,
+        whole_word=whole_word,
+        case_sensitive=case_sensitive,
+        context_lines=context_lines,
+    )
 
 
 def apply_patch(patch_text: str) -> Dict[str, str]:
@@ -76,6 +74,7 @@ def apply_patch(patch_text: str) -> Dict[str, str]:
         text=True,
     )
     out, err = process.communicate(input=patch_text)
+    get_code_index(REPO_ROOT).mark_stale()
     return {"stdout": out, "stderr": err, "returncode": str(process.returncode)}
 
 
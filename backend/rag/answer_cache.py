@@ -0,0 +1,271 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from tracing import count
+from config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_MAX_ITEMS,
+    ANSWER_CACHE_TTL_S,
+    ANSWER_CACHE_SEMANTIC,
+    ANSWER_CACHE_SIMILARITY,
+)
+
+_TRAILING_PUNCT = re.compile(r"[\s?!.]+$")
+
+
+def normalize_query(query: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a question."""
+    return _TRAILING_PUNCT.sub("", " ".join(query.lower().split()))
+
+
+@dataclass
+class _Entry:
+    value: Any
+    group: str
+    row: int
+    generation: int
+    expires_at: float
+    cost_ms: float
+    hits: int = 0
+
+
+@dataclass
+class CacheLookup:
+    """Result of AnswerCache.lookup(); pass it back to put() on a miss."""
+
+    group: str
+    key: str
+    generation: int
+    value: Any = None
+    tier: Optional[str] = None  # "exact" | "semantic" on a hit
+    similarity: float = 0.0
+    vector: Optional[np.ndarray] = None
+    query: str = ""
+
+    @property
+    def hit(self) -> bool:
+        return self.tier is not None
+
+
+class AnswerCache:
+    """
+    Two-tier cache of final answers.
+
+    Tier 1 matches the normalized question exactly. Tier 2 compares the
+    question's embedding with those of cached questions and accepts the
+    best match above `similarity`. Both tiers are scoped to a group (the
+    endpoint plus any parameters that change the answer, such as a
+    metadata filter).
+
+    Entries expire after `ttl_s`, the least recently used entry is evicted
+    once `max_items` is reached, and every entry is tied to the retrieval
+    generation it was computed against: after an ingest changes the
+    corpus, older answers are dropped on the next lookup.
+    """
+
+    def __init__(
+        self,
+        max_items: int = ANSWER_CACHE_MAX_ITEMS,
+        ttl_s: float = ANSWER_CACHE_TTL_S,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+        semantic: bool = ANSWER_CACHE_SEMANTIC,
+        embed: Optional[Callable[[List[str]], List[Sequence[float]]]] = None,
+    ):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self.similarity = similarity
+        self.semantic = semantic
+        self._embed = embed
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._generation = 0
+
+        # Tier 2: one row per entry, reused through a free list
+        self._vectors: Optional[np.ndarray] = None
+        self._row_keys: List[Optional[tuple]] = [None] * max_items
+        self._free_rows = list(range(max_items - 1, -1, -1))
+
+        self.stats: Dict[str, float] = {
+            "exact_hits": 0, "semantic_hits": 0, "misses": 0,
+            "evictions": 0, "expired": 0, "invalidated": 0, "saved_ms": 0.0,
+        }
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        if self._embed is None:
+            from ingestion.embedder import embed_texts
+
+            self._embed = embed_texts
+        vector = np.asarray(self._embed([query])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # --------------------------
+    # Bookkeeping
+    # --------------------------
+    def _group_rows(self, group: str) -> List[int]:
+        return [r for r, k in enumerate(self._row_keys) if k is not None and k[0] == group]
+
+    def _drop(self, key: tuple, reason: Optional[str]) -> None:
+        entry = self._entries.pop(key)
+        if entry.row >= 0:
+            self._row_keys[entry.row] = None
+            self._free_rows.append(entry.row)
+        if reason:
+            self.stats[reason] += 1
+
+    def _advance(self, generation: int) -> None:
+        """Drop every answer computed against an older corpus."""
+        if generation > self._generation:
+            for key in [k for k, e in self._entries.items() if e.generation < generation]:
+                self._drop(key, "invalidated")
+            self._generation = generation
+
+    def _live(self, key: tuple, generation: int) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._drop(key, "expired")
+            return None
+        if entry.generation != generation:
+            self._drop(key, "invalidated")
+            return None
+        return entry
+
+    def _hit(self, key: tuple, entry: _Entry, lookup: CacheLookup, tier: str) -> CacheLookup:
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self.stats[f"{tier}_hits"] += 1
+        count("answer_cache_lookups_total", namespace=lookup.group.split(":", 1)[0], result=tier)
+        self.stats["saved_ms"] += entry.cost_ms
+        lookup.value, lookup.tier = entry.value, tier
+        return lookup
+
+    # --------------------------
+    # Public API
+    # --------------------------
+    def lookup(self, namespace: str, query: str, generation: int, params: Optional[dict] = None) -> CacheLookup:
+        """
+        Exact match first, then (if enabled) nearest cached question by
+        embedding. Blocking: the semantic tier embeds the query.
+        """
+        group = f"{namespace}:{json.dumps(params or {}, sort_keys=True, default=str)}"
+        lookup = CacheLookup(group=group, key=normalize_query(query), generation=generation, query=query)
+
+        with self._lock:
+            self._advance(generation)
+            entry = self._live((group, lookup.key), generation)
+            if entry is not None:
+                return self._hit((group, lookup.key), entry, lookup, "exact")
+
+        if not self.semantic or not lookup.key:
+            with self._lock:
+                self.stats["misses"] += 1
+            count("answer_cache_lookups_total", namespace=namespace, result="miss")
+            return lookup
+
+        # Only embed when there are cached questions to compare with; put()
+        # embeds the question later if this miss is stored
+        with self._lock:
+            has_rows = self._vectors is not None and bool(self._group_rows(group))
+        if not has_rows:
+            with self._lock:
+                self.stats["misses"] += 1
+            count("answer_cache_lookups_total", namespace=namespace, result="miss")
+            return lookup
+
+        # Embed the query as written so retrieval reuses the cached embedding
+        lookup.vector = self._embed_query(query)
+        with self._lock:
+            if self._vectors is not None and len(self._entries):
+                rows = self._group_rows(group)
+                if rows:
+                    sims = self._vectors[rows] @ lookup.vector
+                    best = int(np.argmax(sims))
+                    if sims[best] >= self.similarity:
+                        key = self._row_keys[rows[best]]
+                        entry = self._live(key, generation)
+                        if entry is not None:
+                            lookup.similarity = float(sims[best])
+                            return self._hit(key, entry, lookup, "semantic")
+            self.stats["misses"] += 1
+            count("answer_cache_lookups_total", namespace=namespace, result="miss")
+        return lookup
+
+    def put(self, lookup: CacheLookup, value: Any, cost_ms: float) -> None:
+        """
+        Store the answer computed after a miss; `cost_ms` is what a future
+        hit saves. Blocking: embeds the question if lookup() did not (on
+        the RAG path retrieval has embedded it already, so this is an
+        embedding-cache hit).
+        """
+        key = (lookup.group, lookup.key)
+        if self.semantic and lookup.vector is None and lookup.key and lookup.query:
+            lookup.vector = self._embed_query(lookup.query)
+        with self._lock:
+            if lookup.generation < self._generation:
+                return  # computed against a corpus that has since changed
+            if key in self._entries:
+                self._drop(key, None)
+            while len(self._entries) >= self.max_items:
+                self._drop(next(iter(self._entries)), "evictions")
+
+            row = -1
+            if lookup.vector is not None:
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.max_items, len(lookup.vector)), dtype=np.float32)
+                if len(lookup.vector) == self._vectors.shape[1]:
+                    row = self._free_rows.pop()
+                    self._vectors[row] = lookup.vector
+                    self._row_keys[row] = key
+
+            self._entries[key] = _Entry(
+                value=value,
+                group=lookup.group,
+                row=row,
+                generation=lookup.generation,
+                expires_at=time.monotonic() + self.ttl_s,
+                cost_ms=cost_ms,
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key, "invalidated")
+
+    def snapshot_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.stats)
+            hits = stats["exact_hits"] + stats["semantic_hits"]
+            lookups = hits + stats["misses"]
+            stats["hit_rate"] = hits / lookups if lookups else 0.0
+            stats["avg_saved_ms"] = stats["saved_ms"] / hits if hits else 0.0
+            stats["items"] = len(self._entries)
+            stats["generation"] = self._generation
+        return stats
+
+
+# --------------------------
+# Process-wide shared instance
+# --------------------------
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """The shared cache, or None when ANSWER_CACHE_ENABLED is off."""
+    global _cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
@@ -0,0 +1,419 @@
+import os
+import sqlite3
+import threading
+import uuid
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from config import (
+    BM25_INDEX_PATH,
+    BM25_LOWERCASE,
+    BM25_MAX_DF_MIN_DOCS,
+    BM25_MAX_DF_RATIO,
+    BM25_STEMMING,
+    BM25_STRIP_PUNCTUATION,
+)
+from rag.tokenizer import Tokenizer
+
+
+class BM25Snapshot(NamedTuple):
+    """Frozen view of the index: only doc_ids <= max_doc_id are visible."""
+
+    max_doc_id: int
+    num_docs: int
+    total_len: int
+
+    @property
+    def avgdl(self) -> float:
+        return self.total_len / self.num_docs if self.num_docs else 0.0
+
+
+class BM25Index:
+    """
+    Persistent, incrementally updated BM25 index backed by SQLite.
+
+    Postings are clustered by term, so a query only reads the postings of
+    its own terms. Corpus statistics (document count, total length) are kept
+    in a small meta table and cached in memory, so nothing has to be
+    rebuilt when the process starts or when new chunks arrive.
+    """
+
+    SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS docs (
+    doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chunk_id TEXT UNIQUE,
+    text TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    dl INTEGER NOT NULL,
+    PRIMARY KEY (term, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+"""
+
+    SQL_BATCH = 500
+
+    def __init__(
+        self,
+        path: str = BM25_INDEX_PATH,
+        k1: float = 1.5,
+        b: float = 0.75,
+        tokenizer: Optional[Tokenizer] = None,
+        max_df_ratio: float = BM25_MAX_DF_RATIO,
+        max_df_min_docs: int = BM25_MAX_DF_MIN_DOCS,
+    ):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self.max_df_min_docs = max_df_min_docs
+        self.tokenizer = tokenizer or Tokenizer(
+            lowercase=BM25_LOWERCASE,
+            strip_punctuation=BM25_STRIP_PUNCTUATION,
+            stem=BM25_STEMMING,
+        )
+        self._lock = threading.RLock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+        self.num_docs = int(self._get_meta("num_docs", "0"))
+        self.total_len = int(self._get_meta("total_len", "0"))
+
+        # Postings built with a different tokenizer are useless for querying
+        if self._get_meta("tokenizer", self.tokenizer.signature) != self.tokenizer.signature:
+            self._reindex()
+        with self._conn:
+            self._set_meta("tokenizer", self.tokenizer.signature)
+
+    # --------------------------
+    # Helpers
+    # --------------------------
+    def _get_meta(self, key: str, default: str) -> str:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value)),
+        )
+
+    def tokenize(self, text: str) -> List[str]:
+        return self.tokenizer(text)
+
+    @property
+    def avgdl(self) -> float:
+        return self.total_len / self.num_docs if self.num_docs else 0.0
+
+    def is_empty(self) -> bool:
+        return self.num_docs == 0
+
+    # --------------------------
+    # Indexing
+    # --------------------------
+    def add(self, texts: List[str], ids: Optional[List[str]] = None) -> int:
+        """
+        Index new chunks. Chunks whose id is already indexed are skipped.
+        Returns the number of chunks actually added.
+        """
+        if ids is not None and len(ids) != len(texts):
+            raise ValueError("ids and texts must have the same length.")
+
+        with self._lock:
+            with self._conn:
+                added = 0
+                num_docs, total_len = self.num_docs, self.total_len
+                df_delta: Counter = Counter()
+                for i, text in enumerate(texts):
+                    chunk_id = ids[i] if ids is not None else uuid.uuid4().hex
+                    tokens = self.tokenize(text)
+                    cur = self._conn.execute(
+                        "INSERT OR IGNORE INTO docs (chunk_id, text, length) VALUES (?, ?, ?)",
+                        (chunk_id, text, len(tokens)),
+                    )
+                    if cur.rowcount == 0:
+                        continue
+
+                    doc_id = cur.lastrowid
+                    tf = Counter(tokens)
+                    self._conn.executemany(
+                        "INSERT INTO postings (term, doc_id, tf, dl) VALUES (?, ?, ?, ?)",
+                        [(term, doc_id, count, len(tokens)) for term, count in tf.items()],
+                    )
+                    df_delta.update(tf.keys())
+                    num_docs += 1
+                    total_len += len(tokens)
+                    added += 1
+
+                self._conn.executemany(
+                    "INSERT INTO terms (term, df) VALUES (?, ?) "
+                    "ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                    list(df_delta.items()),
+                )
+                self._set_meta("num_docs", num_docs)
+                self._set_meta("total_len", total_len)
+            # Only publish the new stats once the transaction has committed
+            self.num_docs, self.total_len = num_docs, total_len
+        return added
+
+    def remove(self, chunk_ids: List[str]) -> int:
+        """Drop chunks from the index. Returns the number actually removed."""
+        if not chunk_ids:
+            return 0
+        with self._lock:
+            with self._conn:
+                num_docs, total_len = self.num_docs, self.total_len
+                removed = 0
+                for cid in chunk_ids:
+                    row = self._conn.execute(
+                        "SELECT doc_id, length FROM docs WHERE chunk_id = ?", (cid,)
+                    ).fetchone()
+                    if not row:
+                        continue
+                    doc_id, length = row
+                    self._conn.execute(
+                        "UPDATE terms SET df = df - 1 WHERE term IN "
+                        "(SELECT term FROM postings WHERE doc_id = ?)",
+                        (doc_id,),
+                    )
+                    self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+                    self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+                    num_docs -= 1
+                    total_len -= length
+                    removed += 1
+                self._conn.execute("DELETE FROM terms WHERE df <= 0")
+                self._set_meta("num_docs", num_docs)
+                self._set_meta("total_len", total_len)
+            self.num_docs, self.total_len = num_docs, total_len
+        return removed
+
+    def _reindex(self) -> None:
+        """
+        Rebuild all postings from the stored chunk texts. Documents keep
+        their doc_ids, so snapshots taken before the rebuild stay valid.
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM postings")
+                self._conn.execute("DELETE FROM terms")
+                num_docs, total_len = 0, 0
+                df: Counter = Counter()
+                rows = self._conn.execute("SELECT doc_id, text FROM docs ORDER BY doc_id").fetchall()
+                for doc_id, text in rows:
+                    tokens = self.tokenize(text)
+                    tf = Counter(tokens)
+                    self._conn.execute("UPDATE docs SET length = ? WHERE doc_id = ?", (len(tokens), doc_id))
+                    self._conn.executemany(
+                        "INSERT INTO postings (term, doc_id, tf, dl) VALUES (?, ?, ?, ?)",
+                        [(term, doc_id, count, len(tokens)) for term, count in tf.items()],
+                    )
+                    df.update(tf.keys())
+                    num_docs += 1
+                    total_len += len(tokens)
+                self._conn.executemany("INSERT INTO terms (term, df) VALUES (?, ?)", list(df.items()))
+                self._set_meta("num_docs", num_docs)
+                self._set_meta("total_len", total_len)
+            self.num_docs, self.total_len = num_docs, total_len
+
+    def backfill_from(self, store) -> int:
+        """
+        One-time migration: index every chunk already in the vector store.
+        Subsequent calls are no-ops.
+        """
+        with self._lock:
+            if self._get_meta("backfilled", "0") == "1":
+                return 0
+            results = store.get(include=["documents"])
+            added = self.add(results["documents"] or [], results["ids"] or None)
+            with self._conn:
+                self._set_meta("backfilled", 1)
+            return added
+
+    # --------------------------
+    # Snapshots
+    # --------------------------
+    def watermark(self) -> int:
+        """Highest doc_id written so far; doc_ids only ever grow."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(doc_id), 0) FROM docs").fetchone()[0]
+
+    def snapshot(self, max_doc_id: Optional[int] = None) -> BM25Snapshot:
+        """
+        Freeze the corpus at `max_doc_id` (default: everything written so
+        far). Searches against the snapshot ignore later additions and use
+        statistics computed over exactly the visible documents.
+        """
+        with self._lock:
+            if max_doc_id is None:
+                max_doc_id = self.watermark()
+            num_docs, total_len = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE doc_id <= ?", (max_doc_id,)
+            ).fetchone()
+        return BM25Snapshot(max_doc_id, num_docs, total_len)
+
+    # --------------------------
+    # Search
+    # --------------------------
+    def search(self, query: str, k: int = 5, snapshot: Optional[BM25Snapshot] = None) -> List[Tuple[str, float]]:
+        """
+        Return the top-k (chunk_id, score) pairs for a query.
+
+        Only the postings of the query terms are read; scores are accumulated
+        with NumPy and the top k are selected with argpartition, so the cost
+        scales with the number of matching postings, not the corpus size.
+
+        With a snapshot, only documents visible in it are scored and the
+        document frequencies are counted over those documents.
+
+        In a large corpus, query terms occurring in more than max_df_ratio
+        of all documents are ignored (see _informative).
+        """
+        return self.search_many([query], k, snapshot)[0]
+
+    def search_many(
+        self, queries: List[str], k: int = 5, snapshot: Optional[BM25Snapshot] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        search() for several queries at once: postings of a term shared by
+        several queries (e.g. rewrites of one question) are read and scored
+        only once, and the chunk ids of all results are fetched together.
+        """
+        query_terms = [set(self.tokenize(q)) for q in queries]
+        num_docs, avgdl = (snapshot.num_docs, snapshot.avgdl) if snapshot else (self.num_docs, self.avgdl)
+        if not num_docs or k <= 0 or not any(query_terms):
+            return [[] for _ in queries]
+
+        with self._lock:
+            if snapshot is None:
+                num_docs, avgdl = self.num_docs, self.avgdl
+            dfs = self._dfs(set().union(*query_terms))
+            query_terms = [self._informative(terms, dfs, num_docs) for terms in query_terms]
+            # term -> (doc_ids, per-document score contribution)
+            partials: Dict[str, Optional[Tuple[np.ndarray, np.ndarray]]] = {}
+            for term in set().union(*query_terms):
+                partials[term] = self._term_scores(term, dfs.get(term, 0), snapshot, num_docs, avgdl)
+
+            tops = []
+            for terms in query_terms:
+                hits = [partials[t] for t in terms if partials[t] is not None]
+                if not hits:
+                    tops.append(([], []))
+                    continue
+                unique_ids, inverse = np.unique(np.concatenate([h[0] for h in hits]), return_inverse=True)
+                scores = np.bincount(inverse, weights=np.concatenate([h[1] for h in hits]))
+
+                if len(scores) > k:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                else:
+                    top = np.arange(len(scores))
+                top = top[np.argsort(-scores[top], kind="stable")]
+                tops.append(([int(d) for d in unique_ids[top]], scores[top]))
+
+            all_ids = sorted({d for ids, _ in tops for d in ids})
+            chunk_ids = self._chunk_ids(all_ids) if all_ids else {}
+
+        return [
+            [(chunk_ids[d], float(s)) for d, s in zip(ids, scores) if d in chunk_ids]
+            for ids, scores in tops
+        ]
+
+    def _dfs(self, terms: Set[str]) -> Dict[str, int]:
+        """Document frequency of each known term (caller holds the lock)."""
+        terms = list(terms)
+        dfs: Dict[str, int] = {}
+        for start in range(0, len(terms), self.SQL_BATCH):
+            batch = terms[start:start + self.SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            dfs.update(self._conn.execute(
+                f"SELECT term, df FROM terms WHERE term IN ({placeholders})", batch
+            ).fetchall())
+        return dfs
+
+    def _informative(self, terms: Set[str], dfs: Dict[str, int], num_docs: int) -> Set[str]:
+        """
+        Drop stopword-like terms (df above max_df_ratio of the corpus) from a
+        query, unless the corpus is too small to tell or nothing would be left.
+        """
+        if num_docs < self.max_df_min_docs:
+            return terms
+        limit = self.max_df_ratio * num_docs
+        kept = {t for t in terms if dfs.get(t, 0) <= limit}
+        return kept or terms
+
+    def _term_scores(
+        self, term: str, df: int, snapshot: Optional[BM25Snapshot], num_docs: int, avgdl: float
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """BM25 contribution of one term to every document containing it (caller holds the lock)."""
+        if not df:
+            return None
+        if snapshot is None:
+            rows = self._conn.execute(
+                "SELECT doc_id, tf, dl FROM postings WHERE term = ?", (term,)
+            ).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT doc_id, tf, dl FROM postings WHERE term = ? AND doc_id <= ?",
+                (term, snapshot.max_doc_id),
+            ).fetchall()
+        postings = np.array(rows, dtype=np.float64)
+        if not len(postings):
+            return None
+        if snapshot is not None:
+            df = len(postings)
+        idf = np.log1p((num_docs - df + 0.5) / (df + 0.5))
+        tf, dl = postings[:, 1], postings[:, 2]
+        norm = tf + self.k1 * (1 - self.b + self.b * dl / avgdl)
+        return postings[:, 0].astype(np.int64), idf * tf * (self.k1 + 1) / norm
+
+    def _chunk_ids(self, doc_ids: List[int]) -> dict:
+        placeholders = ",".join("?" * len(doc_ids))
+        rows = self._conn.execute(
+            f"SELECT doc_id, chunk_id FROM docs WHERE doc_id IN ({placeholders})", doc_ids
+        ).fetchall()
+        return dict(rows)
+
+    def get_texts(self, chunk_ids: List[str]) -> Dict[str, str]:
+        """Fetch chunk texts by chunk id; unknown ids are left out."""
+        if not chunk_ids:
+            return {}
+        with self._lock:
+            placeholders = ",".join("?" * len(chunk_ids))
+            rows = self._conn.execute(
+                f"SELECT chunk_id, text FROM docs WHERE chunk_id IN ({placeholders})", list(chunk_ids)
+            ).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# --------------------------
+# Process-wide shared instance
+# --------------------------
+_index: Optional[BM25Index] = None
+_index_lock = threading.Lock()
+
+
+def get_bm25_index() -> BM25Index:
+    """Open the on-disk index once per process and share it."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = BM25Index()
+    return _index
@@ -1,10 +1,155 @@
-def build_context(chunks: list[str], max_chars=6000) -> str:
-    """Assemble best-ranked chunks into a single prompt with safety guard."""
-    context = ""
-    for c in chunks:
-        if len(context) + len(c) < max_chars:
-            context += c + "\n\n---\n\n"
-        else:
-            break
-
-    return f"You are a helpful assistant. Use the following context:\n\n{context}\nAnswer clearly and accurately."
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from config import LLM_MODEL, CONTEXT_MAX_TOKENS, CONTEXT_MERGE_GAP_CHARS
+from ingestion.tokens import count_tokens, count_tokens_many
+
+_HEADER = "You are a helpful assistant. Use the following context:\n\n"
+_FOOTER = (
+    "\nAnswer clearly and accurately. Cite the passages you rely on by their "
+    "number, e.g. [1]."
+)
+
+
+@dataclass
+class _Block:
+    text: str
+    score: float
+    source: Optional[str] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+    page: Optional[int] = None
+    lines: Optional[Tuple[int, int]] = None  # code chunks: 1-based line range
+    ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Context:
+    prompt: str
+    citations: List[dict]  # {"ref", "source", "start", "end", "page", "lines", "ids"}, in prompt order
+    tokens: int            # prompt tokens for the target model
+    dropped: int           # merged blocks that did not fit the budget
+
+
+def _blocks(passages: Sequence[Union[str, dict]]) -> List[_Block]:
+    """Normalize inputs; plain strings (or dicts without a score) rank by position."""
+    blocks = []
+    for i, p in enumerate(passages):
+        if isinstance(p, str):
+            p = {"text": p}
+        meta = p.get("metadata") or {}
+        lines = (meta["start_line"], meta["end_line"]) if "start_line" in meta and "end_line" in meta else None
+        blocks.append(_Block(
+            text=p["text"],
+            score=p["score"] if p.get("score") is not None else float(len(passages) - i),
+            source=meta.get("source"),
+            start=meta.get("start"),
+            end=meta.get("end"),
+            page=meta.get("page"),
+            lines=lines,
+            ids=[p["id"]] if p.get("id") else [],
+        ))
+    return blocks
+
+
+def merge_passages(passages: Sequence[Union[str, dict]], gap_chars: int = CONTEXT_MERGE_GAP_CHARS) -> List[_Block]:
+    """
+    Collapse overlapping or adjacent windows of the same source into one
+    block (scored by its best member) and drop exact duplicates. Passages
+    without source offsets are only deduplicated.
+    """
+    merged: List[_Block] = []
+    by_source: Dict[str, List[_Block]] = {}
+    seen_texts = set()
+    for block in _blocks(passages):
+        if block.source is not None and block.start is not None and block.end is not None:
+            by_source.setdefault(block.source, []).append(block)
+        elif block.text not in seen_texts:
+            seen_texts.add(block.text)
+            merged.append(block)
+
+    for blocks in by_source.values():
+        blocks.sort(key=lambda b: b.start)
+        current = blocks[0]
+        for block in blocks[1:]:
+            if block.start > current.end + gap_chars:
+                merged.append(current)
+                current = block
+                continue
+            if block.end > current.end:
+                if block.start <= current.end:
+                    # Offsets index the same document text, so the overlap can be cut exactly
+                    current.text += block.text[current.end - block.start:]
+                else:
+                    current.text += "\n" + block.text
+                current.end = block.end
+            current.score = max(current.score, block.score)
+            current.ids.extend(i for i in block.ids if i not in current.ids)
+            if current.page is None:
+                current.page = block.page
+            if current.lines and block.lines:
+                current.lines = (min(current.lines[0], block.lines[0]), max(current.lines[1], block.lines[1]))
+        merged.append(current)
+
+    merged.sort(key=lambda b: b.score, reverse=True)
+    return merged
+
+
+def _label(ref: int, block: _Block) -> str:
+    label = f"[{ref}]"
+    if block.source:
+        label += f" {block.source}"
+        if block.page is not None:
+            label += f" (p. {block.page})"
+        elif block.lines:
+            label += f" (lines {block.lines[0]}-{block.lines[1]})"
+    return label
+
+
+def assemble_context(
+    passages: Sequence[Union[str, dict]],
+    max_tokens: int = CONTEXT_MAX_TOKENS,
+    model: str = LLM_MODEL,
+) -> Context:
+    """
+    Build the system prompt from retrieved passages within `max_tokens`
+    of `model`'s tokenizer. Overlapping chunks are merged first; blocks
+    are then packed most relevant first, skipping any that no longer fit
+    so smaller ones further down can still use the remaining budget.
+    Each block is numbered for citation.
+    """
+    blocks = merge_passages(passages)
+    sections = [f"{_label(i + 1, b)}\n{b.text}\n\n" for i, b in enumerate(blocks)]
+    costs = count_tokens_many(sections, model) if sections else []
+    remaining = max_tokens - count_tokens(_HEADER + _FOOTER, model)
+
+    chosen = []
+    for block, cost in zip(blocks, costs):
+        if cost <= remaining:
+            chosen.append(block)
+            remaining -= cost
+        elif not chosen and remaining > 0:
+            # The best block alone is over budget: keep its head rather than nothing
+            # (~3 characters per token leaves room for tokenizer variance)
+            block.text = block.text[: max(remaining - 16, 0) * 3]
+            if block.start is not None:
+                block.end = block.start + len(block.text)
+            chosen.append(block)
+            remaining = 0
+
+    # Renumber after packing so the references are 1..n
+    body = "".join(f"{_label(i + 1, b)}\n{b.text}\n\n" for i, b in enumerate(chosen))
+    prompt = _HEADER + body + _FOOTER
+    citations = [
+        {
+            "ref": i + 1, "source": b.source, "start": b.start, "end": b.end,
+            "page": b.page, "lines": b.lines, "ids": b.ids,
+        }
+        for i, b in enumerate(chosen)
+    ]
+    return Context(prompt, citations, count_tokens(prompt, model), len(blocks) - len(chosen))
+
+
+def build_context(chunks: Sequence[Union[str, dict]], max_tokens: int = CONTEXT_MAX_TOKENS, model: str = LLM_MODEL) -> str:
+    """Assemble best-ranked chunks (texts or hybrid_search results) into a single prompt."""
+    return assemble_context(chunks, max_tokens, model).prompt
@@ -0,0 +1,69 @@
+from typing import Dict, List, Optional, Tuple
+
+# A ranked list from one retrieval source: [(chunk_id, score), ...], best first
+Ranking = List[Tuple[str, float]]
+
+
+def _breakdowns(rankings: Dict[str, Ranking]) -> Dict[str, dict]:
+    """Collect per-source rank and raw score for every candidate id."""
+    merged: Dict[str, dict] = {}
+    for source, ranking in rankings.items():
+        for rank, (chunk_id, score) in enumerate(ranking, start=1):
+            entry = merged.setdefault(chunk_id, {"id": chunk_id, "scores": {}, "ranks": {}})
+            # Keep the first (best) occurrence if a source repeats an id
+            if source not in entry["ranks"]:
+                entry["scores"][source] = score
+                entry["ranks"][source] = rank
+    return merged
+
+
+def reciprocal_rank_fusion(
+    rankings: Dict[str, Ranking],
+    k: int = 60,
+    weights: Optional[Dict[str, float]] = None,
+) -> List[dict]:
+    """
+    RRF: score(d) = sum_s w_s / (k + rank_s(d)).
+    Only ranks are used, so raw scores from different sources never need
+    to be on the same scale.
+    """
+    weights = weights or {}
+    fused = _breakdowns(rankings)
+    for entry in fused.values():
+        entry["score"] = sum(
+            weights.get(source, 1.0) / (k + rank) for source, rank in entry["ranks"].items()
+        )
+    return sorted(fused.values(), key=lambda e: e["score"], reverse=True)
+
+
+def weighted_score_fusion(
+    rankings: Dict[str, Ranking],
+    weights: Optional[Dict[str, float]] = None,
+) -> List[dict]:
+    """
+    Min-max normalize each source's scores to [0, 1], then take a weighted
+    sum. A candidate missing from a source contributes 0 for that source.
+    """
+    weights = weights or {}
+    fused = _breakdowns(rankings)
+
+    for source, ranking in rankings.items():
+        if not ranking:
+            continue
+        values = [score for _, score in ranking]
+        lo, hi = min(values), max(values)
+        span = hi - lo
+        for entry in fused.values():
+            if source in entry["scores"]:
+                norm = (entry["scores"][source] - lo) / span if span else 1.0
+                entry["score"] = entry.get("score", 0.0) + weights.get(source, 1.0) * norm
+
+    return sorted(fused.values(), key=lambda e: e.get("score", 0.0), reverse=True)
+
+
+def fuse(rankings: Dict[str, Ranking], method: str = "rrf", **kwargs) -> List[dict]:
+    if method == "rrf":
+        return reciprocal_rank_fusion(rankings, **kwargs)
+    if method == "weighted":
+        return weighted_score_fusion(rankings, **kwargs)
+    raise ValueError(f"Unknown fusion method: {method}")
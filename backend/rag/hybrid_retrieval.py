@@ -1,17 +1,78 @@
+import asyncio
+from typing import Optional
+
 from rag.retriever import Retriever
-from rag.reranker import Reranker
+from rag.reranker import BaseReranker, get_reranker
+from rag.query_expansion import Expansion, QueryExpander
+from tracing import span
+from config import RERANK_ENABLED, RERANK_TOP_N
 
 class HybridRetriever:
-    def __init__(self):
-        self.retriever = Retriever()
-        self.reranker = Reranker()
+    def __init__(
+        self,
+        retriever: Optional[Retriever] = None,
+        reranker: Optional[BaseReranker] = None,
+        expander: Optional[QueryExpander] = None,
+    ):
+        self.retriever = retriever or Retriever()
+        self.reranker = reranker or get_reranker()
+        self.expander = expander or QueryExpander()
+
+    def _search(self, query: str, depth: int, where: Optional[dict], expansion: Optional[Expansion]):
+        if expansion is None or not expansion.expanded:
+            return self.retriever.hybrid_search(query, k=depth, where=where)
+        return self.retriever.multi_search(
+            expansion.queries, k=depth, hypothetical=expansion.hypothetical, where=where
+        )
+
+    def get(
+        self,
+        query: str,
+        k: int = 5,
+        rerank: Optional[bool] = None,
+        where: Optional[dict] = None,
+        expand: Optional[str] = None,
+    ):
+        """
+        `expand` ("none" | "multi_query" | "hyde" | "both", default
+        RETRIEVAL_EXPANSION) searches LLM-expanded variants of the query
+        too; see rag.query_expansion.
+        """
+        rerank = RERANK_ENABLED if rerank is None else rerank
+        expansion = self.expander.expand_sync(query, expand) if (expand or self.expander.mode) != "none" else None
 
-    def get(self, query: str, k: int = 5):
-        # Get combined (vector + BM25)
-        candidates = self.retriever.hybrid_search(query, k=k)
+        # Get fused (vector + BM25) candidates; only the top-N go to the reranker
+        depth = max(k, RERANK_TOP_N) if rerank else k
+        candidates = self._search(query, depth, where, expansion)
 
-        # Rerank with LLM
-        ranked = self.reranker.rerank(query, candidates)
+        if not rerank:
+            return candidates[:k]
+
+        # Rerank (local scorer by default, LLM optional) against the user's own question
+        with span("rerank", reranker=type(self.reranker).__name__, candidates=len(candidates)):
+            ranked = self.reranker.rerank(query, candidates)
 
         # Return top-k
         return ranked[:k]
+
+    async def aget(
+        self,
+        query: str,
+        k: int = 5,
+        rerank: Optional[bool] = None,
+        where: Optional[dict] = None,
+        expand: Optional[str] = None,
+    ):
+        """Async variant of get(): retrieval runs in a worker thread, expansion and reranking may await the LLM."""
+        rerank = RERANK_ENABLED if rerank is None else rerank
+        expansion = await self.expander.expand(query, expand)
+
+        depth = max(k, RERANK_TOP_N) if rerank else k
+        candidates = await asyncio.to_thread(self._search, query, depth, where, expansion)
+
+        if not rerank:
+            return candidates[:k]
+
+        with span("rerank", reranker=type(self.reranker).__name__, candidates=len(candidates)):
+            ranked = await self.reranker.arerank(query, candidates)
+        return ranked[:k]
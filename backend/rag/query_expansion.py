@@ -0,0 +1,108 @@
+import json
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from llm_client import get_llm_client, run_sync
+from tracing import count, span
+from config import EXPANSION_QUERIES, RETRIEVAL_EXPANSION
+
+MODES = ("none", "multi_query", "hyde", "both")
+
+
+@dataclass
+class Expansion:
+    """The texts one question is searched with; queries[0] is always the question itself."""
+
+    queries: List[str]
+    hypothetical: Optional[str] = None
+    mode: str = "none"
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def expanded(self) -> bool:
+        return len(self.queries) > 1 or self.hypothetical is not None
+
+
+class QueryExpander:
+    """
+    Asks the LLM, in a single call, for sub-queries covering the parts of a
+    question (multi-query) and/or a short passage that would answer it
+    (HyDE: its embedding lands closer to answer-like chunks than the
+    question's does). Any failure falls back to the question alone.
+    """
+
+    SYSTEM_PROMPT = """
+You are a query expansion module for a document search engine.
+
+Given a USER QUESTION, produce:
+- "queries": up to {n} short, self-contained search queries that together cover every part
+  of the question (split multi-part questions, spell out implied terms). Do not repeat the
+  question verbatim.
+- "hypothetical_answer": a plausible 2-4 sentence passage, written like documentation,
+  that would answer the question. Facts may be guessed; wording matters more than truth.
+
+Omit a key when it is not requested: {wanted}.
+
+Return STRICTLY valid JSON:
+
+{{"queries": ["..."], "hypothetical_answer": "..."}}
+"""
+
+    def __init__(self, mode: str = RETRIEVAL_EXPANSION, n_queries: int = EXPANSION_QUERIES):
+        if mode not in MODES:
+            raise ValueError(f"Unknown retrieval expansion: {mode!r} (expected one of {MODES})")
+        self.mode = mode
+        self.n_queries = n_queries
+
+    def _prompt(self, mode: str) -> str:
+        wanted = {
+            "multi_query": "only \"queries\" is requested",
+            "hyde": "only \"hypothetical_answer\" is requested",
+            "both": "both keys are requested",
+        }[mode]
+        return self.SYSTEM_PROMPT.format(n=self.n_queries, wanted=wanted)
+
+    async def expand(self, query: str, mode: Optional[str] = None) -> Expansion:
+        mode = mode or self.mode
+        if mode not in MODES:
+            raise ValueError(f"Unknown retrieval expansion: {mode!r} (expected one of {MODES})")
+        expansion = Expansion(queries=[query], mode=mode)
+        if mode == "none":
+            return expansion
+
+        with span("expand", mode=mode) as s:
+            try:
+                content = await get_llm_client().chat(
+                    [
+                        {"role": "system", "content": self._prompt(mode)},
+                        {"role": "user", "content": query},
+                    ]
+                )
+                data = json.loads(content)
+                if not isinstance(data, dict):
+                    raise ValueError("expected a JSON object")
+            except Exception as e:
+                # Expansion only improves recall; never fail the search over it
+                expansion.errors.append(f"{type(e).__name__}: {e}")
+                count("query_expansions_total", mode=mode, result="failed")
+                return expansion
+
+            if mode in ("multi_query", "both"):
+                seen = {query.strip().lower()}
+                for q in data.get("queries") or []:
+                    if isinstance(q, str) and q.strip() and q.strip().lower() not in seen:
+                        seen.add(q.strip().lower())
+                        expansion.queries.append(q.strip())
+                    if len(expansion.queries) > self.n_queries:
+                        break
+            if mode in ("hyde", "both"):
+                hypothetical = data.get("hypothetical_answer")
+                if isinstance(hypothetical, str) and hypothetical.strip():
+                    expansion.hypothetical = hypothetical.strip()
+            s.set(queries=len(expansion.queries), hyde=expansion.hypothetical is not None)
+        count("query_expansions_total", mode=mode, result="ok")
+        return expansion
+
+    def expand_sync(self, query: str, mode: Optional[str] = None) -> Expansion:
+        """For callers outside any event loop (e.g. in a worker thread)."""
+        return run_sync(self.expand(query, mode))
@@ -1,16 +1,149 @@
-from openai import OpenAI
-from config import OPENAI_API_KEY
+import asyncio
+import json
+import time
+from typing import List, Optional
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+import numpy as np
+from config import RERANKER_MODE, RERANK_TIMEOUT_MS, CROSS_ENCODER_MODEL
+from llm_client import get_llm_client, run_sync
+from rag.tokenizer import Tokenizer
 
-class Reranker:
-    def rerank(self, query: str, passages: list[str]):
+
+def _text(passage) -> str:
+    return passage["text"] if isinstance(passage, dict) else passage
+
+
+class BaseReranker:
+    """
+    Reorders passages (plain strings or hybrid_search result dicts) by
+    relevance to the query. Input order is treated as the fused retrieval
+    order and is what every backend falls back to on failure or timeout.
+
+    `arerank` is the async entry point. Local scorers run in a worker
+    thread; backends that call out over the network override it.
+    """
+
+    def rerank(self, query: str, passages: list) -> list:
+        raise NotImplementedError
+
+    async def arerank(self, query: str, passages: list) -> list:
+        return await asyncio.to_thread(self.rerank, query, passages)
+
+
+class NoopReranker(BaseReranker):
+    def rerank(self, query: str, passages: list) -> list:
+        return list(passages)
+
+    async def arerank(self, query: str, passages: list) -> list:
+        return list(passages)
+
+
+class LocalReranker(BaseReranker):
+    """
+    CPU-only feature-based scorer. All (query, passage) pairs are scored in
+    one batch from cheap lexical features, blended with the fused retrieval
+    rank so a weak lexical signal never buries a strong retrieval hit.
+    """
+
+    WEIGHTS = np.array([
+        1.0,   # fraction of query terms present
+        0.6,   # fraction of query bigrams present (phrase matches)
+        0.3,   # how early the first query term appears
+        0.8,   # prior from fused retrieval rank
+    ])
+
+    def __init__(self, timeout_ms: int = RERANK_TIMEOUT_MS):
+        self.timeout_ms = timeout_ms
+        self.tokenizer = Tokenizer(stem=True)
+
+    def _features(self, q_terms: set, q_bigrams: set, tokens: List[str], rank: int) -> List[float]:
+        if not tokens:
+            return [0.0, 0.0, 0.0, 1.0 / (1 + rank)]
+        present = q_terms.intersection(tokens)
+        bigrams = set(zip(tokens, tokens[1:]))
+        first = next((i for i, t in enumerate(tokens) if t in q_terms), len(tokens))
+        return [
+            len(present) / len(q_terms),
+            len(q_bigrams & bigrams) / len(q_bigrams) if q_bigrams else 0.0,
+            1.0 - first / len(tokens),
+            1.0 / (1 + rank),
+        ]
+
+    def rerank(self, query: str, passages: list) -> list:
+        if not passages:
+            return []
+
+        deadline = time.perf_counter() + self.timeout_ms / 1000
+        q_tokens = self.tokenizer(query)
+        q_terms = set(q_tokens)
+        if not q_terms:
+            return list(passages)
+        q_bigrams = set(zip(q_tokens, q_tokens[1:]))
+
+        rows = []
+        for rank, passage in enumerate(passages):
+            if time.perf_counter() > deadline:
+                # Out of budget: keep the fused retrieval order
+                return list(passages)
+            rows.append(self._features(q_terms, q_bigrams, self.tokenizer(_text(passage)), rank))
+
+        scores = np.asarray(rows) @ self.WEIGHTS
+        order = np.argsort(-scores, kind="stable")
+        return [passages[i] for i in order]
+
+
+class CrossEncoderReranker(BaseReranker):
+    """
+    Small local cross-encoder (e.g. MiniLM) run on CPU in batches.
+    Requires the optional `sentence-transformers` package.
+    """
+
+    def __init__(
+        self,
+        model_name: str = CROSS_ENCODER_MODEL,
+        timeout_ms: int = RERANK_TIMEOUT_MS,
+        batch_size: int = 16,
+    ):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError(
+                "RERANKER_MODE=cross_encoder needs `pip install sentence-transformers`."
+            ) from e
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.timeout_ms = timeout_ms
+        self.batch_size = batch_size
+
+    def rerank(self, query: str, passages: list) -> list:
+        if not passages:
+            return []
+
+        deadline = time.perf_counter() + self.timeout_ms / 1000
+        pairs = [(query, _text(p)) for p in passages]
+        scores: List[float] = []
+        for start in range(0, len(pairs), self.batch_size):
+            if time.perf_counter() > deadline:
+                return list(passages)
+            scores.extend(self.model.predict(pairs[start:start + self.batch_size]).tolist())
+
+        order = np.argsort(-np.asarray(scores), kind="stable")
+        return [passages[i] for i in order]
+
+
+class LLMReranker(BaseReranker):
+    """Optional mode: ask gpt-4o-mini to order the passages (one extra round trip)."""
+
+    def rerank(self, query: str, passages: list) -> list:
+        # Sync callers run outside any event loop (e.g. in a worker thread)
+        return run_sync(self.arerank(query, passages))
+
+    async def arerank(self, query: str, passages: list) -> list:
         if not passages:
             return []
 
         # Format passages for LLM
         numbered = "\n\n".join(
-            [f"Passage {i+1}:\n{p}" for i, p in enumerate(passages)]
+            [f"Passage {i+1}:\n{_text(p)}" for i, p in enumerate(passages)]
         )
 
         prompt = f"""
@@ -26,13 +159,34 @@ Return ONLY a list of passage numbers in descending order of relevance.
 Example: [3,1,2]
 """
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}]
-        )
+        text = await get_llm_client().chat([{"role": "user", "content": prompt}])
+        try:
+            numbers = json.loads(text)
+        except Exception:
+            return list(passages)
+        if not isinstance(numbers, list):
+            return list(passages)
+
+        # Keep valid, unique passage numbers; anything the model dropped
+        # keeps its fused position after the ranked ones
+        seen = []
+        for n in numbers:
+            if isinstance(n, int) and 1 <= n <= len(passages) and n - 1 not in seen:
+                seen.append(n - 1)
+        seen.extend(i for i in range(len(passages)) if i not in seen)
+        return [passages[i] for i in seen]
+
+
+RERANKERS = {
+    "none": NoopReranker,
+    "local": LocalReranker,
+    "cross_encoder": CrossEncoderReranker,
+    "llm": LLMReranker,
+}
 
-        text = response.choices[0].message.content
-        numbers = eval(text)  # passages returned as [2,1,3]
 
-        # Convert numbers into actual passages
-        return [passages[i-1] for i in numbers]
+def get_reranker(mode: Optional[str] = None) -> BaseReranker:
+    mode = mode or RERANKER_MODE
+    if mode not in RERANKERS:
+        raise ValueError(f"Unknown reranker mode: {mode}")
+    return RERANKERS[mode]()
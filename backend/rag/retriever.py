@@ -1,62 +1,219 @@
-from vectorstore.chroma_store import ChromaStore
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from vectorstore.factory import get_vector_store
 from ingestion.embedder import embed_texts
+from config import (
+    HYBRID_FUSION,
+    HYBRID_K_VEC,
+    HYBRID_K_BM25,
+    HYBRID_VECTOR_WEIGHT,
+    HYBRID_BM25_WEIGHT,
+    RRF_K,
+    EXPANSION_WEIGHT,
+    EXPANSION_SEARCH_WORKERS,
+)
 
-# --------------------------
-# Optional BM25 Implementation
-# --------------------------
+from rag.bm25_index import BM25Index, BM25Snapshot, get_bm25_index
+from rag.fusion import Ranking, fuse
+from tracing import count, span
+from vectorstore.base import VectorStore
 
-from rank_bm25 import BM25Okapi
+# Shared by all retrievers: the searches of one expanded query run side by side
+_search_pool: Optional[ThreadPoolExecutor] = None
+_search_pool_lock = threading.Lock()
 
-class Retriever:
-    def __init__(self):
-        self.store = ChromaStore()
 
-        # Load all documents from Chroma
-        docs = self.store.collection.get(include=["documents"])["documents"]
+def _get_search_pool() -> ThreadPoolExecutor:
+    global _search_pool
+    if _search_pool is None:
+        with _search_pool_lock:
+            if _search_pool is None:
+                _search_pool = ThreadPoolExecutor(EXPANSION_SEARCH_WORKERS, thread_name_prefix="search")
+    return _search_pool
+
+
+class Retriever:
+    """
+    Vector, BM25 and hybrid search over the shared indexes.
 
-        # Flatten as needed (Chroma returns list of list)
-        if docs and isinstance(docs[0], list):
-            docs = docs[0]
+    A Retriever holds no index data of its own, so it is cheap to create.
+    When `as_of` (a vector store watermark) and `bm25_snapshot` are given it
+    only sees the corpus as of that point; see rag.service.
+    """
 
-        self.documents = docs
+    def __init__(
+        self,
+        store: Optional[VectorStore] = None,
+        bm25: Optional[BM25Index] = None,
+        as_of=None,
+        bm25_snapshot: Optional[BM25Snapshot] = None,
+    ):
+        self.store = store or get_vector_store()
 
-        # Build BM25 index if docs exist
-        if self.documents:
-            tokenized = [doc.split() for doc in self.documents]
-            self.bm25 = BM25Okapi(tokenized)
-        else:
-            self.bm25 = None
+        # Shared on-disk BM25 index; only chunks that predate it get indexed here
+        if bm25 is None:
+            bm25 = get_bm25_index()
+            bm25.backfill_from(self.store)
+        self.bm25 = bm25
+        self.as_of = as_of
+        self.bm25_snapshot = bm25_snapshot
 
     # --------------------------
     # Pure Vector Retrieval
     # --------------------------
-    def vector_search(self, query: str, k: int = 5):
-        embedding = embed_texts([query])[0].embedding
-        results = self.store.search(embedding, k)
-        return results
+    def vector_search(self, query: str, k: int = 5, where: Optional[dict] = None) -> List[Tuple[str, float]]:
+        """Return the top-k (chunk_id, cosine similarity) pairs."""
+        return self._vector_ranking(embed_texts([query])[0], k, where)
+
+    def _vector_ranking(self, embedding, k: int, where: Optional[dict] = None) -> Ranking:
+        with span("vector_search", k=k) as s:
+            hits = [(hit["id"], hit["score"]) for hit in self.store.query(embedding, k, where=where, as_of=self.as_of)]
+            s.set(candidates=len(hits))
+        count("retrieval_candidates_total", len(hits), source="vector")
+        return hits
 
     # --------------------------
     # BM25 Search
     # --------------------------
-    def bm25_search(self, query: str, k: int = 5):
-        if not self.bm25:
-            return []
-        scores = self.bm25.get_scores(query.split())
-        ranked = sorted(
-            zip(self.documents, scores),
-            key=lambda x: x[1],
-            reverse=True
-        )
-        return [doc for doc, score in ranked[:k]]
+    def bm25_search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Return the top-k (chunk_id, score) pairs."""
+        with span("bm25_search", k=k) as s:
+            hits = self.bm25.search(query, k, snapshot=self.bm25_snapshot)
+            s.set(candidates=len(hits))
+        count("retrieval_candidates_total", len(hits), source="bm25")
+        return hits
+
+    def bm25_search_many(self, queries: List[str], k: int = 5) -> List[Ranking]:
+        """bm25_search for several queries, sharing the postings of common terms."""
+        with span("bm25_search", k=k, queries=len(queries)) as s:
+            rankings = self.bm25.search_many(queries, k, snapshot=self.bm25_snapshot)
+            s.set(candidates=sum(len(r) for r in rankings))
+        count("retrieval_candidates_total", sum(len(r) for r in rankings), source="bm25")
+        return rankings
 
     # --------------------------
     # Hybrid Retrieval
     # --------------------------
-    def hybrid_search(self, query: str, k: int = 5):
-        vec_results = self.vector_search(query, k)
-        bm25_results = self.bm25_search(query, k)
+    def hybrid_search(
+        self,
+        query: str,
+        k: int = 5,
+        k_vec: Optional[int] = None,
+        k_bm25: Optional[int] = None,
+        method: Optional[str] = None,
+        where: Optional[dict] = None,
+    ) -> List[dict]:
+        """
+        Fuse vector and BM25 candidates by chunk id, optionally restricted
+        by a metadata filter (e.g. {"source": "data/uploads/x.pdf"}).
+
+        Returns up to k dicts:
+            {"id", "text", "metadata", "score", "scores": {source: raw}, "ranks": {source: rank}}
+        """
+        k_vec = k_vec or max(k, HYBRID_K_VEC)
+        k_bm25 = k_bm25 or max(k, HYBRID_K_BM25)
+        method = method or HYBRID_FUSION
+
+        rankings = {
+            "vector": self.vector_search(query, k_vec, where=where),
+            "bm25": self.bm25_search(query, k_bm25),
+        }
+        weights = {"vector": HYBRID_VECTOR_WEIGHT, "bm25": HYBRID_BM25_WEIGHT}
+        return self._fuse_and_hydrate(rankings, weights, k, k_bm25, method, where)
 
-        # Merge results (no duplicates)
-        combined = list(dict.fromkeys(vec_results + bm25_results))
+    def multi_search(
+        self,
+        queries: List[str],
+        k: int = 5,
+        hypothetical: Optional[str] = None,
+        k_vec: Optional[int] = None,
+        k_bm25: Optional[int] = None,
+        method: Optional[str] = None,
+        where: Optional[dict] = None,
+    ) -> List[dict]:
+        """
+        hybrid_search over several phrasings of one question (queries[0]
+        being the original) plus an optional hypothetical answer (HyDE,
+        vector search only). All texts are embedded in one batched call;
+        the vector and BM25 searches then run concurrently and every
+        ranking is fused together, expanded ones at EXPANSION_WEIGHT.
+
+        Results look like hybrid_search's; "ranks" is keyed by
+        "vector:<i>", "bm25:<i>" and "vector:hyde".
+        """
+        if not queries:
+            return []
+        k_vec = k_vec or max(k, HYBRID_K_VEC)
+        k_bm25 = k_bm25 or max(k, HYBRID_K_BM25)
+        method = method or HYBRID_FUSION
+
+        texts = list(queries) + ([hypothetical] if hypothetical else [])
+        embeddings = embed_texts(texts)
+
+        names = [f"vector:{i}" for i in range(len(queries))] + (["vector:hyde"] if hypothetical else [])
+        weights: Dict[str, float] = {}
+        for i in range(len(queries)):
+            weight = 1.0 if i == 0 else EXPANSION_WEIGHT
+            weights[f"vector:{i}"] = weight * HYBRID_VECTOR_WEIGHT
+            weights[f"bm25:{i}"] = weight * HYBRID_BM25_WEIGHT
+        if hypothetical:
+            weights["vector:hyde"] = EXPANSION_WEIGHT * HYBRID_VECTOR_WEIGHT
+
+        with span("multi_search", searches=len(names) + len(queries)):
+            pool = _get_search_pool()
+            # Each search runs in a copy of this context, so its spans join the request's trace
+            lexical = pool.submit(contextvars.copy_context().run, self.bm25_search_many, list(queries), k_bm25)
+            vector = [
+                pool.submit(contextvars.copy_context().run, self._vector_ranking, e, k_vec, where)
+                for e in embeddings
+            ]
+            rankings = {name: future.result() for name, future in zip(names, vector)}
+            rankings.update((f"bm25:{i}", r) for i, r in enumerate(lexical.result()))
+
+        return self._fuse_and_hydrate(rankings, weights, k, k_bm25, method, where)
+
+    def _fuse_and_hydrate(
+        self,
+        rankings: Dict[str, Ranking],
+        weights: Dict[str, float],
+        k: int,
+        k_bm25: int,
+        method: str,
+        where: Optional[dict],
+    ) -> List[dict]:
+        with span("fusion", method=method, rankings=len(rankings)) as s:
+            if method == "rrf":
+                fused = fuse(rankings, method, k=RRF_K, weights=weights)
+            else:
+                fused = fuse(rankings, method, weights=weights)
+            s.set(candidates=len(fused))
+
+        with span("hydrate"):
+            if not where:
+                return self._hydrate(fused[:k])
+            # BM25 has no metadata; the store drops hits outside the filter
+            return self._hydrate(fused[: k + k_bm25], where)[:k]
+
+    def _hydrate(self, results: List[dict], where: Optional[dict] = None) -> List[dict]:
+        """Attach text and metadata, dropping ids the store no longer has (or filters out)."""
+        if not results:
+            return []
+        stored = self.store.get(ids=[r["id"] for r in results], where=where)
+        records = {
+            chunk_id: (text, meta)
+            for chunk_id, text, meta in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        if not where:
+            # Chunks indexed before ids were shared only live in the BM25 store
+            missing = [r["id"] for r in results if r["id"] not in records]
+            records.update((cid, (text, {})) for cid, text in self.bm25.get_texts(missing).items())
 
-        return combined[:k]
+        hydrated = []
+        for r in results:
+            if r["id"] in records:
+                r["text"], r["metadata"] = records[r["id"]]
+                hydrated.append(r)
+        return hydrated
@@ -0,0 +1,146 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from rag.bm25_index import BM25Index, BM25Snapshot, get_bm25_index
+from rag.hybrid_retrieval import HybridRetriever
+from rag.reranker import BaseReranker, get_reranker
+from rag.retriever import Retriever
+from vectorstore.base import VectorStore
+from vectorstore.factory import get_vector_store
+
+
+@dataclass(frozen=True)
+class RetrievalSnapshot:
+    """
+    An immutable, consistent view of the corpus. A request should take one
+    snapshot and use it throughout, so its vector and BM25 searches see the
+    same set of chunks even while ingests are running.
+    """
+
+    generation: int
+    created_at: float
+    as_of: object  # vector store watermark
+    bm25: BM25Snapshot
+    retriever: Retriever
+    hybrid: HybridRetriever
+
+
+class RetrievalService:
+    """
+    Process-wide owner of the retrieval stack: one vector store, one BM25
+    index and one reranker, shared by every request.
+
+    Readers call `current()` and get the latest snapshot; there is no
+    per-request setup. `refresh()` builds a new snapshot and swaps it in
+    atomically. Snapshots are thin (watermarks plus statistics), so old and
+    new generations share all index data.
+
+    Chunks of an ingest that is still running never become visible: the
+    visible watermark is capped at the position where the oldest in-flight
+    ingest started, and the ingestion pipeline triggers a refresh when each
+    document finishes (see `on_ingest`). A refresh that finds the visible
+    corpus unchanged (a no-op re-ingest, a failed run whose chunks were
+    discarded) keeps the current snapshot and generation, so generation-
+    keyed caches are not invalidated for nothing.
+    """
+
+    def __init__(
+        self,
+        store: Optional[VectorStore] = None,
+        bm25: Optional[BM25Index] = None,
+        reranker: Optional[BaseReranker] = None,
+    ):
+        self.store = store or get_vector_store()
+        self.bm25 = bm25 or get_bm25_index()
+        self.reranker = reranker or get_reranker()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Tuple[object, int]] = {}
+        self._snapshot: Optional[RetrievalSnapshot] = None
+        self._generation = 0
+        self._signature: Optional[tuple] = None
+
+    def start(self) -> "RetrievalService":
+        """Warm the shared indexes and publish the first snapshot."""
+        self.bm25.backfill_from(self.store)
+        self.refresh()
+        return self
+
+    def current(self) -> RetrievalSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.refresh()
+        return snapshot
+
+    def refresh(self) -> RetrievalSnapshot:
+        """Publish a new snapshot covering every completed write, if there are any."""
+        with self._lock:
+            as_of, max_doc_id = self.store.watermark(), self.bm25.watermark()
+            for started_as_of, started_doc_id in self._in_flight.values():
+                as_of = min(as_of, started_as_of)
+                max_doc_id = min(max_doc_id, started_doc_id)
+
+            bm25_snapshot = self.bm25.snapshot(max_doc_id)
+            # Every chunk write goes to both indexes; BM25's visible statistics
+            # plus the store's revision change whenever chunks were added,
+            # replaced or removed
+            signature = (bm25_snapshot, self.store.revision())
+            if self._snapshot is not None and signature == self._signature:
+                return self._snapshot
+            self._signature = signature
+            retriever = Retriever(self.store, self.bm25, as_of=as_of, bm25_snapshot=bm25_snapshot)
+            self._generation += 1
+            snapshot = RetrievalSnapshot(
+                generation=self._generation,
+                created_at=time.time(),
+                as_of=as_of,
+                bm25=bm25_snapshot,
+                retriever=retriever,
+                hybrid=HybridRetriever(retriever, self.reranker),
+            )
+            self._snapshot = snapshot
+        return snapshot
+
+    def on_ingest(self, event: str, run_id: str) -> None:
+        """IngestionPipeline listener: hide in-flight writes, refresh on completion."""
+        if event == "started":
+            with self._lock:
+                self._in_flight[run_id] = (self.store.watermark(), self.bm25.watermark())
+        elif event == "finished":
+            with self._lock:
+                self._in_flight.pop(run_id, None)
+            self.refresh()
+
+    def stats(self) -> dict:
+        snapshot = self.current()
+        return {
+            "generation": snapshot.generation,
+            "created_at": snapshot.created_at,
+            "bm25_docs": snapshot.bm25.num_docs,
+            "ingests_in_flight": len(self._in_flight),
+        }
+
+
+# --------------------------
+# Process-wide shared instance
+# --------------------------
+_service: Optional[RetrievalService] = None
+_service_lock = threading.Lock()
+
+
+def get_retrieval_service() -> RetrievalService:
+    """Create and start the shared service on first use."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = RetrievalService().start()
+    return _service
+
+
+def shutdown_retrieval_service() -> None:
+    """Drop the shared service; the next get_retrieval_service() starts a fresh one."""
+    global _service
+    with _service_lock:
+        _service = None
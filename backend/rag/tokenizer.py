@@ -0,0 +1,45 @@
+import re
+from typing import List
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Longest suffixes first so "ational" wins over "al"
+_SUFFIXES = (
+    "ational", "ization", "fulness", "iveness", "ousness",
+    "ations", "ation", "ments", "ment", "ness", "ings", "ing",
+    "ies", "ied", "ers", "er", "ed", "ly", "es", "s",
+)
+
+
+def light_stem(token: str) -> str:
+    """Cheap suffix-stripping stemmer; keeps at least a 3-character stem."""
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[: -len(suffix)]
+    return token
+
+
+class Tokenizer:
+    """
+    Lexical tokenizer shared by BM25 indexing and querying.
+
+    The same instance (or one with the same `signature`) must be used on
+    both sides, otherwise query terms won't line up with indexed postings.
+    """
+
+    def __init__(self, lowercase: bool = True, strip_punctuation: bool = True, stem: bool = False):
+        self.lowercase = lowercase
+        self.strip_punctuation = strip_punctuation
+        self.stem = stem
+
+    @property
+    def signature(self) -> str:
+        return f"lower={int(self.lowercase)};punct={int(self.strip_punctuation)};stem={int(self.stem)}"
+
+    def __call__(self, text: str) -> List[str]:
+        if self.lowercase:
+            text = text.lower()
+        tokens = _WORD_RE.findall(text) if self.strip_punctuation else text.split()
+        if self.stem:
+            tokens = [light_stem(t) for t in tokens]
+        return tokens
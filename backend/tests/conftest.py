@@ -0,0 +1,33 @@
+"""
+Shared fixtures. The fake OpenAI server is started and the environment is
+set here, before any test module imports `config`, so every client in the
+process talks to it and all state lands in a throwaway DATA_DIR.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from bench.fake_openai import serve_in_background  # noqa: E402
+
+_server = serve_in_background(port=0, dim=64)
+os.environ.update(
+    OPENAI_BASE_URL=f"http://127.0.0.1:{_server.server_port}/v1",
+    OPENAI_API_KEY="fake",
+    DATA_DIR=tempfile.mkdtemp(prefix="rag-tests-"),
+    VECTOR_BACKEND="local",
+)
+
+
+@pytest.fixture
+def fake_openai():
+    """The fake API server, with injected failures and counters reset per test."""
+    with _server.lock:
+        _server.failures.clear()
+        for key in _server.stats:
+            _server.stats[key] = 0
+    return _server
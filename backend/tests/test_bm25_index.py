@@ -0,0 +1,126 @@
+import math
+from collections import Counter
+
+import pytest
+
+from rag.bm25_index import BM25Index
+from rag.tokenizer import Tokenizer
+
+DOCS = {
+    "a": "the quick brown fox jumps over the lazy dog",
+    "b": "a quick brown dog",
+    "c": "foxes and dogs are animals",
+    "d": "the fox",
+    "e": "completely unrelated text about databases",
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = BM25Index(str(tmp_path / "bm25.sqlite3"), tokenizer=Tokenizer())
+    idx.add(list(DOCS.values()), list(DOCS))
+    yield idx
+    idx.close()
+
+
+def reference_scores(query, docs, k1=1.5, b=0.75):
+    tokenize = Tokenizer()
+    tokens = {cid: tokenize(text) for cid, text in docs.items()}
+    avgdl = sum(map(len, tokens.values())) / len(tokens)
+    scores = {}
+    for cid, toks in tokens.items():
+        tf = Counter(toks)
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in t for t in tokens.values())
+            if not tf[term]:
+                continue
+            idf = math.log1p((len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * tf[term] * (k1 + 1) / (tf[term] + k1 * (1 - b + b * len(toks) / avgdl))
+        if score:
+            scores[cid] = score
+    return scores
+
+
+@pytest.mark.parametrize("query", ["fox", "quick dog", "brown fox jumps", "databases"])
+def test_scores_match_bm25(index, query):
+    expected = reference_scores(query, DOCS)
+    results = index.search(query, k=10)
+    assert {cid for cid, _ in results} == set(expected)
+    for cid, score in results:
+        assert score == pytest.approx(expected[cid])
+
+
+def test_top_k_is_best_first(index):
+    expected = sorted(reference_scores("the quick brown fox dog", DOCS).items(), key=lambda kv: -kv[1])
+    for k in (1, 2, 3):
+        results = index.search("the quick brown fox dog", k=k)
+        assert [cid for cid, _ in results] == [cid for cid, _ in expected[:k]]
+        assert [s for _, s in results] == sorted((s for _, s in results), reverse=True)
+
+
+def test_query_is_tokenized_like_documents(index):
+    assert [cid for cid, _ in index.search("FOX!", k=10)] == [cid for cid, _ in index.search("fox", k=10)]
+
+
+def test_unknown_terms_and_empty_queries(index):
+    assert index.search("zebra", k=5) == []
+    assert index.search("", k=5) == []
+    assert index.search("fox", k=0) == []
+
+
+def test_add_skips_known_ids_and_remove_updates_stats(index):
+    assert index.add(["the fox again"], ["d"]) == 0
+    assert index.num_docs == 5
+
+    assert index.remove(["d", "missing"]) == 1
+    assert index.num_docs == 4
+    remaining = {cid: text for cid, text in DOCS.items() if cid != "d"}
+    for cid, score in index.search("fox", k=10):
+        assert score == pytest.approx(reference_scores("fox", remaining)[cid])
+
+
+def test_snapshot_hides_later_additions(index):
+    snapshot = index.snapshot()
+    index.add(["a fox in a new document"], ["f"])
+    assert "f" not in {cid for cid, _ in index.search("fox", k=10, snapshot=snapshot)}
+    assert "f" in {cid for cid, _ in index.search("fox", k=10)}
+
+
+def test_index_persists_across_reopen(index):
+    reopened = BM25Index(index.path, tokenizer=Tokenizer())
+    try:
+        assert (reopened.num_docs, reopened.total_len) == (index.num_docs, index.total_len)
+        assert reopened.search("quick dog", k=3) == index.search("quick dog", k=3)
+    finally:
+        reopened.close()
+
+
+def test_reindex_keeps_doc_ids_and_snapshots_valid(index):
+    snapshot = index.snapshot()
+    doc_ids = index._conn.execute("SELECT chunk_id, doc_id FROM docs").fetchall()
+
+    stemmed = BM25Index(index.path, tokenizer=Tokenizer(stem=True))
+    try:
+        assert stemmed._conn.execute("SELECT chunk_id, doc_id FROM docs").fetchall() == doc_ids
+        assert stemmed.watermark() == snapshot.max_doc_id
+        assert stemmed.num_docs == len(DOCS)
+        # "foxes" and "dogs" now stem onto "fox" and "dog"
+        assert "c" in {cid for cid, _ in stemmed.search("fox", k=10, snapshot=snapshot)}
+    finally:
+        stemmed.close()
+
+
+def test_stopword_like_terms_are_skipped_in_large_corpora(tmp_path):
+    idx = BM25Index(str(tmp_path / "df.sqlite3"), tokenizer=Tokenizer(), max_df_ratio=0.5, max_df_min_docs=4)
+    idx.add(["the cat", "the dog", "the bird", "a fish"], ["cat", "dog", "bird", "fish"])
+    try:
+        # "the" is in 3 of 4 documents: only "cat" is scored
+        assert [cid for cid, _ in idx.search("the cat", k=10)] == ["cat"]
+        # A query made only of common terms still matches
+        assert {cid for cid, _ in idx.search("the", k=10)} == {"cat", "dog", "bird"}
+
+        idx.max_df_min_docs = 5
+        assert {cid for cid, _ in idx.search("the cat", k=10)} == {"cat", "dog", "bird"}
+    finally:
+        idx.close()
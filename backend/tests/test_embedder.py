@@ -0,0 +1,97 @@
+import numpy as np
+import openai
+import pytest
+
+from bench.fake_openai import fake_embedding
+from ingestion import embedder
+from ingestion.embedder import EmbeddingEngine, embed_texts
+from ingestion.tokens import count_tokens_many
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Record retry delays instead of sleeping through them."""
+    delays = []
+    monkeypatch.setattr(embedder.time, "sleep", delays.append)
+    return delays
+
+
+def assert_embeds(texts, vectors):
+    assert len(vectors) == len(texts)
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_allclose(vector, fake_embedding(text.strip(), 64), rtol=1e-5, atol=1e-6)
+
+
+def test_embed_texts_keeps_input_order(fake_openai):
+    texts = ["alpha", "  beta  ", "gamma", "alpha", "delta epsilon", "beta"]
+    assert_embeds(texts, embed_texts(texts))
+    # Duplicates within a call are sent once
+    assert fake_openai.stats["embedded_inputs"] == 4
+
+
+def test_embed_texts_serves_repeats_from_cache(fake_openai):
+    embed_texts(["cached once", "cached twice"])
+    before = fake_openai.stats["embedded_inputs"]
+    texts = ["cached twice", "not cached yet", "cached once"]
+    assert_embeds(texts, embed_texts(texts))
+    assert fake_openai.stats["embedded_inputs"] == before + 1
+
+
+def test_embed_texts_rejects_empty_strings_instead_of_dropping_them(fake_openai):
+    with pytest.raises(ValueError, match=r"\[1, 3\]"):
+        embed_texts(["one", "", "two", "   \n"])
+    assert fake_openai.stats["requests"] == 0
+
+
+def test_batches_respect_token_budget(fake_openai):
+    texts = [f"chunk {i}" + " word" * (i % 7) for i in range(40)]
+    engine = EmbeddingEngine(max_batch_tokens=20, max_batch_items=5, concurrency=4)
+    batches = engine.make_batches(texts)
+
+    tokens = count_tokens_many(texts, engine.model)
+    assert sorted(i for batch in batches for i in batch) == list(range(len(texts)))
+    for batch in batches:
+        assert len(batch) <= 5
+        assert len(batch) == 1 or sum(tokens[i] for i in batch) <= 20
+
+    vectors = engine.embed(texts)
+    assert_embeds(texts, vectors)
+    assert fake_openai.stats["requests"] == len(batches)
+
+
+def test_oversized_text_gets_its_own_batch():
+    engine = EmbeddingEngine(max_batch_tokens=10)
+    batches = engine.make_batches(["short", "long " * 50, "short again"])
+    assert batches == [[0], [1], [2]]
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503])
+def test_retries_rate_limits_and_server_errors(fake_openai, no_backoff, status):
+    fake_openai.fail_next(status, status)
+    texts = ["retry me", "and me"]
+    assert_embeds(texts, EmbeddingEngine(max_retries=3).embed(texts))
+    assert fake_openai.stats["requests"] == 3
+    assert len(no_backoff) == 2
+
+
+def test_gives_up_after_max_retries(fake_openai, no_backoff):
+    fake_openai.fail_next(500, 500, 500)
+    with pytest.raises(openai.InternalServerError):
+        EmbeddingEngine(max_retries=2).embed(["never embedded"])
+    assert fake_openai.stats["requests"] == 3
+
+
+def test_client_errors_are_not_retried(fake_openai, no_backoff):
+    fake_openai.fail_next(400)
+    with pytest.raises(openai.BadRequestError):
+        EmbeddingEngine(max_retries=3).embed(["bad request"])
+    assert fake_openai.stats["requests"] == 1
+    assert no_backoff == []
+
+
+def test_concurrent_batches_retry_independently(fake_openai, no_backoff):
+    texts = [f"text number {i}" for i in range(30)]
+    fake_openai.fail_next(429, 503)
+    engine = EmbeddingEngine(max_batch_tokens=1000, max_batch_items=3, concurrency=4, max_retries=3)
+    assert_embeds(texts, engine.embed(texts))
+    assert fake_openai.stats["requests"] == 10 + 2
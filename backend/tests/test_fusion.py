@@ -0,0 +1,56 @@
+import pytest
+
+from rag.fusion import fuse, reciprocal_rank_fusion, weighted_score_fusion
+
+RANKINGS = {
+    "vector": [("a", 0.9), ("b", 0.8), ("c", 0.1)],
+    "bm25": [("c", 12.0), ("a", 7.0), ("d", 3.0)],
+}
+
+
+def by_id(results):
+    return {r["id"]: r for r in results}
+
+
+def test_rrf_scores_are_summed_reciprocal_ranks():
+    fused = by_id(reciprocal_rank_fusion(RANKINGS, k=60))
+    assert fused["a"]["score"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused["b"]["score"] == pytest.approx(1 / 62)
+    assert fused["c"]["score"] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused["d"]["score"] == pytest.approx(1 / 63)
+
+
+def test_rrf_orders_by_fused_score_and_dedupes_on_id():
+    fused = reciprocal_rank_fusion(RANKINGS)
+    assert [r["id"] for r in fused] == ["a", "c", "b", "d"]
+
+
+def test_rrf_reports_per_source_breakdown():
+    fused = by_id(reciprocal_rank_fusion(RANKINGS))
+    assert fused["a"]["ranks"] == {"vector": 1, "bm25": 2}
+    assert fused["a"]["scores"] == {"vector": 0.9, "bm25": 7.0}
+    assert fused["d"]["ranks"] == {"bm25": 3}
+
+
+def test_rrf_weights_and_repeated_ids():
+    fused = by_id(reciprocal_rank_fusion(
+        {"vector": [("a", 1.0), ("a", 0.5), ("b", 0.4)]}, k=10, weights={"vector": 2.0},
+    ))
+    # A repeated id keeps its best rank; later entries keep their own rank
+    assert fused["a"]["ranks"] == {"vector": 1}
+    assert fused["a"]["score"] == pytest.approx(2 / 11)
+    assert fused["b"]["score"] == pytest.approx(2 / 13)
+
+
+def test_weighted_fusion_normalizes_each_source():
+    fused = by_id(weighted_score_fusion(RANKINGS, weights={"vector": 1.0, "bm25": 0.5}))
+    assert fused["a"]["score"] == pytest.approx(1.0 + 0.5 * (7 - 3) / 9)
+    assert fused["c"]["score"] == pytest.approx(0.0 + 0.5 * 1.0)
+    assert fused["d"]["score"] == pytest.approx(0.0)
+
+
+def test_fuse_dispatches_and_rejects_unknown_methods():
+    assert fuse(RANKINGS, "rrf") == reciprocal_rank_fusion(RANKINGS)
+    assert fuse(RANKINGS, "weighted") == weighted_score_fusion(RANKINGS)
+    with pytest.raises(ValueError):
+        fuse(RANKINGS, "borda")
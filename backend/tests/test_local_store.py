@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from vectorstore.local_store import LocalVectorStore
+
+
+def unit(i, dim=8):
+    v = np.zeros(dim, dtype=np.float32)
+    v[i % dim] = 1.0
+    return v
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalVectorStore(str(tmp_path / "vectors"), min_train=10_000, quantization="none")
+
+
+def test_upsert_of_existing_id_is_invisible_to_older_snapshots(store):
+    store.upsert(["a", "b"], ["old a", "b"], [unit(0), unit(1)])
+    as_of = store.watermark()
+
+    store.upsert(["a"], ["new a"], [unit(2)])
+    assert store.count() == 2
+    assert store.get(ids=["a"])["documents"] == ["new a"]
+
+    # The snapshot neither sees the new content nor the tombstoned old row
+    assert [h["id"] for h in store.query(unit(2), k=5, as_of=as_of)] == ["b"]
+    assert [h["text"] for h in store.query(unit(2), k=1)] == ["new a"]
+
+
+def test_revision_changes_on_replace_but_not_on_noop(store):
+    store.upsert(["a", "b"], ["a", "b"], [unit(0), unit(1)])
+    before = store.revision()
+    store.delete(["missing"])
+    assert store.revision() == before
+
+    store.upsert(["a"], ["a again"], [unit(0)])
+    assert store.revision() != before
+    assert store.revision()[0] == before[0]
+
+
+def test_replaced_rows_stay_dead_after_reopen(store):
+    store.upsert(["a", "b"], ["old a", "b"], [unit(0), unit(1)])
+    store.upsert(["a"], ["new a"], [unit(0)])
+    reopened = LocalVectorStore(store.path, min_train=10_000, quantization="none")
+    assert reopened.count() == 2
+    assert [h["text"] for h in reopened.query(unit(0), k=5)] == ["new a", "b"]
@@ -0,0 +1,287 @@
+"""
+Span-based request tracing and process-wide metrics.
+
+    with span("vector_search", k=k) as s:
+        hits = ...
+        s.set(candidates=len(hits))
+    count("embedding_cache_lookups_total", hits, result="hit")
+
+Every span is observed in the `stage_duration_seconds{stage}` histogram;
+when the code runs inside a trace (see `trace()` / `start_trace()`), the
+span and counters are also recorded there for a per-request breakdown.
+The current trace lives in a context variable, so it follows asyncio
+tasks and `asyncio.to_thread` calls without being passed around.
+
+`render()` produces the Prometheus text exposition format for GET /metrics.
+A span costs two clock reads and one short lock; TRACING_ENABLED=false
+turns spans into no-ops (counters are kept).
+"""
+import asyncio
+import contextvars
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import TRACING_ENABLED, TRACE_MAX_SPANS
+
+# Seconds; wide enough for sub-millisecond BM25 lookups and multi-second LLM calls
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = ['{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+             for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    """Counters, histograms and callback gauges, rendered in Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = {}
+        self._gauges: Dict[str, Callable[[], Dict[Labels, float]]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # len(BUCKETS) bucket counts (non-cumulative), then +Inf, sum
+            row = series.get(key)
+            if row is None:
+                row = series[key] = [0.0] * (len(BUCKETS) + 2)
+            row[bisect_left(BUCKETS, value)] += 1
+            row[-1] += value
+
+    def gauge(self, name: str, fn: Callable[[], Dict[Labels, float]], help_text: str = "") -> None:
+        """Register a gauge read at render time; `fn` returns {labels: value}."""
+        self._gauges[name] = fn
+        self.describe(name, "gauge", help_text)
+
+    def value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels(labels), 0.0)
+
+    def render(self) -> str:
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self._histograms.items()}
+        lines: List[str] = []
+
+        def header(name: str, kind: str) -> None:
+            help_text = self._help.get(name, (kind, ""))[1]
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for name in sorted(counters):
+            header(name, "counter")
+            for labels, value in sorted(counters[name].items()):
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for name in sorted(histograms):
+            header(name, "histogram")
+            for labels, row in sorted(histograms[name].items()):
+                cumulative = 0.0
+                for bound, n in zip(BUCKETS + ("+Inf",), row):
+                    cumulative += n
+                    le = 'le="{}"'.format(bound if isinstance(bound, str) else f"{bound:g}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative:g}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {row[-1]:.6g}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative:g}")
+        for name in sorted(self._gauges):
+            try:
+                values = self._gauges[name]()
+            except Exception:
+                continue  # a broken collector must not take /metrics down
+            header(name, "gauge")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+for _name, _kind, _help in [
+    ("stage_duration_seconds", "histogram", "Wall time of traced stages (spans)."),
+    ("stage_errors_total", "counter", "Traced stages that raised."),
+    ("http_requests_total", "counter", "HTTP requests by route and status."),
+    ("http_request_duration_seconds", "histogram", "HTTP request time, including streamed bodies."),
+    ("llm_http_responses_total", "counter", "Chat API responses by status; 429/5xx are retried."),
+    ("llm_tokens_total", "counter", "Chat tokens by model and kind (streamed: one per delta)."),
+    ("embedding_requests_total", "counter", "Embedding API calls, including retries."),
+    ("embedding_retries_total", "counter", "Embedding API calls retried after a transient error."),
+    ("embedding_tokens_total", "counter", "Tokens sent to the embedding API."),
+    ("embedding_cache_lookups_total", "counter", "Embedding cache lookups by result."),
+    ("answer_cache_lookups_total", "counter", "Answer cache lookups by endpoint and result."),
+    ("retrieval_candidates_total", "counter", "Candidates returned by vector and BM25 search."),
+    ("query_expansions_total", "counter", "LLM query expansions by mode and result."),
+    ("agent_plans_total", "counter", "Agent plans by action and planner (router or llm)."),
+    ("agent_rag_retries_total", "counter", "Answers redone with RAG after evaluation."),
+    ("ingest_stage_items_total", "counter", "Items produced per ingestion stage."),
+    ("ingest_stage_busy_seconds_total", "counter", "Busy time per ingestion stage."),
+    ("ingest_run_seconds", "histogram", "Wall time of ingestion runs."),
+]:
+    METRICS.describe(_name, _kind, _help)
+
+
+class Trace:
+    """Spans and counters recorded while handling one request."""
+
+    def __init__(self, max_spans: int = TRACE_MAX_SPANS) -> None:
+        self.id = uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.max_spans = max_spans
+        self.spans: List[dict] = []
+        self.dropped = 0
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, begin: float, seconds: float, attrs: dict) -> None:
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            self.spans.append({
+                "name": name,
+                "start_ms": round(1000 * (begin - self.start), 3),
+                "ms": round(1000 * seconds, 3),
+                **attrs,
+            })
+
+    def add(self, name: str, value: float) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0.0) + value
+
+    def breakdown(self) -> dict:
+        """{"trace_id", "total_ms", "stages_ms": summed per name, "counters", "spans"}."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+            counters = dict(self.counters)
+        stages: Dict[str, float] = {}
+        for s in spans:
+            stages[s["name"]] = round(stages.get(s["name"], 0.0) + s["ms"], 3)
+        result = {
+            "trace_id": self.id,
+            "total_ms": round(1000 * (time.perf_counter() - self.start), 3),
+            "stages_ms": stages,
+            "counters": counters,
+            "spans": spans,
+        }
+        if self.dropped:
+            result["dropped_spans"] = self.dropped
+        return result
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def start_trace() -> Trace:
+    """
+    Make a new trace current for the rest of this context (for async
+    generators, which cannot reliably reset a context variable).
+    """
+    t = Trace()
+    _current.set(t)
+    return t
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    t = Trace()
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "begin")
+
+    def __init__(self, name: str, attrs: dict) -> None:
+        self.name = name
+        self.attrs = attrs
+        self.begin = time.perf_counter()
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+
+class _NoopSpan:
+    begin = 0.0
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """Time the enclosed block as stage `name`; attributes end up in the trace only."""
+    if not TRACING_ENABLED:
+        yield _NOOP
+        return
+    s = Span(name, attrs)
+    begin = s.begin
+    try:
+        yield s
+    except (GeneratorExit, asyncio.CancelledError):
+        # Abandoned (client went away, speculative work not needed): not a failure
+        s.attrs["cancelled"] = True
+        raise
+    except BaseException as e:
+        s.attrs["error"] = type(e).__name__
+        METRICS.inc("stage_errors_total", stage=name, error=type(e).__name__)
+        raise
+    finally:
+        seconds = time.perf_counter() - begin
+        METRICS.observe("stage_duration_seconds", seconds, stage=name)
+        t = _current.get()
+        if t is not None:
+            t.add_span(name, begin, seconds, s.attrs)
+
+
+def count(name: str, value: float = 1.0, **labels) -> None:
+    """Add to counter `name` and, inside a trace, to the request's own tally."""
+    if not value:
+        return
+    METRICS.inc(name, value, **labels)
+    t = _current.get()
+    if t is not None:
+        key = name + "".join(f".{v}" for _, v in _labels(labels))
+        t.add(key, value)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    METRICS.observe(name, value, **labels)
+
+
+def render() -> str:
+    return METRICS.render()
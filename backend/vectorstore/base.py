@@ -0,0 +1,89 @@
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence
+
+
+class VectorStore:
+    """
+    Contract shared by every vector store backend.
+
+    Chunks are addressed by string ids. Each chunk carries its text, a
+    metadata dict (at least "source", "source_type" and "ingested_at") and
+    an embedding. Filters (`where`) use the Chroma operator syntax:
+
+        {"source_type": "pdf", "ingested_at": {"$gte": 1700000000}}
+
+    Several top-level keys are combined with AND.
+
+    Readers can pin a point in time: `watermark()` returns an opaque,
+    monotonically increasing marker of the store's write position, and
+    `query(..., as_of=mark)` ignores chunks added after it.
+    """
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        chunks: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        metadatas: Optional[Sequence[dict]] = None,
+    ) -> None:
+        raise NotImplementedError
+
+    def add(self, chunks, embeddings, ids=None, metadatas=None) -> List[str]:
+        """Insert chunks, minting random ids when none are given. Returns the ids."""
+        ids = list(ids) if ids is not None else [uuid.uuid4().hex for _ in chunks]
+        self.upsert(ids, chunks, embeddings, metadatas)
+        return ids
+
+    def query(
+        self,
+        embedding: Sequence[float],
+        k: int = 5,
+        where: Optional[dict] = None,
+        as_of=None,
+    ) -> List[dict]:
+        """Nearest chunks as [{"id", "text", "score", "metadata"}], best first (cosine similarity)."""
+        raise NotImplementedError
+
+    def watermark(self):
+        """Current write position, for use as `as_of` in query()."""
+        raise NotImplementedError
+
+    def search(self, embedding: Sequence[float], k: int = 5) -> List[str]:
+        """Texts of the k nearest chunks."""
+        return [hit["text"] for hit in self.query(embedding, k)]
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[dict] = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+    ) -> Dict[str, list]:
+        """Return {"ids", "documents", "metadatas", "embeddings"} (only included keys are filled)."""
+        raise NotImplementedError
+
+    def delete(self, ids: Sequence[str]) -> None:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def revision(self):
+        """
+        A value that changes whenever the set of live chunks does, so a
+        reader can tell that a new snapshot would see something different.
+        """
+        return self.count()
+
+
+def with_defaults(metadatas: Optional[Sequence[dict]], n: int) -> List[dict]:
+    """Fill in the metadata every backend relies on for filtering."""
+    now = time.time()
+    out = []
+    for i in range(n):
+        meta = dict(metadatas[i]) if metadatas is not None and metadatas[i] else {}
+        meta.setdefault("source", "")
+        meta.setdefault("source_type", "")
+        meta.setdefault("ingested_at", now)
+        out.append(meta)
+    return out
@@ -0,0 +1,92 @@
+import time
+from typing import Dict, List, Optional, Sequence
+
+import chromadb
+
+from config import CHROMA_PATH, CHROMA_COLLECTION
+from vectorstore.base import VectorStore, with_defaults
+
+# Chroma caps the number of records per write call
+_MAX_BATCH = 5000
+
+
+def _chroma_where(where: Optional[dict]) -> Optional[dict]:
+    """Chroma requires an explicit $and when filtering on several keys."""
+    if not where or len(where) <= 1:
+        return where or None
+    clauses = []
+    for key, cond in where.items():
+        if isinstance(cond, dict) and len(cond) > 1:
+            clauses.extend({key: {op: value}} for op, value in cond.items())
+        else:
+            clauses.append({key: cond})
+    return {"$and": clauses}
+
+
+class ChromaStore(VectorStore):
+    """Adapter over a persistent Chroma collection (cosine space)."""
+
+    def __init__(self, path: str = CHROMA_PATH, collection: str = CHROMA_COLLECTION):
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(
+            name=collection, metadata={"hnsw:space": "cosine"}
+        )
+
+    def upsert(self, ids, chunks, embeddings, metadatas=None) -> None:
+        metadatas = with_defaults(metadatas, len(ids))
+        for start in range(0, len(ids), _MAX_BATCH):
+            end = start + _MAX_BATCH
+            self.collection.upsert(
+                ids=list(ids[start:end]),
+                documents=list(chunks[start:end]),
+                embeddings=[list(map(float, e)) for e in embeddings[start:end]],
+                metadatas=metadatas[start:end],
+            )
+
+    def query(self, embedding, k: int = 5, where: Optional[dict] = None, as_of=None) -> List[dict]:
+        if k <= 0:
+            return []
+        where = _chroma_where(where)
+        if as_of is not None:
+            # Chroma has no snapshots; chunks written after the mark are filtered by time
+            visible = {"ingested_at": {"$lte": as_of}}
+            where = {"$and": [where, visible]} if where else visible
+        results = self.collection.query(
+            query_embeddings=[list(map(float, embedding))],
+            n_results=k,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            {"id": chunk_id, "text": text, "score": 1.0 - distance, "metadata": meta or {}}
+            for chunk_id, text, meta, distance in zip(
+                results["ids"][0],
+                results["documents"][0],
+                results["metadatas"][0],
+                results["distances"][0],
+            )
+        ]
+
+    def watermark(self) -> float:
+        # Every chunk is stamped with ingested_at when it is written (see with_defaults)
+        return time.time()
+
+    def get(self, ids=None, where=None, include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, list]:
+        results = self.collection.get(
+            ids=list(ids) if ids is not None else None,
+            where=_chroma_where(where),
+            include=list(include),
+        )
+        return {
+            "ids": results["ids"],
+            "documents": results.get("documents") or [],
+            "metadatas": results.get("metadatas") or [],
+            "embeddings": results.get("embeddings") or [],
+        }
+
+    def delete(self, ids) -> None:
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def count(self) -> int:
+        return self.collection.count()
@@ -0,0 +1,28 @@
+import threading
+from typing import Optional
+
+from config import VECTOR_BACKEND
+from vectorstore.base import VectorStore
+
+_store: Optional[VectorStore] = None
+_store_lock = threading.Lock()
+
+
+def create_vector_store(backend: str = VECTOR_BACKEND) -> VectorStore:
+    if backend == "chroma":
+        from vectorstore.chroma_store import ChromaStore
+        return ChromaStore()
+    if backend == "local":
+        from vectorstore.local_store import LocalVectorStore
+        return LocalVectorStore()
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+
+
+def get_vector_store() -> VectorStore:
+    """One store instance per process, shared by ingestion and retrieval."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_vector_store()
+    return _store
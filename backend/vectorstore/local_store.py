@@ -0,0 +1,626 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import (
+    LOCAL_VECTOR_PATH,
+    IVF_MIN_TRAIN,
+    IVF_NPROBE,
+    VECTOR_QUANTIZATION,
+    VECTOR_TRUNCATE_DIM,
+    VECTOR_PQ_SUBVECTORS,
+    VECTOR_RESCORE_FACTOR,
+)
+from vectorstore.base import VectorStore, with_defaults
+from vectorstore.quantization import Codec, make_codec
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = {"id", "source", "source_type", "ingested_at"}
+_KEY_RE = re.compile(r"^\w+$")
+_OPS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _grow(assign: np.ndarray, capacity: int) -> np.ndarray:
+    if len(assign) >= capacity:
+        return assign
+    return np.concatenate([assign, np.full(capacity - len(assign), -1, dtype=np.int32)])
+
+
+def _where_sql(where: Optional[dict]) -> Tuple[str, list]:
+    """Translate a Chroma-style filter into a SQL WHERE clause."""
+    if not where:
+        return "1", []
+    clauses, params = [], []
+    for key, cond in where.items():
+        if key == "$and":
+            for sub in cond:
+                sql, p = _where_sql(sub)
+                clauses.append(f"({sql})")
+                params.extend(p)
+            continue
+        if not _KEY_RE.match(key):
+            raise ValueError(f"Invalid metadata key: {key!r}")
+        col = key if key in _COLUMNS else f"json_extract(metadata, '$.{key}')"
+        conds = cond if isinstance(cond, dict) else {"$eq": cond}
+        for op, value in conds.items():
+            if op in _OPS:
+                clauses.append(f"{col} {_OPS[op]} ?")
+                params.append(value)
+            elif op in ("$in", "$nin"):
+                placeholders = ",".join("?" * len(value)) or "NULL"
+                clauses.append(f"{col} {'IN' if op == '$in' else 'NOT IN'} ({placeholders})")
+                params.extend(value)
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+    return " AND ".join(clauses) or "1", params
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store: unit-normalized float32 vectors in a
+    memory-mapped matrix (one row per chunk), chunk text and metadata in
+    SQLite, and an IVF index (spherical k-means centroids + inverted lists)
+    once the corpus passes IVF_MIN_TRAIN chunks. Smaller corpora and
+    selective filters are searched exactly with one matrix-vector product.
+
+    With a quantization codec (vectorstore.quantization), trained along
+    with the IVF index, candidates are first scored on compact codes kept
+    in their own memory-mapped file; only the best k * rescore rows are
+    read from the full-precision matrix and re-scored exactly.
+
+    Training (k-means and codec fitting) works on a snapshot outside the
+    store lock; upserts that trigger it start it in a background thread,
+    and queries keep using the previous index until the new one is
+    swapped in.
+    """
+
+    SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS chunks (
+    row INTEGER PRIMARY KEY,
+    id TEXT UNIQUE NOT NULL,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    source TEXT,
+    source_type TEXT,
+    ingested_at REAL,
+    list_id INTEGER NOT NULL DEFAULT -1
+);
+CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+CREATE INDEX IF NOT EXISTS chunks_source_type ON chunks (source_type);
+CREATE INDEX IF NOT EXISTS chunks_ingested_at ON chunks (ingested_at);
+"""
+
+    # Filters matching at most this many chunks are searched exactly
+    EXACT_FILTER_LIMIT = 50_000
+    SQL_BATCH = 500
+    # Rows used to fit codec parameters (int8 scales, PQ codebooks)
+    CODEC_TRAIN_SAMPLE = 16_384
+
+    def __init__(
+        self,
+        path: str = LOCAL_VECTOR_PATH,
+        nprobe: int = IVF_NPROBE,
+        min_train: int = IVF_MIN_TRAIN,
+        quantization: str = VECTOR_QUANTIZATION,
+        truncate_dim: int = VECTOR_TRUNCATE_DIM,
+        pq_subvectors: int = VECTOR_PQ_SUBVECTORS,
+        rescore: int = VECTOR_RESCORE_FACTOR,
+    ):
+        self.path = path
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.quantization = (quantization, truncate_dim, pq_subvectors)
+        self.rescore = max(1, rescore)
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(path, "meta.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._centroids_path = os.path.join(path, "centroids.npy")
+        self.dim = int(self._get_meta("dim", "0"))
+        self._trained_n = int(self._get_meta("trained_n", "0"))
+        self._vectors: Optional[np.memmap] = None
+        self._capacity = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._codec: Optional[Codec] = None
+        self._codes: Optional[np.memmap] = None
+        # Serializes training runs; rows written while one runs are redone at the swap
+        self._train_lock = threading.Lock()
+        self._training = False
+        self._pending: Optional[List[np.ndarray]] = None
+        self._trainer: Optional[threading.Thread] = None
+
+        rows = np.array(self._conn.execute("SELECT row, list_id FROM chunks").fetchall(), dtype=np.int64).reshape(-1, 2)
+        self._n = int(rows[:, 0].max()) + 1 if len(rows) else 0
+        if self.dim:
+            self._open_vectors(max(self._n, 1))
+            if os.path.exists(self._centroids_path):
+                self._centroids = np.load(self._centroids_path)
+        self._alive = np.zeros(self._capacity, dtype=bool)
+        self._assign = np.full(self._capacity, -1, dtype=np.int32)
+        self._alive[rows[:, 0]] = True
+        self._assign[rows[:, 0]] = rows[:, 1]
+        if self.dim:
+            self._load_codec()
+
+    # --------------------------
+    # Storage helpers
+    # --------------------------
+    def _get_meta(self, key: str, default: str) -> str:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value)),
+        )
+
+    def _open_vectors(self, min_rows: int) -> None:
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        capacity = size // row_bytes
+        if capacity < min_rows:
+            capacity = max(min_rows, 2 * capacity, 1024)
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        # Readers holding the previous map keep a valid view of the old rows
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+        if self._codes is not None:
+            self._open_codes()
+
+    # --------------------------
+    # Compressed codes
+    # --------------------------
+    def _codes_path(self, codec: Codec) -> str:
+        return os.path.join(self.path, f"codes.{codec.kind}")
+
+    @staticmethod
+    def _map_codes(path: str, codec: Codec, capacity: int) -> np.memmap:
+        row_bytes = codec.bytes_per_vector
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < capacity * row_bytes:
+            with open(path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        return np.memmap(path, dtype=codec.dtype, mode="r+", shape=(capacity, codec.code_dim))
+
+    def _open_codes(self) -> None:
+        self._codes = self._map_codes(self._codes_path(self._codec), self._codec, self._capacity)
+
+    def _make_codec(self) -> Optional[Codec]:
+        kind, truncate_dim, pq_subvectors = self.quantization
+        return make_codec(kind, self.dim, truncate_dim, pq_subvectors)
+
+    def _load_codec(self) -> None:
+        """Pick up codes written under the configured codec, or rebuild them if the config changed."""
+        codec = self._make_codec()
+        if codec is None:
+            return
+        state_path = os.path.join(self.path, "codec.npz")
+        if self._get_meta("codec", "") == codec.signature and os.path.exists(state_path):
+            with np.load(state_path) as state:
+                codec.load_state(dict(state))
+            self._codec = codec
+            self._open_codes()
+        elif self._centroids is not None:
+            logger.info("Vector codec changed to %s; re-encoding %d rows", codec.signature, self._n)
+            self._fit_codes(codec)
+
+    def _fit_codes(self, codec: Codec) -> None:
+        """Fit `codec` on a sample of live rows and encode every row with it (at startup)."""
+        live = np.flatnonzero(self._alive[: self._n])
+        codes_path = self._encode_codes(codec, self._vectors, live, self._capacity)
+        os.replace(codes_path, self._codes_path(codec))
+        self._install_codec(codec)
+
+    def _encode_codes(self, codec: Codec, vectors: np.ndarray, live: np.ndarray, capacity: int) -> str:
+        """Fit `codec` on a sample of `live` and encode those rows into a new codes file; returns its path."""
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(live, size=min(len(live), self.CODEC_TRAIN_SAMPLE), replace=False))
+        codec.fit(np.asarray(vectors[sample]))
+
+        path = self._codes_path(codec) + ".tmp"
+        if os.path.exists(path):
+            os.remove(path)
+        codes = self._map_codes(path, codec, capacity)
+        for start in range(0, len(live), 65536):
+            block = live[start:start + 65536]
+            codes[block] = codec.encode(np.asarray(vectors[block]))
+        codes.flush()
+        return path
+
+    def _install_codec(self, codec: Codec) -> None:
+        self._codec = codec
+        self._open_codes()
+        np.savez(os.path.join(self.path, "codec.npz"), **codec.state())
+        with self._conn:
+            self._set_meta("codec", codec.signature)
+
+    def memory_stats(self) -> Dict[str, float]:
+        """Bytes per vector scanned in the first pass vs. the full-precision rows."""
+        with self._lock:
+            full = self.dim * 4
+            scanned = self._codec.bytes_per_vector if self._codec is not None else full
+            return {
+                "codec": self._codec.signature if self._codec is not None else "none",
+                "vectors": int(self._alive[: self._n].sum()) if self.dim else 0,
+                "full_bytes_per_vector": full,
+                "scan_bytes_per_vector": scanned,
+                "compression": round(full / scanned, 2) if scanned else 0.0,
+            }
+
+    def _ensure_capacity(self, rows: int) -> None:
+        if rows <= self._capacity:
+            return
+        old = self._capacity
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._open_vectors(rows)
+        self._alive = np.concatenate([self._alive, np.zeros(self._capacity - old, dtype=bool)])
+        self._assign = np.concatenate([self._assign, np.full(self._capacity - old, -1, dtype=np.int32)])
+
+    def _rows_for_ids(self, ids: Sequence[str]) -> Dict[str, int]:
+        found = {}
+        for start in range(0, len(ids), self.SQL_BATCH):
+            batch = list(ids[start:start + self.SQL_BATCH])
+            placeholders = ",".join("?" * len(batch))
+            found.update(self._conn.execute(
+                f"SELECT id, row FROM chunks WHERE id IN ({placeholders})", batch
+            ).fetchall())
+        return found
+
+    # --------------------------
+    # Writes
+    # --------------------------
+    def upsert(self, ids, chunks, embeddings, metadatas=None) -> None:
+        if not len(ids):
+            return
+        if not (len(ids) == len(chunks) == len(embeddings)):
+            raise ValueError("ids, chunks and embeddings must have the same length.")
+
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        metadatas = with_defaults(metadatas, len(ids))
+
+        with self._lock:
+            if not self.dim:
+                self.dim = vectors.shape[1]
+                with self._conn:
+                    self._set_meta("dim", self.dim)
+                self._open_vectors(1024)
+                self._alive = np.zeros(self._capacity, dtype=bool)
+                self._assign = np.full(self._capacity, -1, dtype=np.int32)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != store dimension {self.dim}.")
+
+            # Last write wins for ids repeated within the batch. Every write
+            # gets a new row and the id's old row is tombstoned, never
+            # overwritten, so a query with as_of below the new rows cannot see
+            # the new content
+            latest = {chunk_id: i for i, chunk_id in enumerate(ids)}
+            order = np.fromiter(latest.values(), dtype=np.int64)
+            replaced = list(self._rows_for_ids(list(latest)).values())
+            rows = np.arange(self._n, self._n + len(order), dtype=np.int64)
+            n = self._n + len(order)
+
+            self._ensure_capacity(n)
+            batch = vectors[order]
+            self._vectors[rows] = batch
+            self._vectors.flush()
+            if self._codec is not None:
+                self._codes[rows] = self._codec.encode(batch)
+
+            lists = (
+                np.argmax(batch @ self._centroids.T, axis=1).astype(np.int32)
+                if self._centroids is not None
+                else np.full(len(rows), -1, dtype=np.int32)
+            )
+
+            with self._conn:
+                self._conn.executemany("DELETE FROM chunks WHERE row = ?", [(r,) for r in replaced])
+                self._conn.executemany(
+                    "INSERT INTO chunks "
+                    "(row, id, text, metadata, source, source_type, ingested_at, list_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            int(row), ids[i], chunks[i], json.dumps(metadatas[i]),
+                            metadatas[i]["source"], metadatas[i]["source_type"],
+                            metadatas[i]["ingested_at"], int(list_id),
+                        )
+                        for row, i, list_id in zip(rows, order, lists)
+                    ],
+                )
+
+            self._alive[replaced] = False
+            self._alive[rows] = True
+            self._assign[rows] = lists
+            self._n = n
+            self._lists = None
+            if self._pending is not None:
+                self._pending.append(rows)
+
+            alive = int(self._alive.sum())
+            if (
+                not self._training
+                and alive >= self.min_train
+                and (self._centroids is None or alive > 2 * self._trained_n)
+            ):
+                self._training = True
+                self._trainer = threading.Thread(target=self._train_in_background, name="ivf-train", daemon=True)
+                self._trainer.start()
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            rows = list(self._rows_for_ids(list(ids)).values())
+            if not rows:
+                return
+            with self._conn:
+                self._conn.executemany("DELETE FROM chunks WHERE row = ?", [(r,) for r in rows])
+            self._alive[rows] = False
+            self._lists = None
+
+    # --------------------------
+    # IVF index
+    # --------------------------
+    def _train_in_background(self) -> None:
+        try:
+            self.train()
+        except Exception:
+            logger.exception("Vector index training failed")
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> bool:
+        """Block until a background training run (if any) is done; False on timeout."""
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+            return not trainer.is_alive()
+        return True
+
+    def train(self, iterations: int = 10, seed: int = 0) -> None:
+        """
+        (Re)build IVF centroids with spherical k-means over a sample of rows,
+        and refit the codec. The store lock is only held to take a snapshot
+        and to swap the result in; rows upserted in between are assigned
+        and encoded again at the swap.
+        """
+        with self._train_lock:
+            with self._lock:
+                live = np.flatnonzero(self._alive[: self._n])
+                if not len(live):
+                    self._training = False
+                    return
+                self._training = True
+                self._pending = []
+                vectors, capacity = self._vectors, self._capacity
+            try:
+                self._train(vectors, live, capacity, iterations, seed)
+            finally:
+                with self._lock:
+                    self._training = False
+                    self._pending = None
+
+    def _train(self, vectors: np.ndarray, live: np.ndarray, capacity: int, iterations: int, seed: int) -> None:
+        nlist = int(np.clip(4 * np.sqrt(len(live)), 16, 1024))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(live, size=min(len(live), nlist * 32), replace=False))
+        data = np.asarray(vectors[sample])
+        centroids = data[rng.choice(len(data), size=min(nlist, len(data)), replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            empty = np.bincount(labels, minlength=len(centroids)) == 0
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+
+        assign = np.full(capacity, -1, dtype=np.int32)
+        for start in range(0, len(live), 65536):
+            block = live[start:start + 65536]
+            assign[block] = np.argmax(np.asarray(vectors[block]) @ centroids.T, axis=1)
+
+        codec = self._make_codec()
+        codes_path = self._encode_codes(codec, vectors, live, capacity) if codec is not None else None
+
+        # Catch up, still outside the lock, on rows written during the above
+        with self._lock:
+            caught = self._take_pending()
+            vectors, capacity = self._vectors, self._capacity
+        assign = _grow(assign, capacity)
+        caught_codes = None
+        if len(caught):
+            block = np.asarray(vectors[caught])
+            assign[caught] = np.argmax(block @ centroids.T, axis=1)
+            if codec is not None:
+                caught_codes = codec.encode(block)
+
+        # Bulk list_id update on its own connection (WAL: reads carry on), in
+        # short transactions so concurrent upserts are not locked out for long
+        rows = np.union1d(live, caught)
+        conn = sqlite3.connect(os.path.join(self.path, "meta.sqlite3"), timeout=60)
+        try:
+            for start in range(0, len(rows), 10_000):
+                with conn:
+                    conn.executemany(
+                        "UPDATE chunks SET list_id = ? WHERE row = ?",
+                        [(int(assign[r]), int(r)) for r in rows[start:start + 10_000]],
+                    )
+        finally:
+            conn.close()
+
+        with self._lock:
+            # Only rows written since the catch-up are redone while holding the lock
+            assign = _grow(assign, self._capacity)
+            redo = self._take_pending()
+            if len(redo):
+                assign[redo] = np.argmax(np.asarray(self._vectors[redo]) @ centroids.T, axis=1)
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE chunks SET list_id = ? WHERE row = ?",
+                        [(int(assign[r]), int(r)) for r in redo],
+                    )
+
+            np.save(self._centroids_path, centroids)
+            with self._conn:
+                self._set_meta("trained_n", len(live))
+            self._centroids = centroids
+            self._assign = assign
+            self._trained_n = len(live)
+            self._lists = None
+
+            if codec is not None:
+                os.replace(codes_path, self._codes_path(codec))
+                self._install_codec(codec)
+                if caught_codes is not None:
+                    self._codes[caught] = caught_codes
+                if len(redo):
+                    self._codes[redo] = codec.encode(np.asarray(self._vectors[redo]))
+
+    def _take_pending(self) -> np.ndarray:
+        """Rows upserted since the last call during training (call with the lock held)."""
+        rows = np.unique(np.concatenate(self._pending)) if self._pending else np.empty(0, dtype=np.int64)
+        self._pending = []
+        return rows
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows grouped by IVF list: (rows sorted by list, start offset per list)."""
+        if self._lists is None:
+            assign = np.where(self._alive[: self._n], self._assign[: self._n], -1)
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(len(self._centroids) + 1))
+            self._lists = (order, bounds)
+        return self._lists
+
+    # --------------------------
+    # Reads
+    # --------------------------
+    def _filtered_rows(self, where: dict) -> np.ndarray:
+        sql, params = _where_sql(where)
+        return np.array(
+            [r for (r,) in self._conn.execute(f"SELECT row FROM chunks WHERE {sql}", params)],
+            dtype=np.int64,
+        )
+
+    def _candidates(self, q: np.ndarray, where: Optional[dict]) -> np.ndarray:
+        """Rows to score exactly for this query."""
+        allowed = self._filtered_rows(where) if where else None
+        if allowed is not None and len(allowed) <= self.EXACT_FILTER_LIMIT:
+            return allowed
+        if self._centroids is None:
+            return allowed if allowed is not None else np.flatnonzero(self._alive[: self._n])
+
+        order, bounds = self._inverted_lists()
+        nprobe = min(self.nprobe, len(self._centroids))
+        probes = np.argpartition(-(self._centroids @ q), nprobe - 1)[:nprobe]
+        rows = np.concatenate([order[bounds[p]:bounds[p + 1]] for p in probes])
+        if allowed is not None:
+            rows = rows[np.isin(rows, allowed)]
+        return rows
+
+    def watermark(self) -> int:
+        """Rows are only ever appended (a replaced id gets a new row), so the row count marks the write position."""
+        with self._lock:
+            return self._n
+
+    def query(self, embedding, k: int = 5, where: Optional[dict] = None, as_of=None) -> List[dict]:
+        if not self.dim or k <= 0:
+            return []
+        q = _normalize(np.asarray(embedding, dtype=np.float32))
+        with self._lock:
+            rows = self._candidates(q, where)
+            vectors, codec, codes = self._vectors, self._codec, self._codes
+        if as_of is not None:
+            rows = rows[rows < as_of]
+        if not len(rows):
+            return []
+
+        shortlist = k * self.rescore
+        if codec is not None and len(rows) > shortlist:
+            # First pass on compact codes, exact re-score of the shortlist only
+            approx = codec.scores(q, np.asarray(codes[rows]))
+            rows = rows[np.argpartition(-approx, shortlist - 1)[:shortlist]]
+
+        scores = np.asarray(vectors[rows]) @ q
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        by_row = self._fetch_rows([int(r) for r in rows[top]])
+        hits = []
+        for r, score in zip(rows[top], scores[top]):
+            record = by_row.get(int(r))
+            if record:
+                chunk_id, text, meta = record
+                hits.append({"id": chunk_id, "text": text, "score": float(score), "metadata": meta})
+        return hits
+
+    def _fetch_rows(self, rows: List[int]) -> Dict[int, tuple]:
+        out = {}
+        with self._lock:
+            for start in range(0, len(rows), self.SQL_BATCH):
+                batch = rows[start:start + self.SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for row, chunk_id, text, meta in self._conn.execute(
+                    f"SELECT row, id, text, metadata FROM chunks WHERE row IN ({placeholders})", batch
+                ):
+                    out[row] = (chunk_id, text, json.loads(meta))
+        return out
+
+    def get(self, ids=None, where=None, include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, list]:
+        sql, params = _where_sql(where)
+        with self._lock:
+            if ids is not None:
+                records = []
+                ids = list(ids)
+                for start in range(0, len(ids), self.SQL_BATCH):
+                    batch = ids[start:start + self.SQL_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    records.extend(self._conn.execute(
+                        f"SELECT row, id, text, metadata FROM chunks WHERE id IN ({placeholders}) AND {sql}",
+                        [*batch, *params],
+                    ).fetchall())
+            else:
+                records = self._conn.execute(
+                    f"SELECT row, id, text, metadata FROM chunks WHERE {sql} ORDER BY row", params
+                ).fetchall()
+            vectors = self._vectors
+
+        result = {"ids": [r[1] for r in records], "documents": [], "metadatas": [], "embeddings": []}
+        if "documents" in include:
+            result["documents"] = [r[2] for r in records]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(r[3]) for r in records]
+        if "embeddings" in include and records:
+            result["embeddings"] = np.asarray(vectors[[r[0] for r in records]]).tolist()
+        return result
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self._alive[: self._n].sum())
+
+    def revision(self) -> Tuple[int, int]:
+        """Live count and last live row: a replaced chunk moves to a new row without changing the count."""
+        with self._lock:
+            live = np.flatnonzero(self._alive[: self._n])
+            return len(live), int(live[-1]) + 1 if len(live) else 0
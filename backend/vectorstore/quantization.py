@@ -0,0 +1,217 @@
+"""
+Compressed vector codes for the first, approximate scoring pass.
+
+A codec turns unit-normalized float32 vectors into compact codes and
+scores a query against many codes at once. Scores are approximate inner
+products, so callers keep the full-precision vectors (on disk) and
+re-score a shortlist with them; see LocalVectorStore.query.
+
+    codec          bytes/vector (d dims)   needs training
+    float16        2d                      no
+    int8           d                       yes (per-dimension scales)
+    pq             m                       yes (m sub-codebooks of 256 centroids)
+
+Any codec can first truncate vectors to their leading `truncate_dim`
+components and re-normalize them. text-embedding-3 models are trained so
+that prefixes remain useful embeddings (Matryoshka representation
+learning), which makes truncation a cheap further 2-6x.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class Codec:
+    """Full-precision codes; only useful together with `truncate_dim`."""
+
+    kind = "float32"
+    dtype = np.float32
+
+    def __init__(self, dim: int, truncate_dim: int = 0):
+        self.dim = dim
+        self.truncate_dim = truncate_dim if 0 < truncate_dim < dim else 0
+
+    @property
+    def code_dim(self) -> int:
+        """Width of one code row, in elements of `dtype`."""
+        return self.truncate_dim or self.dim
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.code_dim * np.dtype(self.dtype).itemsize
+
+    @property
+    def signature(self) -> str:
+        """Identifies the code layout; codes written under another signature must be rebuilt."""
+        return f"{self.kind}:{self.dim}:{self.truncate_dim}"
+
+    @property
+    def trained(self) -> bool:
+        return True
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.truncate_dim:
+            vectors = _normalize(vectors[..., : self.truncate_dim])
+        return vectors
+
+    def fit(self, sample: np.ndarray) -> "Codec":
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return self._prepare(vectors).astype(self.dtype)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate inner products of one query with each code row."""
+        return codes.astype(np.float32) @ self._prepare(query)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        pass
+
+
+class Float16Codec(Codec):
+    kind = "float16"
+    dtype = np.float16
+
+
+class Int8Codec(Codec):
+    """
+    Symmetric scalar quantization with one scale per dimension, set from
+    a high percentile of |x| so rare outliers do not waste the range.
+    """
+
+    kind = "int8"
+    dtype = np.int8
+
+    def __init__(self, dim: int, truncate_dim: int = 0, percentile: float = 99.9):
+        super().__init__(dim, truncate_dim)
+        self.percentile = percentile
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def trained(self) -> bool:
+        return self.scale is not None
+
+    def fit(self, sample: np.ndarray) -> "Int8Codec":
+        limit = np.percentile(np.abs(self._prepare(sample)), self.percentile, axis=0)
+        self.scale = (np.maximum(limit, 1e-6) / 127.0).astype(np.float32)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(self._prepare(vectors) / self.scale), -127, 127).astype(np.int8)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # Fold the scales into the query instead of dequantizing every row
+        return codes.astype(np.float32) @ (self._prepare(query) * self.scale)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"scale": self.scale}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        self.scale = state["scale"]
+
+
+class PQCodec(Codec):
+    """
+    Product quantization: the vector is cut into `m` sub-vectors and each
+    is replaced by the index of its nearest of 256 centroids (one byte).
+    A query is scored with m lookup tables (asymmetric distance), without
+    decoding any vector.
+    """
+
+    kind = "pq"
+    dtype = np.uint8
+
+    def __init__(self, dim: int, truncate_dim: int = 0, m: int = 0, iterations: int = 10, seed: int = 0):
+        super().__init__(dim, truncate_dim)
+        d = self.truncate_dim or dim
+        m = m or max(1, d // 8)
+        while d % m:  # sub-vectors must split the dimensions evenly
+            m -= 1
+        self.m = m
+        self.sub_dim = d // m
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None  # (m, 256, sub_dim)
+
+    @property
+    def code_dim(self) -> int:
+        return self.m
+
+    @property
+    def signature(self) -> str:
+        return f"{super().signature}:{self.m}"
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, d) -> (m, n, sub_dim)"""
+        return self._prepare(vectors).reshape(-1, self.m, self.sub_dim).transpose(1, 0, 2)
+
+    def fit(self, sample: np.ndarray) -> "PQCodec":
+        rng = np.random.default_rng(self.seed)
+        parts = self._split(sample)
+        n = parts.shape[1]
+        k = min(256, n)
+        codebooks = np.zeros((self.m, 256, self.sub_dim), dtype=np.float32)
+        for j in range(self.m):
+            data = parts[j]
+            centroids = data[rng.choice(n, size=k, replace=False)].copy()
+            for _ in range(self.iterations):
+                labels = self._nearest(data, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, data)
+                counts = np.bincount(labels, minlength=k)[:, None]
+                centroids = np.where(counts > 0, sums / np.maximum(counts, 1), centroids)
+            codebooks[j, :k] = centroids
+            codebooks[j, k:] = centroids[0]  # unused slots never win ties
+        self.codebooks = codebooks
+        return self
+
+    @staticmethod
+    def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # argmin ||x - c||^2 = argmax (x.c - ||c||^2 / 2)
+        return np.argmax(data @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = self._split(vectors)
+        codes = np.empty((parts.shape[1], self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = self._nearest(parts[j], self.codebooks[j])
+        return codes
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        q = self._prepare(query).reshape(self.m, self.sub_dim)
+        tables = np.einsum("mkd,md->mk", self.codebooks, q)  # (m, 256)
+        return tables[np.arange(self.m), codes].sum(axis=1)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        self.codebooks = state["codebooks"]
+
+
+CODECS = {"float32": Codec, "float16": Float16Codec, "int8": Int8Codec, "pq": PQCodec}
+
+
+def make_codec(kind: str, dim: int, truncate_dim: int = 0, pq_subvectors: int = 0) -> Optional[Codec]:
+    """A codec for VECTOR_QUANTIZATION-style names; None when nothing is compressed."""
+    if not kind or kind == "none":
+        return Codec(dim, truncate_dim) if 0 < truncate_dim < dim else None
+    if kind not in CODECS:
+        raise ValueError(f"Unknown vector quantization: {kind!r} (expected one of {sorted(CODECS)} or 'none')")
+    if kind == "pq":
+        return PQCodec(dim, truncate_dim, m=pq_subvectors)
+    return CODECS[kind](dim, truncate_dim)